@@ -1,19 +1,187 @@
+import heapq
+from itertools import islice
+from operator import attrgetter
+
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from . import shards
 from .models import Game, Move
 
 
+class ShardListFilter(admin.SimpleListFilter):
+    """
+    Picks the shard the change list shows when games are sharded. With no
+    choice made ("All"), every shard is listed, merged newest first.
+    """
+    title = 'shard'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in shards.aliases()]
+
+    def value(self):
+        alias = super().value()
+        return alias if alias in shards.aliases() else None
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        return queryset.using(self.value())
+
+    def get_facet_counts(self, pk_attname, filtered_qs):
+        # Counts would be subqueries on one database about another
+        return {}
+
+
+class MergedRows:
+    """
+    A queryset run on every shard, read as one list ordered newest first.
+
+    Enough of a sequence for the admin's paginator: ``count()`` adds up
+    the shards' counts, and a slice reads the first ``stop`` rows of each
+    shard and merges them, so deep pages cost a query per shard that
+    grows with the page number.
+    """
+    key = attrgetter('created_at', 'pk')
+
+    def __init__(self, queryset):
+        self.querysets = shards.each(queryset.order_by('-created_at', '-pk'))
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return heapq.merge(*self.querysets, key=self.key, reverse=True)
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        rows = heapq.merge(*(queryset[:key.stop]
+                             for queryset in self.querysets),
+                           key=self.key, reverse=True)
+        return list(islice(rows, key.start, key.stop))
+
+    def _clone(self):
+        return self
+
+
+class ShardedChangeList(ChangeList):
+    def get_results(self, request):
+        if self.model_admin.lists_all_shards(request):
+            self.root_queryset = MergedRows(self.root_queryset)
+            self.queryset = MergedRows(self.queryset)
+        super().get_results(request)
+
+    def url_for_result(self, result):
+        url = super().url_for_result(result)
+        if shards.sharded():
+            # Row ids need not be unique across shards (Move's aren't)
+            url += f'?{ShardListFilter.parameter_name}={result._state.db}'
+        return url
+
+
+class ShardedAdmin(admin.ModelAdmin):
+    def get_changelist(self, request, **kwargs):
+        return ShardedChangeList
+
+    def get_list_filter(self, request):
+        list_filter = super().get_list_filter(request)
+        if shards.sharded():
+            return (ShardListFilter, *list_filter)
+        return list_filter
+
+    def lists_all_shards(self, request):
+        """Whether the change list merges every shard, i.e. none is picked"""
+        return shards.sharded() and request.GET.get(
+            ShardListFilter.parameter_name) not in shards.aliases()
+
+    def get_sortable_by(self, request):
+        if self.lists_all_shards(request):
+            # The merged list has one order
+            return ()
+        return super().get_sortable_by(request)
+
+    def get_actions(self, request):
+        if self.lists_all_shards(request):
+            # Selected ids would be looked up on a single shard
+            return {}
+        return super().get_actions(request)
+
+    def shard_of_object(self, request):
+        """Shard a change page's object is on, as its list row linked"""
+        alias = request.GET.get(ShardListFilter.parameter_name)
+        return alias if alias in shards.aliases() else shards.aliases()[0]
+
+
 @admin.register(Game)
-class GameAdmin(admin.ModelAdmin):
+class GameAdmin(ShardedAdmin):
     list_display = ('id', 'player_x_name', 'player_o_name', 'current_turn',
                     'status', 'created_at', 'updated_at')
     list_filter = ('status', 'current_turn', 'created_at')
     search_fields = ('player_x_name', 'player_o_name')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('created_at', 'updated_at', 'moves_played')
+
+    @admin.display(description='moves')
+    def moves_played(self, game):
+        # From the move log: without GAME_MOVE_ROWS there are no Move rows
+        return ', '.join(f'{move.player}{move.position}'
+                         for move in game.move_history()) or '-'
+
+    def get_object(self, request, object_id, from_field=None):
+        try:
+            game_id = int(object_id)
+        except ValueError:
+            return None
+        return Game.objects.shard(game_id).filter(pk=game_id).first()
 
 
 @admin.register(Move)
-class MoveAdmin(admin.ModelAdmin):
+class MoveAdmin(ShardedAdmin):
+    """
+    Move rows. A game's moves (``?game__id__exact=<id>``) are read from
+    the game's shard; without a game, they are listed like games.
+    """
     list_display = ('id', 'game', 'player', 'position', 'created_at')
     list_filter = ('player', 'created_at')
+    list_select_related = ('game',)
     search_fields = ('game__id', 'game__player_x_name',
                      'game__player_o_name')
+    # A game id box rather than a select of every game
+    raw_id_fields = ('game',)
+
+    def _game_shard(self, request):
+        try:
+            return shards.for_game(int(request.GET['game__id__exact']))
+        except (KeyError, ValueError):
+            return None
+
+    def get_list_filter(self, request):
+        if self._game_shard(request) is not None:
+            # The game picks the shard
+            return self.list_filter
+        return super().get_list_filter(request)
+
+    def lists_all_shards(self, request):
+        return (self._game_shard(request) is None
+                and super().lists_all_shards(request))
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        alias = self._game_shard(request)
+        return queryset.using(alias) if alias is not None else queryset
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        # A move's game is on the move's shard
+        kwargs.setdefault('using', self.shard_of_object(request))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_object(self, request, object_id, from_field=None):
+        try:
+            move_id = int(object_id)
+        except ValueError:
+            return None
+        return self.get_queryset(request).using(
+            self.shard_of_object(request)).filter(pk=move_id).first()
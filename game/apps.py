@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class GameConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'game'
+
+    def ready(self):
+        # Solve the full 3x3 state space once per process so AI moves are
+        # a table lookup from the first request on.
+        from . import solver, sqlite
+        solver.build_table()
+
+        connection_created.connect(sqlite.apply_pragmas,
+                                   dispatch_uid='game.sqlite.apply_pragmas')
@@ -0,0 +1,323 @@
+"""
+Archive of finished games in compressed, append-only segment files.
+
+``manage.py archive_games`` moves finished games out of the live tables
+into GAME_ARCHIVE_DIR. Each game, with its moves, becomes one record: the
+game's columns as JSON, zlib-compressed on its own (with a preset
+dictionary of the field names, which is most of a small record) so it
+can be read back without touching its neighbours. Records are appended to
+``games-<n>.seg``, and for each one an entry of (game id, offset, length)
+is appended to the segment's offset index, ``games-<n>.idx``. Nothing is
+rewritten in place: every run starts a new segment, and segments roll
+over at GAME_ARCHIVE_SEGMENT_BYTES. A segment is sealed when it is full
+or the run ends: its index entries are written again, sorted by game id,
+to ``games-<n>.sidx``.
+
+Games are only deleted from the database once their records and index
+entries are on disk, so a crash can at worst archive a game twice; both
+copies are identical. A partly written index entry or record at the end of
+a file is never referenced and is ignored.
+
+``load(game_id)`` finds an archived game by binary search of the sealed
+indexes on disk; only each segment's lowest and highest id is kept in
+memory. The indexes of segments not sealed yet -- being written, or left
+so by a crash -- are scanned instead. The directory is listed again only
+when it changes.
+"""
+import base64
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+
+from .models import Game, Move
+
+SEGMENT_MAGIC = b'GAMESEG1'
+# Index entry: game id, record offset and length in the segment
+INDEX_ENTRY = struct.Struct('<QQI')
+# Preset dictionary for record compression: what every record repeats
+ZDICT = (b'{"id":"player_x_name":"player_o_name":"current_turn":"board_size":'
+         b'"win_length":"board_state":"status":"IN_PROGRESS""X_WON""O_WON"'
+         b'"DRAW""is_ai_game":false,true"version":"move_log":"created_at":'
+         b'"updated_at":"moves":[["X",["O",.000+00:00"')
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+# A directory listing is trusted once it was made this long after the
+# directory's mtime: a change within the same mtime tick doesn't show
+LISTING_GRACE_NS = 1_000_000_000
+
+
+def archive_dir():
+    return os.fspath(getattr(settings, 'GAME_ARCHIVE_DIR',
+                             settings.BASE_DIR / 'archive'))
+
+
+def _segment_bytes():
+    return getattr(settings, 'GAME_ARCHIVE_SEGMENT_BYTES',
+                   DEFAULT_SEGMENT_BYTES)
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (bytes, memoryview)):
+        return base64.b64encode(bytes(value)).decode('ascii')
+    return value
+
+
+def to_record(game, moves):
+    """A game and its Move rows as a JSON-ready dict"""
+    record = {field.attname: _value(getattr(game, field.attname))
+              for field in Game._meta.concrete_fields}
+    record['moves'] = [[move.player, move.position, _value(move.created_at)]
+                       for move in moves]
+    return record
+
+
+def from_record(record):
+    """
+    Return ``(game, moves)``: the unsaved Game and Move instances a record
+    was made from.
+    """
+    values = dict(record)
+    moves = values.pop('moves', [])
+    for name in ('created_at', 'updated_at'):
+        values[name] = parse_datetime(values[name])
+    values['move_log'] = base64.b64decode(values.get('move_log') or '')
+    game = Game(**values)
+    return game, [Move(game=game, player=player, position=position,
+                       created_at=parse_datetime(created_at))
+                  for player, position, created_at in moves]
+
+
+def _compress(record):
+    data = json.dumps(record, separators=(',', ':')).encode()
+    compressor = zlib.compressobj(9, zdict=ZDICT)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _decompress(data):
+    decompressor = zlib.decompressobj(zdict=ZDICT)
+    return json.loads(decompressor.decompress(data) +
+                      decompressor.flush())
+
+
+def _segment_paths(directory, number):
+    """Paths of a segment, its index and its sorted index"""
+    stem = os.path.join(directory, f'games-{number:06d}')
+    return stem + '.seg', stem + '.idx', stem + '.sidx'
+
+
+def _segment_numbers(names):
+    numbers = []
+    for name in names:
+        if name.startswith('games-') and name.endswith('.idx'):
+            try:
+                numbers.append(int(name[6:-4]))
+            except ValueError:
+                pass
+    return sorted(numbers)
+
+
+class SegmentWriter:
+    """
+    Appends records to new segments of an archive directory. Call
+    ``sync()`` before deleting what was written; ``close()`` when done.
+    """
+
+    def __init__(self, directory=None, segment_bytes=None):
+        self.directory = directory or archive_dir()
+        self.segment_bytes = segment_bytes or _segment_bytes()
+        os.makedirs(self.directory, exist_ok=True)
+        self._segment = self._index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _open_segment(self):
+        self.close()
+        number = max(_segment_numbers(os.listdir(self.directory)),
+                     default=0) + 1
+        while True:
+            seg_path, idx_path, _ = _segment_paths(self.directory, number)
+            try:
+                # Exclusive create: concurrent runs never share a segment
+                self._index = open(idx_path, 'xb')
+                break
+            except FileExistsError:
+                number += 1
+        self._segment = open(seg_path, 'wb')
+        self._segment.write(SEGMENT_MAGIC)
+
+    def append(self, game, moves):
+        """Write one game and its moves"""
+        if (self._segment is None or
+                self._segment.tell() >= self.segment_bytes):
+            self._open_segment()
+        data = _compress(to_record(game, moves))
+        offset = self._segment.tell()
+        self._segment.write(data)
+        self._index.write(INDEX_ENTRY.pack(game.pk, offset, len(data)))
+
+    def sync(self):
+        """Make everything appended so far durable"""
+        for file in (self._segment, self._index):
+            if file is not None:
+                file.flush()
+                os.fsync(file.fileno())
+
+    def close(self):
+        self.sync()
+        for file in (self._segment, self._index):
+            if file is not None:
+                file.close()
+        if self._index is not None:
+            self._seal(self._index.name)
+        self._segment = self._index = None
+
+    def _seal(self, idx_path):
+        """Write a finished segment's index entries sorted by game id"""
+        with open(idx_path, 'rb') as file:
+            entries = sorted(INDEX_ENTRY.iter_unpack(file.read()))
+        sidx_path = idx_path[:-len('.idx')] + '.sidx'
+        with open(sidx_path + '.tmp', 'wb') as file:
+            file.write(b''.join(INDEX_ENTRY.pack(*entry)
+                                for entry in entries))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(sidx_path + '.tmp', sidx_path)
+
+
+def _index_bounds(sidx_path):
+    """``(count, first id, last id)`` of a sorted index"""
+    with open(sidx_path, 'rb') as file:
+        count = os.fstat(file.fileno()).st_size // INDEX_ENTRY.size
+        if not count:
+            return 0, None, None
+        first = INDEX_ENTRY.unpack(file.read(INDEX_ENTRY.size))[0]
+        file.seek((count - 1) * INDEX_ENTRY.size)
+        last = INDEX_ENTRY.unpack(file.read(INDEX_ENTRY.size))[0]
+    return count, first, last
+
+
+def _search_index(sidx_path, count, game_id):
+    """Binary search a sorted index on disk for ``(offset, length)``"""
+    with open(sidx_path, 'rb') as file:
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            file.seek(middle * INDEX_ENTRY.size)
+            entry_id, offset, length = INDEX_ENTRY.unpack(
+                file.read(INDEX_ENTRY.size))
+            if entry_id < game_id:
+                low = middle + 1
+            elif entry_id > game_id:
+                high = middle
+            else:
+                return offset, length
+    return None
+
+
+def _scan_index(idx_path, game_id):
+    """Scan an unsorted index for ``(offset, length)``"""
+    chunk = INDEX_ENTRY.size * 4096
+    with open(idx_path, 'rb') as file:
+        while True:
+            data = file.read(chunk)
+            data = data[:len(data) - len(data) % INDEX_ENTRY.size]
+            if not data:
+                return None
+            for entry_id, offset, length in INDEX_ENTRY.iter_unpack(data):
+                if entry_id == game_id:
+                    return offset, length
+
+
+class ArchiveReader:
+    """Looks archived games up by id through the segments' indexes"""
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._listing = None  # (directory, its mtime, when it was listed)
+        # sidx path -> (count, first id, last id, segment path)
+        self._sealed = {}
+        self._unsealed = []  # (idx path, segment path)
+
+    def _refresh(self, directory):
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except FileNotFoundError:
+            # Nothing archived yet
+            self._listing, self._sealed, self._unsealed = None, {}, []
+            return
+        listing = self._listing
+        if (listing is not None and listing[:2] == (directory, mtime) and
+                listing[2] - mtime >= LISTING_GRACE_NS):
+            return
+        listed_at = time.time_ns()
+        names = set(os.listdir(directory))
+        sealed = {}
+        unsealed = []
+        for number in _segment_numbers(names):
+            seg_path, idx_path, sidx_path = _segment_paths(directory, number)
+            if os.path.basename(sidx_path) not in names:
+                unsealed.append((idx_path, seg_path))
+                continue
+            bounds = self._sealed.get(sidx_path)
+            if bounds is None:
+                bounds = (*_index_bounds(sidx_path), seg_path)
+            if bounds[0]:
+                sealed[sidx_path] = bounds
+        self._sealed = sealed
+        self._unsealed = unsealed
+        self._listing = (directory, mtime, listed_at)
+
+    def _find(self, directory, game_id):
+        """``(segment path, offset, length)`` of a game, or None"""
+        with self._lock:
+            self._refresh(directory)
+            sealed = [(sidx_path, count, seg_path)
+                      for sidx_path, (count, first, last, seg_path)
+                      in self._sealed.items() if first <= game_id <= last]
+            unsealed = list(self._unsealed)
+        for sidx_path, count, seg_path in sealed:
+            found = _search_index(sidx_path, count, game_id)
+            if found is not None:
+                return (seg_path, *found)
+        for idx_path, seg_path in unsealed:
+            found = _scan_index(idx_path, game_id)
+            if found is not None:
+                return (seg_path, *found)
+        return None
+
+    def load(self, game_id):
+        """Return the archived record of ``game_id``, or None"""
+        found = self._find(self.directory or archive_dir(), game_id)
+        if found is None:
+            return None
+        seg_path, offset, length = found
+        with open(seg_path, 'rb') as file:
+            file.seek(offset)
+            return _decompress(file.read(length))
+
+
+reader = ArchiveReader()
+
+
+def load(game_id):
+    """
+    Return ``(game, moves)`` for an archived game, or None if it isn't in
+    the archive. The instances are read-only copies; don't save them.
+    """
+    record = reader.load(game_id)
+    if record is None:
+        return None
+    return from_record(record)
@@ -0,0 +1,164 @@
+"""
+Async versions of the busiest views, for serving under ASGI.
+
+They behave exactly like their counterparts in ``views`` but read through
+the async ORM, so an idle or waiting client costs a coroutine rather than
+a thread. CPU-heavy AI replies run on a worker thread (see
+``Game.aplay_turn``). ``urls`` routes to these when GAME_ASYNC_VIEWS is
+set, which ``asgi.py`` does; WSGI deployments keep the sync views.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.shortcuts import render
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST, require_safe
+
+from . import archive, events, leaderboard, routers
+from .models import Game, Score, StaleGame
+from .views import (_conflict_response, _event_stream, _game_data,
+                    _last_event_id, _state_response)
+
+
+@routers.replica_reads
+async def game_board(request, game_id):
+    """Display the game board for a specific game"""
+    game = await _get_game(game_id)
+
+    context = {
+        'game': game,
+        'board_cells': list(game.board_state),
+    }
+
+    return render(request, 'game/game_board.html', context)
+
+
+@csrf_exempt
+@require_POST
+@routers.pins_primary
+async def make_move(request, game_id):
+    """Handle making a move in the game via AJAX (see views.make_move)"""
+    try:
+        game = await _game_for_move(game_id)
+        data = json.loads(request.body)
+        position = int(data.get('position'))
+        player = data.get('player')
+        version = data.get('version')
+        if version is not None:
+            version = int(version)
+
+        try:
+            result = await _play_turn(game, position, player, version)
+        except StaleGame:
+            result = None
+        if game.from_hot_cache and (result is None or not result[0]):
+            # The cached copy may be behind another worker's write; redo
+            # the move on a fresh read.
+            game = await _game_for_move(game_id, cached=False)
+            try:
+                result = await _play_turn(game, position, player, version)
+            except StaleGame:
+                result = None
+        if result is None:
+            return _conflict_response(await _get_game(game_id))
+        success, message, ai_move_success, ai_message = result
+
+        if not success:
+            return JsonResponse({
+                'success': False,
+                'message': message
+            })
+
+        response_data = {
+            'success': True,
+            'message': message,
+            **_game_data(game),
+        }
+        if game.is_ai_game and ai_move_success:
+            response_data['ai_moved'] = True
+            response_data['ai_message'] = ai_message
+        return JsonResponse(response_data)
+
+    except (json.JSONDecodeError, ValueError, KeyError):
+        return JsonResponse({
+            'success': False,
+            'message': 'Invalid request data'
+        })
+    except Exception:
+        return JsonResponse({
+            'success': False,
+            'message': 'An error occurred'
+        })
+
+
+@routers.replica_reads
+async def scoreboard(request):
+    """Display the scoreboard with player statistics (see views.scoreboard)"""
+    player = request.GET.get('player', '').strip()
+    after = request.GET.get('after')
+    page_size = getattr(settings, 'GAME_SCOREBOARD_PAGE_SIZE', 50)
+    scores = next_cursor = None
+    if player:
+        scores = await Score.aaround(player)
+    elif after:
+        try:
+            scores, next_cursor = await Score.aleaderboard(after, page_size)
+        except ValueError:
+            pass  # Malformed cursor; start from the top
+    if scores is None:
+        scores, next_cursor = await leaderboard.afirst_page(
+            Score.aleaderboard, page_size)
+
+    context = {
+        'scores': scores,
+        'player': player,
+        'next_cursor': next_cursor,
+        'paged': bool(player or after),
+    }
+
+    return render(request, 'game/scoreboard.html', context)
+
+
+@require_safe
+@routers.replica_reads
+async def game_state(request, game_id):
+    """Return the game's state as JSON (see views.game_state)"""
+    return _state_response(request, await _get_game(game_id))
+
+
+async def game_events(request, game_id):
+    """Stream the game's moves as Server-Sent Events (see views.game_events)"""
+    if not await Game.objects.shard(game_id).filter(id=game_id).aexists():
+        raise Http404("No Game matches the given query.")
+    return _event_stream(events.astream(
+        game_id, _last_event_id(request),
+        lambda game_id: Game.objects.shard(game_id).aget(id=game_id),
+        getattr(settings, 'GAME_EVENTS_HEARTBEAT_SECONDS', 15),
+        getattr(settings, 'GAME_EVENTS_MAX_SECONDS', 300)))
+
+
+async def _get_game(game_id):
+    try:
+        return await Game.objects.shard(game_id).aget(id=game_id)
+    except Game.DoesNotExist:
+        archived = await sync_to_async(archive.load)(game_id)
+        if archived is None:
+            raise Http404("No Game matches the given query.")
+        return archived[0]
+
+
+async def _game_for_move(game_id, cached=True):
+    try:
+        return await Game.afor_move(game_id, cached)
+    except Game.DoesNotExist:
+        raise Http404("No Game matches the given query.")
+
+
+async def _play_turn(game, position, player, version=None):
+    game.expect_version(version)
+    if player != game.current_turn:
+        return False, f"It's {game.current_turn}'s turn", False, None
+    return await game.aplay_turn(position, player)
@@ -0,0 +1,225 @@
+"""
+Batched AI move evaluation across many concurrent games.
+
+``choose_moves`` answers AI turns for a list of positions in one pass.
+With NumPy installed, 3x3 boards are encoded as an ``(N, 9)`` int array and
+resolved together: one matrix product against the eight win masks finds
+finished games, a base-3 code per board indexes a dense table of the
+solver's best moves, and a random key per cell picks among ties. Without
+NumPy, or for larger boards, each position goes through the same solver or
+search used by ``Game.make_ai_move``.
+
+``MoveCoalescer`` sits in the view path and groups AI turns arriving from
+different request threads within a short window into one such batch.
+"""
+import random
+import threading
+from functools import lru_cache
+
+from . import engine, search, solver
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; fall back to per-board lookups
+    np = None
+
+# Cell codes in encoded boards
+EMPTY, PLAYER_X, PLAYER_O = 0, 1, 2
+
+# Set in every table entry that was filled, so an empty best-move mask
+# (finished game) can be told apart from a position not in the table.
+_KNOWN = 1 << engine.CELLS
+
+_coalescers = {}
+_coalescers_lock = threading.Lock()
+
+
+def encode_boards(states):
+    """Encode 3x3 engine states as an (N, 9) array of cell codes"""
+    cells = np.arange(engine.CELLS, dtype=np.int64)
+    x_masks = np.fromiter((state.x for state in states), dtype=np.int64,
+                          count=len(states))
+    o_masks = np.fromiter((state.o for state in states), dtype=np.int64,
+                          count=len(states))
+    return (((x_masks[:, None] >> cells) & 1) * PLAYER_X
+            + ((o_masks[:, None] >> cells) & 1) * PLAYER_O).astype(np.int8)
+
+
+@lru_cache(maxsize=None)
+def _win_matrix():
+    # (9, 8) incidence matrix: column j marks the cells of win line j
+    matrix = np.zeros((engine.CELLS, len(engine.WIN_PATTERNS)), dtype=np.int8)
+    for line, pattern in enumerate(engine.WIN_PATTERNS):
+        matrix[list(pattern), line] = 1
+    return matrix
+
+
+def winners(boards):
+    """
+    Return an (N,) array holding the winner's cell code per board (EMPTY
+    for none), found by counting each player's stones on every win line
+    at once.
+    """
+    matrix = _win_matrix()
+    x_wins = ((boards == PLAYER_X).astype(np.int8) @ matrix == 3).any(axis=1)
+    o_wins = ((boards == PLAYER_O).astype(np.int8) @ matrix == 3).any(axis=1)
+    return np.where(x_wins, PLAYER_X,
+                    np.where(o_wins, PLAYER_O, EMPTY)).astype(np.int8)
+
+
+@lru_cache(maxsize=None)
+def _powers():
+    return 3 ** np.arange(engine.CELLS, dtype=np.int32)
+
+
+@lru_cache(maxsize=None)
+def _move_table():
+    """
+    Dense ``(2, 3**9)`` array of best-move bitmasks, indexed by side to move
+    (0 for X) and base-3 board code, for every position reachable from an
+    empty board.
+    """
+    table = np.zeros((2, 3 ** engine.CELLS), dtype=np.uint16)
+    powers = [3 ** cell for cell in range(engine.CELLS)]
+    seen = set()
+    stack = [engine.GameState(turn='X'), engine.GameState(turn='O')]
+    while stack:
+        state = stack.pop()
+        key = (state.x, state.o, state.turn)
+        if key in seen:
+            continue
+        seen.add(key)
+        code = sum(powers[cell]
+                   * (PLAYER_X if state.x >> cell & 1 else PLAYER_O)
+                   for cell in range(engine.CELLS)
+                   if state.occupied >> cell & 1)
+        moves = solver.best_moves(state)
+        table[0 if state.turn == 'X' else 1, code] = _KNOWN | sum(
+            1 << move for move in moves)
+        if state.is_over():
+            continue
+        for move in state.available_moves():
+            child = state.copy()
+            child.apply(move)
+            stack.append(child)
+    return table
+
+
+def _choose_classic(states, rng):
+    boards = encode_boards(states)
+    sides = np.fromiter((state.turn == 'O' for state in states),
+                        dtype=np.int8, count=len(states))
+    entries = _move_table()[sides, boards.astype(np.int32) @ _powers()]
+
+    # Random key per cell, masked to the best moves, so argmax picks one
+    # best move uniformly per board.
+    cells = np.arange(engine.CELLS)
+    best = (entries[:, None].astype(np.int32) >> cells) & 1
+    keys = np.where(best == 1, rng.random(best.shape), -1.0)
+    picks = keys.argmax(axis=1)
+
+    over = (winners(boards) != EMPTY) | (boards != EMPTY).all(axis=1)
+    known = (entries & _KNOWN) != 0
+    moves = [pick if is_known and not finished else None
+             for finished, is_known, pick
+             in zip(over.tolist(), known.tolist(), picks.tolist())]
+    for index in np.flatnonzero(~known & ~over).tolist():
+        # Not reachable from an empty board; solve it directly
+        moves[index] = solver.choose_move(states[index])
+    return moves
+
+
+def choose_moves(states, budget_ms=search.DEFAULT_BUDGET_MS, seed=None):
+    """
+    Return one AI move per engine.GameState (None where the game is over).
+
+    3x3 positions are resolved together; other boards are searched one by
+    one with ``budget_ms`` each.
+    """
+    moves = [None] * len(states)
+    classic = [index for index, state in enumerate(states)
+               if state.spec is engine.CLASSIC]
+    if classic:
+        if np is not None:
+            rng = np.random.default_rng(seed)
+            picks = _choose_classic([states[index] for index in classic], rng)
+        else:
+            picks = [solver.choose_move(states[index]) for index in classic]
+        for index, move in zip(classic, picks):
+            moves[index] = move
+    for index, state in enumerate(states):
+        if state.spec is not engine.CLASSIC:
+            moves[index] = search.best_move(state, budget_ms)
+    return moves
+
+
+class MoveCoalescer:
+    """
+    Group AI turns from concurrent requests into batches.
+
+    The first caller in a window becomes the leader: it waits up to
+    ``window_ms`` (or until ``max_batch`` turns are pending), evaluates
+    the whole batch with ``choose_moves`` and hands each waiting caller
+    its move. Later callers just wait for their result.
+    """
+
+    def __init__(self, window_ms, max_batch=64):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending = []
+        self._lock = threading.Lock()
+        self._full = threading.Event()
+
+    def choose_move(self, state):
+        slot = _Slot(state)
+        with self._lock:
+            self._pending.append(slot)
+            leader = len(self._pending) == 1
+            if len(self._pending) >= self.max_batch:
+                self._full.set()
+        if not leader:
+            slot.done.wait()
+            return slot.result()
+
+        self._full.wait(self.window)
+        with self._lock:
+            batch, self._pending = self._pending, []
+            self._full.clear()
+        try:
+            moves = choose_moves([pending.state for pending in batch],
+                                 seed=random.getrandbits(32))
+        except Exception as exc:
+            for pending in batch:
+                pending.error = exc
+                pending.done.set()
+            raise
+        for pending, move in zip(batch, moves):
+            pending.move = move
+            pending.done.set()
+        return slot.result()
+
+
+class _Slot:
+    __slots__ = ('state', 'move', 'error', 'done')
+
+    def __init__(self, state):
+        self.state = state
+        self.move = None
+        self.error = None
+        self.done = threading.Event()
+
+    def result(self):
+        if self.error is not None:
+            raise self.error
+        return self.move
+
+
+def coalescer(window_ms, max_batch=64):
+    """Return the process-wide MoveCoalescer for these settings"""
+    key = (window_ms, max_batch)
+    instance = _coalescers.get(key)
+    if instance is None:
+        with _coalescers_lock:
+            instance = _coalescers.setdefault(
+                key, MoveCoalescer(window_ms, max_batch))
+    return instance
@@ -0,0 +1,298 @@
+"""
+Bitboard game engine for tic-tac-toe and its N x N / k-in-a-row variants.
+
+A position is stored as two bit masks, one per player, where bit ``i`` is
+set when that player occupies cell ``i`` of the board string, plus
+per-line stone counts that are updated move by move. Move application,
+legality, winner and winning-line lookup are all integer operations
+against tables built once per board size (see ``board_spec``), so nothing
+here touches the ORM or allocates per check.
+"""
+from functools import lru_cache
+
+CELLS = 9
+FULL_MASK = (1 << CELLS) - 1
+
+# Winning combinations on the classic board, as cell indices
+WIN_PATTERNS = (
+    (0, 1, 2), (3, 4, 5), (6, 7, 8),  # Rows
+    (0, 3, 6), (1, 4, 7), (2, 5, 8),  # Columns
+    (0, 4, 8), (2, 4, 6),             # Diagonals
+)
+
+WIN_MASKS = tuple(sum(1 << cell for cell in pattern)
+                  for pattern in WIN_PATTERNS)
+
+
+def _first_winning_line(mask):
+    for index, win_mask in enumerate(WIN_MASKS):
+        if mask & win_mask == win_mask:
+            return index
+    return -1
+
+
+# Index into WIN_PATTERNS of the first completed line for every possible
+# single-player mask, or -1 when the mask holds no line.
+WINNING_LINE = tuple(_first_winning_line(mask)
+                     for mask in range(FULL_MASK + 1))
+
+# Line directions as (row step, column step), in the order rows, columns,
+# diagonals, anti-diagonals so the classic board matches WIN_PATTERNS.
+_DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+
+def _generate_win_patterns(size, win_length):
+    patterns = []
+    for row_step, col_step in _DIRECTIONS:
+        for row in range(size):
+            for col in range(size):
+                end_row = row + row_step * (win_length - 1)
+                end_col = col + col_step * (win_length - 1)
+                if not (0 <= end_row < size and 0 <= end_col < size):
+                    continue
+                patterns.append(tuple(
+                    (row + row_step * step) * size + col + col_step * step
+                    for step in range(win_length)))
+    return tuple(patterns)
+
+
+class BoardSpec:
+    """Precomputed tables for one board size and win length"""
+
+    __slots__ = ('size', 'win_length', 'cells', 'full_mask', 'win_patterns',
+                 'win_masks', 'cell_lines', 'neighbors')
+
+    def __init__(self, size, win_length):
+        self.size = size
+        self.win_length = win_length
+        self.cells = size * size
+        self.full_mask = (1 << self.cells) - 1
+        self.win_patterns = _generate_win_patterns(size, win_length)
+        self.win_masks = tuple(sum(1 << cell for cell in pattern)
+                               for pattern in self.win_patterns)
+        # Indices of the lines passing through each cell
+        self.cell_lines = tuple(
+            tuple(index for index, mask in enumerate(self.win_masks)
+                  if mask >> cell & 1)
+            for cell in range(self.cells))
+        # Mask of the (up to eight) cells adjacent to each cell
+        self.neighbors = tuple(self._neighbor_mask(cell)
+                               for cell in range(self.cells))
+
+    def __repr__(self):
+        return f"BoardSpec(size={self.size}, win_length={self.win_length})"
+
+    def _neighbor_mask(self, cell):
+        row, col = divmod(cell, self.size)
+        mask = 0
+        for row_step in (-1, 0, 1):
+            for col_step in (-1, 0, 1):
+                r, c = row + row_step, col + col_step
+                if (r, c) != (row, col) and 0 <= r < self.size \
+                        and 0 <= c < self.size:
+                    mask |= 1 << (r * self.size + c)
+        return mask
+
+    def completes_line(self, mask, position):
+        """Return True if mask holds a completed line through position"""
+        win_masks = self.win_masks
+        for index in self.cell_lines[position]:
+            line = win_masks[index]
+            if mask & line == line:
+                return True
+        return False
+
+
+@lru_cache(maxsize=None)
+def board_spec(size=3, win_length=3):
+    """Return the shared BoardSpec for a board size and win length"""
+    if not 1 <= win_length <= size:
+        raise ValueError(f"Win length {win_length} does not fit a "
+                         f"{size}x{size} board")
+    return BoardSpec(size, win_length)
+
+
+CLASSIC = board_spec(3, 3)
+
+
+def other_player(player):
+    return 'O' if player == 'X' else 'X'
+
+
+def has_won(mask):
+    """Return True if a single-player 3x3 mask contains a completed line"""
+    return WINNING_LINE[mask] >= 0
+
+
+@lru_cache(maxsize=4096)
+def board_to_masks(board_state):
+    """Convert a board string into its (x_mask, o_mask) pair"""
+    x_mask = o_mask = 0
+    for cell, value in enumerate(board_state):
+        if value == 'X':
+            x_mask |= 1 << cell
+        elif value == 'O':
+            o_mask |= 1 << cell
+    return x_mask, o_mask
+
+
+def masks_to_board(x_mask, o_mask, cells=CELLS):
+    """Convert an (x_mask, o_mask) pair back into a board string"""
+    return ''.join('X' if x_mask >> cell & 1 else
+                   'O' if o_mask >> cell & 1 else ' '
+                   for cell in range(cells))
+
+
+class GameState:
+    """
+    Mutable engine-level position: two player masks and the side to move.
+
+    Alongside the masks the state keeps, for each player, how many of that
+    player's stones lie on every winning line. ``apply`` and ``undo`` only
+    touch the lines through the cell being played, so win and draw
+    detection cost O(lines through the cell) rather than a rescan of every
+    line. Masks must therefore only be changed through ``apply``/``undo``.
+    """
+
+    __slots__ = ('x', 'o', 'turn', 'spec', 'x_counts', 'o_counts',
+                 'history', '_winner')
+
+    def __init__(self, x=0, o=0, turn='X', spec=CLASSIC):
+        self.x = x
+        self.o = o
+        self.turn = turn
+        self.spec = spec
+        self.x_counts = [(x & line).bit_count() for line in spec.win_masks]
+        self.o_counts = [(o & line).bit_count() for line in spec.win_masks]
+        # (position, player, winner before the move) per applied move
+        self.history = []
+        if spec.win_length in self.x_counts:
+            self._winner = 'X'
+        elif spec.win_length in self.o_counts:
+            self._winner = 'O'
+        else:
+            self._winner = None
+
+    @classmethod
+    def from_board(cls, board_state, turn='X', size=3, win_length=3):
+        x_mask, o_mask = board_to_masks(board_state)
+        return cls(x_mask, o_mask, turn, board_spec(size, win_length))
+
+    def __repr__(self):
+        return (f"GameState({self.to_board()!r}, turn={self.turn!r}, "
+                f"size={self.spec.size}, win_length={self.spec.win_length})")
+
+    def __eq__(self, other):
+        if not isinstance(other, GameState):
+            return NotImplemented
+        return ((self.x, self.o, self.turn, self.spec) ==
+                (other.x, other.o, other.turn, other.spec))
+
+    def __hash__(self):
+        return hash((self.x, self.o, self.turn, self.spec))
+
+    def copy(self):
+        """Return an independent copy without the undo history"""
+        state = GameState.__new__(GameState)
+        state.x = self.x
+        state.o = self.o
+        state.turn = self.turn
+        state.spec = self.spec
+        state.x_counts = self.x_counts[:]
+        state.o_counts = self.o_counts[:]
+        state.history = []
+        state._winner = self._winner
+        return state
+
+    def to_board(self):
+        return masks_to_board(self.x, self.o, self.spec.cells)
+
+    @property
+    def occupied(self):
+        return self.x | self.o
+
+    def mask_for(self, player):
+        return self.x if player == 'X' else self.o
+
+    def counts_for(self, player):
+        return self.x_counts if player == 'X' else self.o_counts
+
+    def is_empty(self, position):
+        return not (self.x | self.o) >> position & 1
+
+    def is_legal(self, position):
+        """Return True if the side to move may play at ``position``"""
+        return (0 <= position < self.spec.cells and self.is_empty(position)
+                and self._winner is None)
+
+    def available_moves(self):
+        free = ~(self.x | self.o) & self.spec.full_mask
+        return [cell for cell in range(self.spec.cells) if free >> cell & 1]
+
+    def apply(self, position, player=None):
+        """
+        Place ``player`` (default: the side to move) at ``position`` and
+        pass the turn. Legality is the caller's responsibility.
+        """
+        player = player or self.turn
+        self.history.append((position, player, self._winner))
+        if player == 'X':
+            self.x |= 1 << position
+            counts = self.x_counts
+        else:
+            self.o |= 1 << position
+            counts = self.o_counts
+        win_length = self.spec.win_length
+        for line in self.spec.cell_lines[position]:
+            counts[line] += 1
+            if counts[line] == win_length and self._winner is None:
+                self._winner = player
+        self.turn = other_player(player)
+
+    def undo(self):
+        """Take back the last applied move and return its position"""
+        position, player, winner = self.history.pop()
+        if player == 'X':
+            self.x &= ~(1 << position)
+            counts = self.x_counts
+        else:
+            self.o &= ~(1 << position)
+            counts = self.o_counts
+        for line in self.spec.cell_lines[position]:
+            counts[line] -= 1
+        self._winner = winner
+        self.turn = player
+        return position
+
+    def completes_line(self, position, player=None):
+        """Return True if playing ``position`` would win for ``player``"""
+        counts = self.counts_for(player or self.turn)
+        target = self.spec.win_length - 1
+        # With the cell empty, k-1 stones on a k-cell line through it
+        # means the line holds none of the opponent's stones.
+        for line in self.spec.cell_lines[position]:
+            if counts[line] == target:
+                return True
+        return False
+
+    def winner(self):
+        """Return 'X' or 'O' if that player has a completed line, else None"""
+        return self._winner
+
+    def winning_line(self):
+        """Return the cells of the first completed line, or None"""
+        win_length = self.spec.win_length
+        for counts in (self.x_counts, self.o_counts):
+            for line, count in enumerate(counts):
+                if count == win_length:
+                    return self.spec.win_patterns[line]
+        return None
+
+    def is_full(self):
+        return self.x | self.o == self.spec.full_mask
+
+    def is_draw(self):
+        return self._winner is None and self.is_full()
+
+    def is_over(self):
+        return self._winner is not None or self.is_full()
@@ -0,0 +1,230 @@
+"""
+Server-Sent Events for live board updates.
+
+Every committed move publishes a compact delta -- the cells just played,
+whose turn it is, the status and any winning line -- to an in-process
+broker, which fans it out to the viewers streaming that game. Event ids
+are the game's version, so a reconnecting EventSource's Last-Event-ID
+says exactly what it has seen: missed events are replayed from a short
+per-game history, or, when that doesn't reach back far enough, replaced by
+a full snapshot of the board.
+
+The broker only sees moves committed in this process. With several
+workers, a stream also checks the game's version in the database at every
+heartbeat and sends a snapshot when another worker has moved the game on.
+"""
+import asyncio
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Events kept per game for Last-Event-ID replay
+HISTORY = 32
+# Games whose history is kept
+MAX_GAMES = 1024
+# Client reconnect delay sent in the stream, in milliseconds
+RETRY_MS = 3000
+
+
+class Event:
+    __slots__ = ('id', 'name', 'data')
+
+    def __init__(self, event_id, name, data):
+        self.id = event_id
+        self.name = name
+        self.data = data
+
+    def __repr__(self):
+        return f"Event({self.id}, {self.name!r})"
+
+    def encode(self):
+        """Return the event in text/event-stream framing"""
+        data = json.dumps(self.data, separators=(',', ':'))
+        return f"id: {self.id}\nevent: {self.name}\ndata: {data}\n\n"
+
+
+def move_event(game, moves):
+    """Delta event for ``(position, player)`` moves just committed"""
+    return Event(game.version, 'move', {
+        'moves': [[position, player] for position, player in moves],
+        'current_turn': game.current_turn,
+        'status': game.status,
+        'status_display': game.get_status_display(),
+        'winning_pattern': game.get_winning_pattern(),
+        'version': game.version,
+    })
+
+
+def snapshot_event(game):
+    """Full-state event, for viewers too far behind to replay"""
+    return Event(game.version, 'snapshot', {
+        'board_state': game.board_state,
+        'current_turn': game.current_turn,
+        'status': game.status,
+        'status_display': game.get_status_display(),
+        'winning_pattern': game.get_winning_pattern(),
+        'version': game.version,
+    })
+
+
+class Subscription:
+    """One viewer's queue of events for a game"""
+
+    def __init__(self, game_id, loop=None):
+        self.game_id = game_id
+        self.loop = loop
+        self.queue = asyncio.Queue() if loop is not None else queue.Queue()
+
+    def put(self, event):
+        # Publishers run on request threads; hand async viewers their
+        # events through their own event loop.
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+        else:
+            self.queue.put(event)
+
+    def get(self, timeout):
+        """Return the next event, or None after ``timeout`` seconds"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def aget(self, timeout):
+        """Async version of get()"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBroker:
+    """In-process fan-out of game events with a short replay history"""
+
+    def __init__(self, history=HISTORY, max_games=MAX_GAMES):
+        self.history = history
+        self.max_games = max_games
+        self._events = OrderedDict()
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def publish(self, game_id, event):
+        with self._lock:
+            events = self._events.get(game_id)
+            if events is None:
+                events = self._events[game_id] = deque(maxlen=self.history)
+                while len(self._events) > self.max_games:
+                    self._events.popitem(last=False)
+            else:
+                self._events.move_to_end(game_id)
+            events.append(event)
+            subscribers = list(self._subscribers.get(game_id, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def subscribe(self, game_id, loop=None):
+        subscription = Subscription(game_id, loop)
+        with self._lock:
+            self._subscribers.setdefault(game_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.game_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.game_id]
+
+    def replay(self, game_id, after_id, until_id):
+        """
+        Return the events after ``after_id`` up to ``until_id``, or None
+        if the history no longer holds every one of them.
+        """
+        with self._lock:
+            events = [event for event in self._events.get(game_id, ())
+                      if after_id < event.id <= until_id]
+        ids = [event.id for event in events]
+        if ids != list(range(after_id + 1, until_id + 1)):
+            return None
+        return events
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+
+
+broker = EventBroker()
+
+
+def _catch_up(game, since):
+    """Events bringing a viewer at version ``since`` up to ``game``"""
+    if since is None or since > game.version:
+        return [snapshot_event(game)]
+    if since == game.version:
+        return []
+    missed = broker.replay(game.pk, since, game.version)
+    return missed if missed is not None else [snapshot_event(game)]
+
+
+def stream(game_id, since, load_game, heartbeat, max_seconds):
+    """
+    Yield text/event-stream chunks for a game until it finishes or
+    ``max_seconds`` pass (the client then reconnects with Last-Event-ID).
+    ``load_game(game_id)`` reads the game from the database.
+    """
+    subscription = broker.subscribe(game_id)
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        game = load_game(game_id)
+        last_id = game.version
+        for event in _catch_up(game, since):
+            yield event.encode()
+        finished = game.status != 'IN_PROGRESS'
+        deadline = time.monotonic() + max_seconds
+        while not finished and time.monotonic() < deadline:
+            event = subscription.get(heartbeat)
+            if event is None:
+                # Catches moves made by other worker processes
+                game = load_game(game_id)
+                if game.version <= last_id:
+                    yield ": ping\n\n"
+                    continue
+                event = snapshot_event(game)
+            if event.id <= last_id:
+                continue
+            last_id = event.id
+            finished = event.data['status'] != 'IN_PROGRESS'
+            yield event.encode()
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def astream(game_id, since, aload_game, heartbeat, max_seconds):
+    """Async version of stream(); ``aload_game`` is a coroutine function"""
+    subscription = broker.subscribe(game_id, asyncio.get_running_loop())
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        game = await aload_game(game_id)
+        last_id = game.version
+        for event in _catch_up(game, since):
+            yield event.encode()
+        finished = game.status != 'IN_PROGRESS'
+        deadline = time.monotonic() + max_seconds
+        while not finished and time.monotonic() < deadline:
+            event = await subscription.aget(heartbeat)
+            if event is None:
+                game = await aload_game(game_id)
+                if game.version <= last_id:
+                    yield ": ping\n\n"
+                    continue
+                event = snapshot_event(game)
+            if event.id <= last_id:
+                continue
+            last_id = event.id
+            finished = event.data['status'] != 'IN_PROGRESS'
+            yield event.encode()
+    finally:
+        broker.unsubscribe(subscription)
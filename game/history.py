@@ -0,0 +1,249 @@
+"""
+Streaming export and import of game history.
+
+``manage.py export_games`` writes every game with its moves, in play
+order, to a file; ``manage.py import_games`` loads such a file back. Both
+work a chunk of games at a time, so memory use doesn't grow with the
+number of games, and both can resume from a checkpoint after stopping
+part way through.
+
+Two formats are supported:
+
+* ``jsonl``: one JSON object per game per line, the same record the
+  archive uses (see ``archive.to_record``).
+* ``binary``: a file header, then one record per game. Records vary in
+  length: each starts with a fixed-size header (``GAME``) giving the
+  board size and the number of moves, and these set the length of the
+  rest: board_size * board_size board cells, then one fixed-size entry
+  (``MOVE``) per move. Names are length-prefixed in fixed fields; times
+  are microseconds since the Unix epoch, UTC. There is no move log
+  field: import packs it again from the moves.
+
+Moves are read through ``Game.move_history()``, so games without Move rows
+export their move logs' moves. Import inserts Move rows only when
+GAME_MOVE_ROWS is on (the default).
+
+Games keep their ids, so a game imported into a sharded database lands on
+the shard its id points to. Games that already exist are skipped, which
+makes an interrupted import safe to run again. Scores aren't part of the
+history; they are left as they are.
+"""
+import json
+import struct
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.db.models import Prefetch
+
+from . import archive, movelog, shards
+from .models import Game, GameId, Move
+
+FORMATS = ('jsonl', 'binary')
+
+BINARY_MAGIC = b'GAMEHIS1'
+# id, created_at, updated_at, version, board_size, win_length, status,
+# current_turn, flags, number of moves, player_x_name, player_o_name
+GAME = struct.Struct('<QqqIBBBBBH121p121p')
+# Flags
+AI_GAME = 1
+# position, player, created_at
+MOVE = struct.Struct('<Hcq')
+NO_TIME = -2 ** 63
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+STATUSES = [status for status, _ in Game.STATUS_CHOICES]
+TURNS = 'XO'
+
+
+def guess_format(path):
+    return 'jsonl' if str(path).endswith(('.jsonl', '.json')) else 'binary'
+
+
+def games_with_moves(queryset, chunk_size):
+    """
+    Yield ``(game, moves)`` for a queryset of games, reading chunk_size
+    games at a time. Moves come from ``Game.move_history()``; the Move
+    rows of games without a move log are prefetched per chunk.
+    """
+    games = queryset.prefetch_related(
+        Prefetch('moves', queryset=Move.objects.order_by('id')))
+    for game in games.iterator(chunk_size=chunk_size):
+        yield game, game.move_history()
+
+
+def _micros(value):
+    if value is None:
+        return NO_TIME
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(value):
+    if value == NO_TIME:
+        return None
+    return EPOCH + timedelta(microseconds=value)
+
+
+def header(fmt):
+    """Bytes a file of format ``fmt`` starts with"""
+    return BINARY_MAGIC if fmt == 'binary' else b''
+
+
+def encode(fmt, game, moves):
+    """One game and its moves as bytes of format ``fmt``"""
+    if fmt == 'jsonl':
+        record = archive.to_record(game, moves)
+        return json.dumps(record, separators=(',', ':')).encode() + b'\n'
+    flags = AI_GAME if game.is_ai_game else 0
+    parts = [
+        GAME.pack(game.pk, _micros(game.created_at),
+                  _micros(game.updated_at), game.version, game.board_size,
+                  game.win_length, STATUSES.index(game.status),
+                  TURNS.index(game.current_turn), flags,
+                  len(moves), game.player_x_name.encode(),
+                  game.player_o_name.encode()),
+        game.board_state.encode('ascii'),
+    ]
+    parts.extend(MOVE.pack(move.position, move.player.encode('ascii'),
+                           _micros(move.created_at))
+                 for move in moves)
+    return b''.join(parts)
+
+
+def _read_binary_game(file):
+    data = file.read(GAME.size)
+    if not data:
+        return None
+    if len(data) < GAME.size:
+        raise ValueError("Truncated game record")
+    (game_id, created_at, updated_at, version, board_size, win_length,
+     status, turn, flags, move_count, player_x_name,
+     player_o_name) = GAME.unpack(data)
+    cells = board_size * board_size
+    board_state = file.read(cells).decode('ascii')
+    move_data = file.read(move_count * MOVE.size)
+    if len(board_state) < cells or len(move_data) < move_count * MOVE.size:
+        raise ValueError("Truncated game record")
+    game = Game(
+        id=game_id, created_at=_from_micros(created_at),
+        updated_at=_from_micros(updated_at), version=version,
+        board_size=board_size, win_length=win_length,
+        board_state=board_state, status=STATUSES[status],
+        current_turn=TURNS[turn], is_ai_game=bool(flags & AI_GAME),
+        player_x_name=player_x_name.decode(),
+        player_o_name=player_o_name.decode())
+    moves = [Move(game=game, position=position, player=player.decode(),
+                  created_at=_from_micros(created_at))
+             for position, player, created_at in MOVE.iter_unpack(move_data)]
+    return game, moves
+
+
+def _pack_log(game, moves):
+    """Rebuild a game's move log from its moves"""
+    timed = all(move.created_at is not None for move in moves)
+    entries = []
+    last_at = game.created_at
+    for move in moves:
+        delta_ms = None
+        if timed and last_at is not None:
+            delta_ms = (move.created_at - last_at) / timedelta(milliseconds=1)
+            last_at = move.created_at
+        entries.append((move.player, move.position, delta_ms))
+    return movelog.pack(entries, timed=timed) if moves else b''
+
+
+def read_games(file, fmt, offset=0):
+    """
+    Yield ``(game, moves, end)`` from a binary-mode file of format
+    ``fmt``, starting at byte ``offset`` (0 for the start of the file);
+    ``end`` is the offset just after the game, for checkpoints.
+    """
+    if offset == 0:
+        magic = file.read(len(header(fmt)))
+        if magic != header(fmt):
+            raise ValueError("Not a binary game history file")
+    else:
+        file.seek(offset)
+    while True:
+        if fmt == 'jsonl':
+            line = file.readline()
+            if not line:
+                return
+            if not line.strip():
+                continue
+            game, moves = archive.from_record(json.loads(line))
+        else:
+            result = _read_binary_game(file)
+            if result is None:
+                return
+            game, moves = result
+        if not game.move_log:
+            game.move_log = _pack_log(game, moves)
+        yield game, moves, file.tell()
+
+
+def _bulk_create(queryset, objs, timestamps, batch_size):
+    """
+    ``bulk_create`` keeping the objects' own ``timestamps``, which
+    auto_now and auto_now_add replace with the current time on insert:
+    they are written back with ``bulk_update``, so the caller's
+    transaction never commits the current times.
+    """
+    values = [[getattr(obj, name) for name in timestamps] for obj in objs]
+    queryset.bulk_create(objs, batch_size=batch_size)
+    for obj, times in zip(objs, values):
+        for name, value in zip(timestamps, times):
+            setattr(obj, name, value)
+    queryset.bulk_update(objs, timestamps, batch_size=batch_size)
+
+
+def import_chunk(items, batch_size=None):
+    """
+    Insert ``(game, moves)`` pairs whose games don't exist yet, with one
+    transaction per shard, and their Move rows if GAME_MOVE_ROWS is on (the default).
+    Returns the number of games inserted.
+    """
+    move_rows = getattr(settings, 'GAME_MOVE_ROWS', True)
+    by_alias = {}
+    for game, moves in items:
+        by_alias.setdefault(shards.for_game(game.pk), []).append(
+            (game, moves))
+    imported = 0
+    for alias, pairs in by_alias.items():
+        with transaction.atomic(using=alias):
+            existing = set(Game.objects.using(alias).filter(
+                id__in=[game.pk for game, _ in pairs]
+            ).values_list('id', flat=True))
+            pairs = [(game, moves) for game, moves in pairs
+                     if game.pk not in existing]
+            _bulk_create(Game.objects.using(alias),
+                         [game for game, _ in pairs],
+                         ['created_at', 'updated_at'], batch_size)
+            if move_rows:
+                _bulk_create(Move.objects.using(alias),
+                             [move for _, moves in pairs for move in moves],
+                             ['created_at'], batch_size)
+        imported += len(pairs)
+    return imported
+
+
+def reset_sequences():
+    """
+    Move id allocation past the imported ids: the databases' sequences,
+    and, when sharded, each shard's GameId tickets.
+    """
+    for alias in shards.aliases():
+        if shards.sharded():
+            last = (Game.objects.using(alias).order_by('-id')
+                    .values_list('id', flat=True).first())
+            if last is not None:
+                GameId.objects.using(alias).bulk_create(
+                    [GameId(pk=last // len(shards.aliases()))],
+                    ignore_conflicts=True)
+        connection = connections[alias]
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [Game, Move, GameId])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
@@ -0,0 +1,80 @@
+"""
+Per-process cache of in-progress games for the move endpoint.
+
+A game being played is read on every move, usually by the worker that
+wrote it a moment earlier. This module keeps the last committed state of
+recently played games -- the engine.GameState plus the game's other column
+values, not an ORM instance -- in a bounded LRU keyed by game id, so
+``Game.for_move`` can rebuild the game without a SELECT.
+
+The cache is only ever a guess about the database. Entries are written
+when a game is created and after each move's transaction commits, and
+dropped as soon as a game finishes. Moves are saved with an UPDATE
+conditional on the game's ``version``, so a move made on a cached game
+that another worker has written since matches nothing; ``StaleGame`` is
+raised and the caller retries from a fresh read.
+"""
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAXSIZE = 1024
+
+
+class HotGameCache:
+    """Bounded LRU of ``game_id -> (engine state, column values)``"""
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, game_id):
+        return game_id in self._entries
+
+    def get(self, game_id):
+        """Return ``(state, values)`` for a game, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(game_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(game_id)
+            self.hits += 1
+        state, values = entry
+        # Callers play moves on the state; keep the cached one pristine
+        return state.copy(), dict(values)
+
+    def put(self, game_id, state, values):
+        """Store a game's committed state, evicting the least recent"""
+        with self._lock:
+            self._entries[game_id] = (state.copy(), dict(values))
+            self._entries.move_to_end(game_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def evict(self, game_id):
+        with self._lock:
+            self._entries.pop(game_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """Return hit/miss counters and current occupancy"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+        }
+
+
+games = HotGameCache()
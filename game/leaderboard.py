@@ -0,0 +1,132 @@
+"""
+Cached first page of the scoreboard.
+
+The scoreboard changes only when a game finishes, so its first page is
+kept in Django's cache (the alias named by GAME_LEADERBOARD_CACHE, any
+backend -- locmem and file-based both work) and rebuilt from the database
+at most once per finished game:
+
+* ``Score.increment`` (which ``Game.update_scores`` goes through) calls
+  ``invalidate`` once its transaction commits, which bumps a generation
+  counter. A cached page is only served while its generation is current,
+  so a rebuild that read the database before the commit can't overwrite
+  the newer state with an older one.
+* On a miss a single worker rebuilds, holding a short lock taken with
+  ``cache.add``. Everyone else serves the previous page while it is being
+  rebuilt, or, if there is none yet, waits briefly for the new one before
+  falling back to reading the database themselves.
+
+Pages are always built from the primary database: one built from a
+lagging read replica would be cached as current.
+"""
+import asyncio
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .routers import primary_reads
+
+PAGE_KEY = 'game:leaderboard:page'
+STALE_KEY = 'game:leaderboard:stale'
+GENERATION_KEY = 'game:leaderboard:generation'
+LOCK_KEY = 'game:leaderboard:lock'
+
+# Seconds a rebuild may hold the lock, and how long others wait on it
+LOCK_TIMEOUT = 10
+WAIT_SECONDS = 0.5
+_POLL_SECONDS = 0.02
+
+
+def _cache():
+    return caches[getattr(settings, 'GAME_LEADERBOARD_CACHE', 'default')]
+
+
+def _ttl():
+    return getattr(settings, 'GAME_LEADERBOARD_CACHE_TTL', 60)
+
+
+def invalidate():
+    """Mark the cached page out of date; the next read rebuilds it"""
+    cache = _cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        # No counter yet (first write, or evicted): any cached page was
+        # built without one, so starting one retires it.
+        cache.add(GENERATION_KEY, 1, None)
+
+
+def first_page(build, limit):
+    """
+    Return ``build(limit=limit)`` -- e.g. Score.leaderboard's (scores,
+    next_cursor) pair -- from the cache when it is current, rebuilding it
+    at most once at a time.
+    """
+    if not _ttl():
+        return build(limit=limit)
+    cache = _cache()
+    found = cache.get_many([PAGE_KEY, GENERATION_KEY])
+    generation = found.get(GENERATION_KEY, 0)
+    entry = found.get(PAGE_KEY)
+    if entry is not None and entry[:2] == (generation, limit):
+        return entry[2]
+
+    if cache.add(LOCK_KEY, 1, LOCK_TIMEOUT):
+        try:
+            with primary_reads():
+                page = build(limit=limit)
+            entry = (generation, limit, page)
+            cache.set(PAGE_KEY, entry, _ttl())
+            # Kept past the TTL so there is always something to serve
+            # while the next rebuild runs
+            cache.set(STALE_KEY, entry, None)
+        finally:
+            cache.delete(LOCK_KEY)
+        return page
+
+    # Someone else is rebuilding
+    stale = cache.get(STALE_KEY)
+    if stale is not None and stale[1] == limit:
+        return stale[2]
+    deadline = time.monotonic() + WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(_POLL_SECONDS)
+        entry = cache.get(PAGE_KEY)
+        if entry is not None and entry[1] == limit:
+            return entry[2]
+    return build(limit=limit)
+
+
+async def afirst_page(build, limit):
+    """Async version of first_page(); ``build`` is a coroutine function"""
+    if not _ttl():
+        return await build(limit=limit)
+    cache = _cache()
+    found = await cache.aget_many([PAGE_KEY, GENERATION_KEY])
+    generation = found.get(GENERATION_KEY, 0)
+    entry = found.get(PAGE_KEY)
+    if entry is not None and entry[:2] == (generation, limit):
+        return entry[2]
+
+    if await cache.aadd(LOCK_KEY, 1, LOCK_TIMEOUT):
+        try:
+            with primary_reads():
+                page = await build(limit=limit)
+            entry = (generation, limit, page)
+            await cache.aset(PAGE_KEY, entry, _ttl())
+            await cache.aset(STALE_KEY, entry, None)
+        finally:
+            await cache.adelete(LOCK_KEY)
+        return page
+
+    stale = await cache.aget(STALE_KEY)
+    if stale is not None and stale[1] == limit:
+        return stale[2]
+    deadline = time.monotonic() + WAIT_SECONDS
+    while time.monotonic() < deadline:
+        await asyncio.sleep(_POLL_SECONDS)
+        entry = await cache.aget(PAGE_KEY)
+        if entry is not None and entry[1] == limit:
+            return entry[2]
+    return await build(limit=limit)
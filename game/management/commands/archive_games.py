@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from game import archive, shards
+from game.models import Game, Move
+
+
+class Command(BaseCommand):
+    help = ("Move finished games older than a cutoff, with their moves, "
+            "from the database to the archive segments in GAME_ARCHIVE_DIR")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            default=getattr(settings, 'GAME_ARCHIVE_AFTER_DAYS', 30),
+            help="Archive games finished more than this many days ago")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Games read, written and deleted at a time")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Count the games without archiving them")
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['batch_size'] < 1:
+            raise CommandError("--days must be >= 0 and --batch-size >= 1")
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        finished = (Game.objects.exclude(status='IN_PROGRESS')
+                    .filter(updated_at__lt=cutoff).order_by('id')
+                    # Rows for games without a move log
+                    .prefetch_related(Prefetch(
+                        'moves', queryset=Move.objects.order_by('id'))))
+
+        if options['dry_run']:
+            count = sum(queryset.count() for queryset in shards.each(finished))
+            self.stdout.write(f"{count} games would be archived")
+            return
+
+        archived = 0
+        with archive.SegmentWriter() as writer:
+            for queryset in shards.each(finished):
+                archived += self._archive(queryset, writer,
+                                          options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} games"))
+
+    def _archive(self, finished, writer, batch_size):
+        """Archive one database's games, a keyset-paginated batch at a time"""
+        alias = finished.db
+        archived = 0
+        last_id = 0
+        while True:
+            games = list(finished.filter(id__gt=last_id)[:batch_size])
+            if not games:
+                return archived
+            ids = [game.id for game in games]
+            for game in games:
+                writer.append(game, game.move_history())
+            # Only delete what is safely on disk
+            writer.sync()
+            with transaction.atomic(using=alias):
+                Game.objects.using(alias).filter(id__in=ids).delete()
+            archived += len(games)
+            last_id = ids[-1]
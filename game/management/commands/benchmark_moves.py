@@ -0,0 +1,143 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections, connections
+
+from game import engine, events, hotcache, shards
+from game.models import Game
+
+
+class Command(BaseCommand):
+    help = ("Measure moves per second under the current database profile, "
+            "in the scratch 'benchmark' database, which is emptied first. "
+            "Run once per profile, e.g. with and without "
+            "GAME_DB_PROFILE=production, to compare; --batch measures bots "
+            "submitting whole games at once.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='benchmark',
+                            help="Alias of the database to empty and play "
+                                 "in; never one holding games")
+        parser.add_argument('--games', type=int, default=200,
+                            help="Two-player 3x3 games to play")
+        parser.add_argument('--threads', type=int, default=4,
+                            help="Games played concurrently, one "
+                                 "connection per thread")
+        parser.add_argument('--batch', action='store_true',
+                            help="Write each game's moves with one "
+                                 "play_moves() call instead of one "
+                                 "play_turn() per move")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        database = options['database']
+        if database not in connections:
+            raise CommandError(f"No database {database!r} in DATABASES")
+        if database in (*shards.aliases(),
+                        *getattr(settings, 'GAME_DB_REPLICAS', ())):
+            raise CommandError(f"{database!r} holds games; the benchmark "
+                               "empties its database first")
+        if shards.sharded():
+            raise CommandError("The benchmark keeps scores next to its "
+                               "games; unset GAME_DB_SHARDS")
+        call_command('migrate', database=database, verbosity=0)
+        call_command('flush', database=database, interactive=False,
+                     verbosity=0)
+        # The caches are keyed by game id, and ids here mean other games
+        hotcache.games.clear()
+        try:
+            moves, errors, elapsed = self._run(database, options)
+        finally:
+            hotcache.games.clear()
+            events.broker.clear()
+
+        conn_max_age = connections[database].settings_dict.get(
+            'CONN_MAX_AGE', 0)
+        self.stdout.write(
+            f"Profile {getattr(settings, 'GAME_DB_PROFILE', 'development')} "
+            f"(CONN_MAX_AGE={conn_max_age}, pragmas "
+            f"{getattr(settings, 'GAME_SQLITE_PRAGMAS', None) or 'none'})")
+        self.stdout.write(self.style.SUCCESS(
+            f"{moves} moves in {elapsed:.2f}s: {moves / elapsed:.0f} moves/s "
+            f"with {options['threads']} threads"
+            f"{', in batches' if options['batch'] else ''}, "
+            f"{errors} errors"))
+
+    def _run(self, database, options):
+        game_ids = [game.id for game in Game.create_many(
+            [Game.new('Bench X', 'Bench O')
+             for _ in range(options['games'])], using=database)]
+        connections[database].close()
+        shares = [game_ids[i::options['threads']]
+                  for i in range(options['threads'])]
+        counts = [[0, 0] for _ in shares]
+        play = self._play_batches if options['batch'] else self._play
+        threads = [
+            threading.Thread(target=play,
+                             args=(database, share, count,
+                                   options['seed'] + i))
+            for i, (share, count) in enumerate(zip(shares, counts))]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        return (sum(moves for moves, _ in counts),
+                sum(errors for _, errors in counts), elapsed)
+
+    def _play(self, database, game_ids, count, seed):
+        """Play games to the end, one simulated request per move"""
+        rng = random.Random(seed)
+        try:
+            for game_id in game_ids:
+                while True:
+                    # As Django does at the start and end of each request:
+                    # closes the connection unless CONN_MAX_AGE keeps it
+                    close_old_connections()
+                    try:
+                        # Read as the move views do
+                        game = Game.for_move(game_id, using=database)
+                        if game.status != 'IN_PROGRESS':
+                            break
+                        free = [i for i, cell in enumerate(game.board_state)
+                                if cell == ' ']
+                        game.play_turn(rng.choice(free), game.current_turn)
+                        count[0] += 1
+                    except DatabaseError:
+                        count[1] += 1
+                    finally:
+                        close_old_connections()
+        finally:
+            connections.close_all()
+
+    def _play_batches(self, database, game_ids, count, seed):
+        """Play each game in one simulated request to play_moves"""
+        rng = random.Random(seed)
+        try:
+            for game_id in game_ids:
+                state = engine.GameState.from_board(' ' * 9, 'X')
+                moves = []
+                while not state.is_over():
+                    position = rng.choice(state.available_moves())
+                    moves.append((position, state.turn))
+                    state.apply(position)
+                close_old_connections()
+                try:
+                    game = Game.for_move(game_id, using=database)
+                    success, _, _ = game.play_moves(moves)
+                    if success:
+                        count[0] += len(moves)
+                    else:
+                        count[1] += 1
+                except DatabaseError:
+                    count[1] += 1
+                finally:
+                    close_old_connections()
+        finally:
+            connections.close_all()
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from game.models import Game
+
+
+class Command(BaseCommand):
+    help = ("Create many games at once, e.g. to seed a load test or a "
+            "tournament, with one INSERT per batch")
+
+    def add_arguments(self, parser):
+        parser.add_argument('count', type=int, help="Number of games")
+        parser.add_argument('--player-x', default='Player X',
+                            help="Name of player X")
+        parser.add_argument('--player-o', default='Player O',
+                            help="Name of player O (ignored for AI games)")
+        parser.add_argument('--board-size', type=int, default=3,
+                            choices=sorted(Game.WIN_LENGTHS))
+        parser.add_argument('--ai', action='store_true',
+                            help="Create games against the AI")
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Games per INSERT (default: "
+                                 "GAME_BULK_CREATE_BATCH_SIZE)")
+        parser.add_argument('--ids', action='store_true',
+                            help="Print the new games' ids, one per line")
+
+    def handle(self, *args, **options):
+        if options['count'] < 1:
+            raise CommandError("count must be at least 1")
+        games = Game.create_many(
+            [Game.new(options['player_x'], options['player_o'],
+                      options['board_size'], options['ai'])
+             for _ in range(options['count'])],
+            batch_size=options['batch_size'])
+
+        if options['ids']:
+            for game in games:
+                self.stdout.write(str(game.id))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Created {len(games)} games, first id {games[0].id}, "
+                f"last id {games[-1].id}"))
@@ -0,0 +1,76 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from game import history, shards
+from game.models import Game
+
+
+class Command(BaseCommand):
+    help = ("Stream every game, with its moves, to a JSONL or binary file "
+            "that import_games can load")
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="File to write")
+        parser.add_argument('--format', choices=history.FORMATS,
+                            help="Default: jsonl for .jsonl files, "
+                                 "otherwise binary")
+        parser.add_argument(
+            '--chunk-size', type=int,
+            default=getattr(settings, 'GAME_HISTORY_CHUNK_SIZE', 1000),
+            help="Games read per query and written per checkpoint")
+        parser.add_argument('--resume', action='store_true',
+                            help="Carry on from the output's checkpoint")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+        output = options['output']
+        fmt = options['format'] or history.guess_format(output)
+        checkpoint_path = output + '.checkpoint'
+
+        if options['resume']:
+            try:
+                with open(checkpoint_path) as file:
+                    checkpoint = json.load(file)
+            except FileNotFoundError:
+                raise CommandError(f"No checkpoint at {checkpoint_path}")
+            fmt = checkpoint['format']
+            file = open(output, 'r+b')
+            # Drop whatever was written after the last checkpoint
+            file.truncate(checkpoint['offset'])
+            file.seek(checkpoint['offset'])
+        else:
+            checkpoint = {'format': fmt, 'offset': 0, 'last_ids': {}}
+            file = open(output, 'wb')
+            file.write(history.header(fmt))
+
+        exported = 0
+        with file:
+            for queryset in shards.each(Game.objects.order_by('id')):
+                last_id = checkpoint['last_ids'].get(queryset.db, 0)
+                games = history.games_with_moves(
+                    queryset.filter(id__gt=last_id), options['chunk_size'])
+                for game, moves in games:
+                    file.write(history.encode(fmt, game, moves))
+                    checkpoint['last_ids'][queryset.db] = game.id
+                    exported += 1
+                    if exported % options['chunk_size'] == 0:
+                        self._checkpoint(file, checkpoint, checkpoint_path)
+            file.flush()
+            os.fsync(file.fileno())
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {exported} games to {output}"))
+
+    def _checkpoint(self, file, checkpoint, path):
+        """Record how far the export got, once it is safely on disk"""
+        file.flush()
+        os.fsync(file.fileno())
+        checkpoint['offset'] = file.tell()
+        with open(path + '.tmp', 'w') as out:
+            json.dump(checkpoint, out)
+        os.replace(path + '.tmp', path)
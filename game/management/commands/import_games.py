@@ -0,0 +1,71 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from game import history
+
+
+class Command(BaseCommand):
+    help = ("Load games and their moves from a file written by "
+            "export_games, skipping games that already exist")
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="File to read")
+        parser.add_argument('--format', choices=history.FORMATS,
+                            help="Default: jsonl for .jsonl files, "
+                                 "otherwise binary")
+        parser.add_argument(
+            '--chunk-size', type=int,
+            default=getattr(settings, 'GAME_HISTORY_CHUNK_SIZE', 1000),
+            help="Games inserted per transaction and per checkpoint")
+        parser.add_argument('--resume', action='store_true',
+                            help="Carry on from the input's checkpoint")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be at least 1")
+        path = options['input']
+        fmt = options['format'] or history.guess_format(path)
+        checkpoint_path = path + '.checkpoint'
+
+        offset = 0
+        if options['resume']:
+            try:
+                with open(checkpoint_path) as file:
+                    offset = json.load(file)['offset']
+            except FileNotFoundError:
+                raise CommandError(f"No checkpoint at {checkpoint_path}")
+
+        read = imported = 0
+        try:
+            with open(path, 'rb') as file:
+                chunk = []
+                for game, moves, end in history.read_games(file, fmt, offset):
+                    chunk.append((game, moves))
+                    if len(chunk) == chunk_size:
+                        imported += history.import_chunk(chunk, chunk_size)
+                        read += len(chunk)
+                        chunk = []
+                        self._checkpoint(end, checkpoint_path)
+                imported += history.import_chunk(chunk, chunk_size)
+                read += len(chunk)
+        except FileNotFoundError:
+            raise CommandError(f"No such file: {path}")
+        except (ValueError, KeyError, TypeError) as error:
+            raise CommandError(f"Bad game history file {path}: {error}")
+
+        history.reset_sequences()
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} games, skipped {read - imported} "
+            f"that already exist"))
+
+    def _checkpoint(self, offset, path):
+        """Record the input offset up to which games are committed"""
+        with open(path + '.tmp', 'w') as out:
+            json.dump({'offset': offset}, out)
+        os.replace(path + '.tmp', path)
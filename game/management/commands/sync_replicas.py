@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from game import routers
+
+
+class Command(BaseCommand):
+    help = ("Refresh SQLite read replicas (GAME_DB_REPLICAS) with a "
+            "snapshot of the primary, for running replicas locally")
+
+    def add_arguments(self, parser):
+        parser.add_argument('aliases', nargs='*',
+                            help="Replicas to refresh (default: all)")
+
+    def handle(self, *args, **options):
+        replicas = list(getattr(settings, 'GAME_DB_REPLICAS', ()))
+        aliases = options['aliases'] or replicas
+        primary = connections['default']
+        for alias in aliases:
+            if alias not in replicas:
+                raise CommandError(f"{alias} is not in GAME_DB_REPLICAS")
+            replica = connections[alias]
+            if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+                raise CommandError(
+                    "Only SQLite replicas can be copied; use the database's "
+                    "own replication for other backends")
+            replica.close()
+            routers.copy_sqlite(primary, replica.settings_dict['NAME'])
+            self.stdout.write(self.style.SUCCESS(f"Refreshed {alias}"))
@@ -0,0 +1,223 @@
+"""
+Monte Carlo Tree Search for boards too large to search exhaustively.
+
+Search is root-parallel: every worker process grows its own UCT tree from
+the same root with a different random seed and a share of the playouts,
+and the root children's visit counts are summed across workers to choose
+the move. Workers only need the engine module, so they don't set up
+Django. The process pool can be kept warm between requests or created per
+move (see ``get_pool``). Workers are never forked from the server, whose
+request threads may hold locks and database connections at the time:
+they start from the forkserver, or are spawned where there is none.
+"""
+import math
+import multiprocessing
+import os
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from . import engine
+
+DEFAULT_PLAYOUTS = 2000
+DEFAULT_BUDGET_MS = 1000
+
+# UCT exploration constant
+EXPLORATION = math.sqrt(2)
+
+# Warm pools by worker count. A pool is never replaced while in use:
+# changing GAME_MCTS_WORKERS adds a pool instead of cancelling the old
+# one's work.
+_pools = {}
+_pool_lock = threading.Lock()
+
+
+class _Node:
+    __slots__ = ('move', 'parent', 'children', 'untried', 'visits', 'wins')
+
+    def __init__(self, move, parent, untried):
+        self.move = move
+        self.parent = parent
+        self.children = []
+        self.untried = untried
+        self.visits = 0
+        # Playout score for the player who made ``move`` (draws count 1/2)
+        self.wins = 0.0
+
+    def select_child(self):
+        log_visits = math.log(self.visits)
+        return max(self.children, key=lambda child: (
+            child.wins / child.visits
+            + EXPLORATION * math.sqrt(log_visits / child.visits)))
+
+
+def _free_cells(spec, occupied):
+    free = ~occupied & spec.full_mask
+    return [cell for cell in range(spec.cells) if free >> cell & 1]
+
+
+def _rollout(spec, masks, side, last_move, rng):
+    """
+    Play random moves to the end; return the winning side (0 for X, 1 for
+    O) or None for a draw. ``masks`` is mutated.
+    """
+    if last_move is not None and spec.completes_line(masks[1 - side],
+                                                     last_move):
+        return 1 - side
+    moves = _free_cells(spec, masks[0] | masks[1])
+    rng.shuffle(moves)
+    for move in moves:
+        masks[side] |= 1 << move
+        if spec.completes_line(masks[side], move):
+            return side
+        side = 1 - side
+    return None
+
+
+def run_tree(x_mask, o_mask, turn, size, win_length, playouts, deadline,
+             seed):
+    """
+    Grow one UCT tree and return ``{move: visits}`` for the root children.
+
+    ``deadline`` is an absolute ``time.time()`` so it means the same thing
+    in every worker process. Module-level so the pool can pickle it.
+    """
+    spec = engine.board_spec(size, win_length)
+    rng = random.Random(seed)
+    root_side = 0 if turn == 'X' else 1
+    root = _Node(None, None, _free_cells(spec, x_mask | o_mask))
+    rng.shuffle(root.untried)
+
+    for playout in range(playouts):
+        if not playout & 15 and time.time() > deadline:
+            break
+        node = root
+        masks = [x_mask, o_mask]
+        side = root_side
+        last_move = None
+
+        # Selection
+        while not node.untried and node.children:
+            node = node.select_child()
+            masks[side] |= 1 << node.move
+            last_move = node.move
+            side = 1 - side
+        finished = (last_move is not None
+                    and spec.completes_line(masks[1 - side], last_move))
+
+        # Expansion
+        if node.untried and not finished:
+            move = node.untried.pop()
+            masks[side] |= 1 << move
+            last_move = move
+            side = 1 - side
+            child = _Node(move, node,
+                          _free_cells(spec, masks[0] | masks[1]))
+            rng.shuffle(child.untried)
+            node.children.append(child)
+            node = child
+
+        # Simulation
+        winner = _rollout(spec, masks, side, last_move, rng)
+
+        # Backpropagation; ``mover`` made the move leading to ``node``
+        mover = 1 - side
+        while node is not None:
+            node.visits += 1
+            if winner is None:
+                node.wins += 0.5
+            elif winner == mover:
+                node.wins += 1
+            mover = 1 - mover
+            node = node.parent
+
+    return {child.move: child.visits for child in root.children}
+
+
+def _new_pool(workers):
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context(
+        'forkserver' if 'forkserver' in methods else 'spawn')
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+
+def shutdown_pool():
+    """Stop the warm pools' worker processes, if any"""
+    with _pool_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(cancel_futures=True)
+
+
+def get_pool(workers):
+    """Return the process-wide warm pool of ``workers`` processes"""
+    with _pool_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = _new_pool(workers)
+        return pool
+
+
+def _immediate_move(state):
+    """Return a move that wins now, or else one that blocks a win now"""
+    spec = state.spec
+    own = state.mask_for(state.turn)
+    opp = state.mask_for(engine.other_player(state.turn))
+    moves = state.available_moves()
+    for mask in (own, opp):
+        for move in moves:
+            if spec.completes_line(mask | 1 << move, move):
+                return move
+    return None
+
+
+def search(state, playouts=DEFAULT_PLAYOUTS, budget_ms=DEFAULT_BUDGET_MS,
+           workers=None, keep_warm=True):
+    """
+    Return ``{move: visits}`` summed over ``workers`` root-parallel trees.
+
+    ``workers=0`` grows a single tree in the calling process. Otherwise
+    the playouts are split across a process pool, which is reused across
+    calls when ``keep_warm`` is set and torn down afterwards when not.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    deadline = time.time() + budget_ms / 1000
+    args = (state.x, state.o, state.turn, state.spec.size,
+            state.spec.win_length)
+    seed = random.getrandbits(32)
+
+    if workers == 0:
+        return run_tree(*args, playouts, deadline, seed)
+
+    share, extra = divmod(playouts, workers)
+    pool = get_pool(workers) if keep_warm else _new_pool(workers)
+    try:
+        futures = [pool.submit(run_tree, *args,
+                               share + (1 if index < extra else 0),
+                               deadline, seed + index)
+                   for index in range(workers)]
+        totals = {}
+        for future in futures:
+            for move, visits in future.result().items():
+                totals[move] = totals.get(move, 0) + visits
+        return totals
+    finally:
+        if not keep_warm:
+            pool.shutdown()
+
+
+def best_move(state, playouts=DEFAULT_PLAYOUTS, budget_ms=DEFAULT_BUDGET_MS,
+              workers=None, keep_warm=True):
+    """Return the most-visited root move, or None if the game is over"""
+    if state.is_over():
+        return None
+    move = _immediate_move(state)
+    if move is not None:
+        return move
+    visits = search(state, playouts, budget_ms, workers, keep_warm)
+    if not visits:
+        return state.available_moves()[0]
+    return max(visits, key=visits.get)
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0003_game_is_ai_game'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='board_size',
+            field=models.PositiveSmallIntegerField(choices=[(3, '3x3'), (4, '4x4'), (5, '5x5'), (15, '15x15')], default=3),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='win_length',
+            field=models.PositiveSmallIntegerField(default=3),
+        ),
+        migrations.AlterField(
+            model_name='game',
+            name='board_state',
+            field=models.CharField(default='         ', max_length=225),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:02
+
+from itertools import groupby
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+# The move log format as of this migration, frozen here so that later
+# changes to game.movelog don't change what it writes: a flags byte (1 for
+# timed), then per move a varint of position << 1 | side (0 for X, 1 for
+# O) and a varint of milliseconds since the previous move.
+
+def _write_varint(out, value):
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def pack_log(entries):
+    out = bytearray([1])
+    for player, position, delta_ms in entries:
+        _write_varint(out, position << 1 | (player == 'O'))
+        _write_varint(out, max(0, int(delta_ms or 0)))
+    return bytes(out)
+
+
+def backfill_move_log(apps, schema_editor):
+    """Pack each game's existing Move rows into its move_log"""
+    Game = apps.get_model('game', 'Game')
+    Move = apps.get_model('game', 'Move')
+    db_alias = schema_editor.connection.alias
+    rows = (Move.objects.using(db_alias).order_by('game_id', 'id')
+            .values_list('game_id', 'game__created_at', 'player', 'position',
+                         'created_at')
+            .iterator(chunk_size=BATCH_SIZE))
+    batch = []
+    for game_id, moves in groupby(rows, key=lambda row: row[0]):
+        entries = []
+        last_at = None
+        for _, game_created_at, player, position, created_at in moves:
+            if last_at is None:
+                last_at = game_created_at
+            delta_ms = (created_at - last_at).total_seconds() * 1000
+            entries.append((player, position, delta_ms))
+            last_at = created_at
+        batch.append(Game(pk=game_id, move_log=pack_log(entries)))
+        if len(batch) >= BATCH_SIZE:
+            Game.objects.using(db_alias).bulk_update(batch, ['move_log'])
+            batch = []
+    if batch:
+        Game.objects.using(db_alias).bulk_update(batch, ['move_log'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0004_board_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='move_log',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.RunPython(backfill_move_log, migrations.RunPython.noop),
+    ]
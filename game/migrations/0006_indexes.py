@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0005_move_log'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='move',
+            name='game',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='moves', to='game.game'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(condition=models.Q(('status', 'IN_PROGRESS')), fields=['status', '-updated_at'], name='game_in_progress_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['status', '-created_at'], name='game_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['player_x_name', '-created_at'], name='game_player_x_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['player_o_name', '-created_at'], name='game_player_o_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='move',
+            index=models.Index(fields=['game', 'created_at'], name='move_game_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='score',
+            index=models.Index(fields=['-wins', 'player_name'], name='score_rank_idx'),
+        ),
+    ]
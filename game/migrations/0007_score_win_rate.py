@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:04
+
+from django.db import migrations, models
+from django.db.models import F
+
+RATE_SCALE = 1_000_000
+
+
+def backfill_win_rate(apps, schema_editor):
+    Score = apps.get_model('game', 'Score')
+    db_alias = schema_editor.connection.alias
+    Score.objects.using(db_alias).filter(wins__gt=0).update(
+        win_rate=F('wins') * RATE_SCALE
+        / (F('wins') + F('losses') + F('draws')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0006_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='score',
+            options={'ordering': ['-wins', '-win_rate', 'player_name']},
+        ),
+        migrations.RemoveIndex(
+            model_name='score',
+            name='score_rank_idx',
+        ),
+        migrations.AddField(
+            model_name='score',
+            name='win_rate',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_win_rate, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='score',
+            index=models.Index(fields=['-wins', '-win_rate', 'player_name'], name='score_rank_idx'),
+        ),
+    ]
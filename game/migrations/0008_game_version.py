@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0007_score_win_rate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
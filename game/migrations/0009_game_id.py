@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0008_game_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameId',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:09
+
+import django.db.models.expressions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0009_game_id'),
+    ]
+
+    operations = [
+        # A column can't become generated in place: drop it, and the
+        # ranking index over it, and add it back computed
+        migrations.RemoveIndex(
+            model_name='score',
+            name='score_rank_idx',
+        ),
+        migrations.RemoveField(
+            model_name='score',
+            name='win_rate',
+        ),
+        migrations.AddField(
+            model_name='score',
+            name='win_rate',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(draws=0, losses=0, then=0, wins=0), default=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('wins'), '*', models.Value(1000000)), '/', django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('wins'), '+', models.F('losses')), '+', models.F('draws')))), output_field=models.IntegerField()),
+        ),
+        migrations.AddIndex(
+            model_name='score',
+            index=models.Index(fields=['-wins', '-win_rate', 'player_name'], name='score_rank_idx'),
+        ),
+    ]
@@ -1,17 +1,213 @@
-from django.db import models
+import random
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import models, router, transaction
+from django.db.models import Case, F, Q, When
+from django.utils import timezone
+
+from . import (batching, engine, events, hotcache, leaderboard, mcts,
+               movelog, search, shards, solver)
+
+
+class StaleGame(Exception):
+    """Raised when a game was written elsewhere since this copy was read"""
+
+
+def _hot_cache_size():
+    return getattr(settings, 'GAME_HOT_CACHE_SIZE', hotcache.DEFAULT_MAXSIZE)
+
+
+class ShardedManager(models.Manager):
+    """Manager for the models whose rows live on their game's shard"""
+
+    def shard(self, game_id):
+        """Queryset on the database holding game ``game_id``"""
+        if not shards.sharded():
+            return self.all()
+        return self.using(shards.for_game(game_id))
+
+
+class GameId(models.Model):
+    """
+    Id tickets for new games on one shard. A shard's n-th ticket becomes
+    game id ``n * shards + index``, so ids never collide across shards and
+    always point back to theirs. Unused with a single shard.
+    """
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def allocate(cls, alias, count):
+        """Return ``count`` new game ids on shard ``alias``"""
+        tickets = cls.objects.using(alias).bulk_create(
+            [cls() for _ in range(count)])
+        step, offset = len(shards.aliases()), shards.index(alias)
+        return [ticket.pk * step + offset for ticket in tickets]
 
 
 class Score(models.Model):
+    RATE_SCALE = 1_000_000
+
     player_name = models.CharField(max_length=30, unique=True)
     wins = models.IntegerField(default=0)
     losses = models.IntegerField(default=0)
     draws = models.IntegerField(default=0)
+    # wins / total games in millionths, computed by the database whenever
+    # the counters change so the ranking (wins, then win rate) can be read
+    # straight off an index
+    win_rate = models.GeneratedField(
+        expression=Case(
+            When(wins=0, losses=0, draws=0, then=0),
+            default=F('wins') * RATE_SCALE / (
+                F('wins') + F('losses') + F('draws'))),
+        output_field=models.IntegerField(),
+        db_persist=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.player_name}: {self.wins}W-{self.losses}L-{self.draws}D"
 
+    @classmethod
+    def increment(cls, results, using=None):
+        """
+        Add one to a result column for each (player_name, field) pair, on
+        database ``using`` if given.
+
+        Each increment is a single conditional UPDATE with an F()
+        expression, so concurrent finishes for the same player can't lose
+        updates and no row is read first; the database recomputes the win
+        rate alongside. Players without a row yet are inserted together
+        with ON CONFLICT DO NOTHING -- a concurrent worker may create the
+        same row first, which is fine -- and then incremented the same way.
+        """
+        alias = using or router.db_for_write(cls)
+        # Retire the cached scoreboard once these counts are visible
+        transaction.on_commit(leaderboard.invalidate, using=alias)
+        now = timezone.now()
+        missing = []
+        for player_name, field in results:
+            if not cls._add_one(alias, player_name, field, now):
+                missing.append((player_name, field))
+        if not missing:
+            return
+
+        cls.objects.using(alias).bulk_create(
+            [cls(player_name=player_name)
+             for player_name in {player_name for player_name, _ in missing}],
+            ignore_conflicts=True)
+        for player_name, field in missing:
+            cls._add_one(alias, player_name, field, now)
+
+    @classmethod
+    def _add_one(cls, alias, player_name, field, now):
+        return cls.objects.using(alias).filter(
+            player_name=player_name).update(
+            **{field: F(field) + 1}, updated_at=now)
+
+    @staticmethod
+    def _behind(wins, win_rate, player_name):
+        """Q for the scores ranked after the given ranking key"""
+        return (Q(wins__lt=wins)
+                | Q(wins=wins, win_rate__lt=win_rate)
+                | Q(wins=wins, win_rate=win_rate, player_name__gt=player_name))
+
+    @staticmethod
+    def _ahead_of(wins, win_rate, player_name):
+        """Q for the scores ranked before the given ranking key"""
+        return (Q(wins__gt=wins)
+                | Q(wins=wins, win_rate__gt=win_rate)
+                | Q(wins=wins, win_rate=win_rate, player_name__lt=player_name))
+
+    @classmethod
+    def leaderboard(cls, after=None, limit=50):
+        """
+        Return (scores, next_cursor) for one page of the ranking.
+
+        Pages are keyset-paginated on the rank index: ``after`` is the
+        cursor of the previous page's last row, so every page is a single
+        indexed range read however deep it is. Each score gets a ``rank``
+        attribute; next_cursor is None on the last page.
+        """
+        rows, position = cls._page_query(after, limit)
+        return cls._rank_page(list(rows), limit, position)
+
+    @classmethod
+    async def aleaderboard(cls, after=None, limit=50):
+        """Async version of leaderboard()"""
+        rows, position = cls._page_query(after, limit)
+        return cls._rank_page([score async for score in rows], limit,
+                              position)
+
+    @classmethod
+    def _page_query(cls, after, limit):
+        scores = cls.objects.all()
+        position = 0
+        if after is not None:
+            wins, win_rate, position, player_name = cls.parse_cursor(after)
+            scores = scores.filter(cls._behind(wins, win_rate, player_name))
+        # One extra row tells whether there is a next page
+        return scores[:limit + 1], position
+
+    @staticmethod
+    def _rank_page(rows, limit, position):
+        page = rows[:limit]
+        for rank, score in enumerate(page, start=position + 1):
+            score.rank = rank
+        return page, page[-1].cursor() if len(rows) > limit else None
+
+    @classmethod
+    def around(cls, player_name, window=5):
+        """
+        Return up to ``window`` scores either side of a player's, ranked,
+        or an empty list for an unknown player. Finding the player's rank
+        is one indexed COUNT.
+        """
+        me = cls.objects.filter(player_name=player_name).first()
+        if me is None:
+            return []
+        ahead, before, after = cls._window_queries(me, window)
+        return cls._rank_window(me, ahead.count() + 1, list(before),
+                                list(after))
+
+    @classmethod
+    async def aaround(cls, player_name, window=5):
+        """Async version of around()"""
+        me = await cls.objects.filter(player_name=player_name).afirst()
+        if me is None:
+            return []
+        ahead, before, after = cls._window_queries(me, window)
+        return cls._rank_window(me, await ahead.acount() + 1,
+                                [score async for score in before],
+                                [score async for score in after])
+
+    @classmethod
+    def _window_queries(cls, me, window):
+        key = (me.wins, me.win_rate, me.player_name)
+        ahead = cls.objects.filter(cls._ahead_of(*key))
+        before = ahead.order_by('wins', 'win_rate', '-player_name')[:window]
+        after = cls.objects.filter(cls._behind(*key))[:window]
+        return ahead, before, after
+
+    @staticmethod
+    def _rank_window(me, position, before, after):
+        # ``before`` comes nearest-first
+        scores = before[::-1] + [me] + after
+        for rank, score in enumerate(scores, start=position - len(before)):
+            score.rank = rank
+        return scores
+
+    def cursor(self):
+        """Keyset cursor for the rows ranked after this one"""
+        return f"{self.wins}:{self.win_rate}:{self.rank}:{self.player_name}"
+
+    @staticmethod
+    def parse_cursor(cursor):
+        """Split a cursor into its parts; raises ValueError if malformed"""
+        wins, win_rate, rank, player_name = cursor.split(':', 3)
+        return int(wins), int(win_rate), int(rank), player_name
+
     @property
     def total_games(self):
         return self.wins + self.losses + self.draws
@@ -23,7 +219,12 @@ class Score(models.Model):
         return round((self.wins / self.total_games) * 100, 1)
 
     class Meta:
-        ordering = ['-wins', 'player_name']
+        ordering = ['-wins', '-win_rate', 'player_name']
+        indexes = [
+            # Serves the default ordering, i.e. the scoreboard ranking
+            models.Index(fields=['-wins', '-win_rate', 'player_name'],
+                         name='score_rank_idx'),
+        ]
 
 
 class Game(models.Model):
@@ -37,28 +238,188 @@ class Game(models.Model):
         ('O_WON', 'O Won'),
         ('DRAW', 'Draw'),
     )
+    BOARD_SIZE_CHOICES = (
+        (3, '3x3'),
+        (4, '4x4'),
+        (5, '5x5'),
+        (15, '15x15'),
+    )
+    # Stones in a row needed to win on each board size
+    WIN_LENGTHS = {3: 3, 4: 4, 5: 4, 15: 5}
     player_x_name = models.CharField(max_length=30, default="Player X")
     player_o_name = models.CharField(max_length=30, default="Player O")
     current_turn = models.CharField(max_length=1, choices=PLAYER_CHOICES,
                                     default='X')
-    board_state = models.CharField(max_length=9, default=' ' * 9)
+    board_size = models.PositiveSmallIntegerField(choices=BOARD_SIZE_CHOICES,
+                                                  default=3)
+    win_length = models.PositiveSmallIntegerField(default=3)
+    board_state = models.CharField(max_length=225, default=' ' * 9)
     status = models.CharField(max_length=15, choices=STATUS_CHOICES,
                               default='IN_PROGRESS')
     is_ai_game = models.BooleanField(default=False)
+    # Bumped on every write; moves are only saved over the version they
+    # were made on (optimistic concurrency, see commit_moves)
+    version = models.PositiveIntegerField(default=0)
+    # Packed moves in play order; see the movelog module
+    move_log = models.BinaryField(default=b'', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ShardedManager()
+
+    # Columns a move can change; saved with update_fields
+    MOVE_FIELDS = ['board_state', 'current_turn', 'status', 'move_log',
+                   'updated_at']
+    # Columns the hot cache rebuilds from the engine state
+    STATE_FIELDS = {'id', 'board_size', 'win_length', 'board_state',
+                    'current_turn'}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (position, player) of moves applied in memory but not yet
+        # written (see commit_moves)
+        self._pending_moves = []
+        self.from_hot_cache = False
+
     def __str__(self):
         return (f"Game {self.pk}: {self.player_x_name} vs "
                 f"{self.player_o_name} - {self.status}")
 
-    def make_move(self, position, player):
+    @classmethod
+    def new(cls, player_x_name='Player X', player_o_name='Player O',
+            board_size=3, is_ai_game=False):
+        """
+        Return an unsaved game on an empty board; AI games are played
+        against "AI" as O. Raises ValueError for an unsupported board size.
+        """
+        if board_size not in cls.WIN_LENGTHS:
+            raise ValueError(f"Unsupported board size: {board_size}")
+        return cls(player_x_name=player_x_name,
+                   player_o_name='AI' if is_ai_game else player_o_name,
+                   is_ai_game=is_ai_game, board_size=board_size,
+                   win_length=cls.WIN_LENGTHS[board_size],
+                   board_state=' ' * (board_size * board_size))
+
+    @classmethod
+    def create_many(cls, games, batch_size=None, using=None):
+        """
+        INSERT unsaved games (see new()) with one statement per
+        ``batch_size`` of them, and return them with their ids set. With
+        ``using`` they all go to that database instead of the shards.
+        """
+        if batch_size is None:
+            batch_size = getattr(settings, 'GAME_BULK_CREATE_BATCH_SIZE', 500)
+        if using is not None or not shards.sharded():
+            cls.objects.db_manager(using).bulk_create(games,
+                                                      batch_size=batch_size)
+            for game in games:
+                game._write_through()
+            return games
+        # Spread the games over the shards, one INSERT per batch on each
+        aliases = shards.aliases()
+        for offset, alias in enumerate(aliases):
+            placed = games[offset::len(aliases)]
+            if not placed:
+                continue
+            for game, game_id in zip(placed,
+                                     GameId.allocate(alias, len(placed))):
+                game.pk = game_id
+            cls.objects.using(alias).bulk_create(placed,
+                                                 batch_size=batch_size)
+            for game in placed:
+                game._write_through()
+        return games
+
+    @classmethod
+    def for_move(cls, game_id, cached=True, using=None):
+        """
+        Return game ``game_id`` ready to play a move: rebuilt from the hot
+        cache without a query when it is there, read from the database
+        otherwise (or with cached=False). The game is on its shard unless
+        ``using`` names another database; its moves are written back to
+        the same one. Raises Game.DoesNotExist.
+        """
+        game = cls._from_hot_cache(game_id, cached, using)
+        return game if game is not None else cls._for_id(
+            game_id, using).get(pk=game_id)
+
+    @classmethod
+    async def afor_move(cls, game_id, cached=True, using=None):
+        """Async version of for_move()"""
+        game = cls._from_hot_cache(game_id, cached, using)
+        return game if game is not None else await cls._for_id(
+            game_id, using).aget(pk=game_id)
+
+    @classmethod
+    def _for_id(cls, game_id, using):
+        if using is not None:
+            return cls.objects.using(using)
+        return cls.objects.shard(game_id)
+
+    @classmethod
+    def _from_hot_cache(cls, game_id, cached, using=None):
+        if not cached or not _hot_cache_size():
+            hotcache.games.evict(game_id)
+            return None
+        entry = hotcache.games.get(game_id)
+        if entry is None:
+            return None
+        state, values = entry
+        game = cls(id=game_id, board_size=state.spec.size,
+                   win_length=state.spec.win_length,
+                   board_state=state.to_board(), current_turn=state.turn,
+                   **values)
+        game._state.adding = False
+        game._state.db = using or shards.for_game(game_id)
+        game.from_hot_cache = True
+        return game
+
+    def expect_version(self, version):
+        """Raise StaleGame unless this copy is at ``version`` (if given)"""
+        if version is not None and version != self.version:
+            raise StaleGame(f"Game {self.pk} is at version {self.version}, "
+                            f"not {version}")
+
+    def save(self, *args, **kwargs):
+        # A new game plays by its board size's rule, as in new()
+        if self._state.adding:
+            if self.board_size not in self.WIN_LENGTHS:
+                raise ValueError(
+                    f"Unsupported board size: {self.board_size}")
+            self.win_length = self.WIN_LENGTHS[self.board_size]
+        # A fresh game on a larger board starts from the 3x3 default
+        # board_state; widen it to the right number of cells.
+        cells = self.board_size * self.board_size
+        if len(self.board_state) != cells and not self.board_state.strip():
+            self.board_state = ' ' * cells
+        # New games go to the shard their id points to
+        if self._state.adding and shards.sharded():
+            if self.pk is None:
+                self.pk = GameId.allocate(random.choice(shards.aliases()),
+                                          1)[0]
+            kwargs['using'] = shards.for_game(self.pk)
+        # Any write makes copies read before it stale
+        adding = self._state.adding
+        if not adding:
+            self.version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'],
+                                           'version'}
+        super().save(*args, **kwargs)
+        # A new game's first move needs no SELECT either
+        if adding:
+            self._write_through()
+
+    def make_move(self, position, player, commit=True):
         """
         Make a move at the specified position for the given player.
         Returns tuple (success: bool, message: str)
+
+        With commit=False the move is only applied in memory and queued;
+        call commit_moves() to write it.
         """
         # Validate position
-        if position < 0 or position > 8:
+        if position < 0 or position >= self.board_size * self.board_size:
             return False, "Invalid position"
 
         # Check if game is finished
@@ -69,72 +430,231 @@ class Game(models.Model):
         if self.current_turn != player:
             return False, f"It's {self.current_turn}'s turn"
 
+        state = self.engine_state()
+
         # Check if position is already occupied
-        if self.board_state[position] != ' ':
+        if not state.is_empty(position):
             return False, "Position already occupied"
 
         # Make the move
-        board_list = list(self.board_state)
-        board_list[position] = player
-        self.board_state = ''.join(board_list)
+        state.apply(position, player)
+        self.board_state = state.to_board()
 
-        # Create Move record
-        Move.objects.create(game=self, player=player, position=position)
+        # Log the move and queue it for commit_moves()
+        self._log_move(player, position)
+        self._pending_moves.append((position, player))
 
         # Check for win
-        if self._check_winner():
+        if state.winner() is not None:
             self.status = f"{player}_WON"
         # Check for draw
-        elif self._check_draw():
+        elif state.is_full():
             self.status = 'DRAW'
         else:
             # Switch turns
             self.current_turn = 'O' if player == 'X' else 'X'
 
-        self.save()
-        
-        # Update scores if game finished
-        if self.status != 'IN_PROGRESS':
-            self.update_scores()
-            
+        if commit:
+            self.commit_moves()
+
         return True, "Move successful"
 
-    def _check_winner(self):
-        """Check if there's a winner on the board"""
-        board = self.board_state
+    def commit_moves(self):
+        """
+        Write queued moves, the game's new state and, if the game just
+        finished, the scores, in one short transaction: one bulk INSERT of
+        Move rows (skipped when GAME_MOVE_ROWS is off), one UPDATE of the
+        move columns, including the packed move log, and one UPDATE per
+        score.
+
+        The game UPDATE goes first and only matches while the row is still
+        at this copy's version. If another request has written the game
+        since (a double click, a second tab, another worker), nothing is
+        written and StaleGame is raised; the caller can re-read and retry.
+        No row lock is taken, and the transaction only opens once any AI
+        reply has been computed. When games are sharded the transaction is
+        on the game's shard, and the scores, kept on 'default', are
+        committed separately.
+        """
+        if not self._pending_moves:
+            return
+        # Nothing inside is retried on error, so a savepoint when nested
+        # in an outer transaction would only add queries.
+        db = self._write_db()
+        with transaction.atomic(using=db, savepoint=False):
+            stale = not self._save_if_unchanged()
+            if not stale:
+                if getattr(settings, 'GAME_MOVE_ROWS', True):
+                    Move.objects.using(db).bulk_create(
+                        [Move(game=self, player=player, position=position)
+                         for position, player in self._pending_moves])
+
+                # Update scores if game finished
+                if self.status != 'IN_PROGRESS':
+                    self.update_scores()
+        if stale:
+            hotcache.games.evict(self.pk)
+            raise StaleGame(f"Game {self.pk} is no longer at version "
+                            f"{self.version}")
+        moves = self._pending_moves
+        self._pending_moves = []
+        self._write_through()
+        self._publish(moves)
+
+    def _write_db(self):
+        """
+        The database this game's writes go to: the one it was read from,
+        its shard's primary if that was a replica (see ReplicaRouter)
+        """
+        return router.db_for_write(Game, instance=self)
 
-        # Winning combinations
-        win_patterns = [
-            [0, 1, 2], [3, 4, 5], [6, 7, 8],  # Rows
-            [0, 3, 6], [1, 4, 7], [2, 5, 8],  # Columns
-            [0, 4, 8], [2, 4, 6]              # Diagonals
-        ]
+    def _save_if_unchanged(self):
+        """
+        UPDATE the move columns and bump the version, only if the row is
+        still at this copy's version. Returns False when it isn't.
+        """
+        self.updated_at = timezone.now()
+        updated = Game.objects.using(self._write_db()).filter(
+            pk=self.pk, version=self.version).update(
+            version=self.version + 1,
+            **{field: getattr(self, field) for field in self.MOVE_FIELDS})
+        if updated:
+            self.version += 1
+        return bool(updated)
+
+    def _publish(self, moves):
+        """Send committed moves to live viewers (see the events module)"""
+        event = events.move_event(self, moves)
+        game_id = self.pk
+        transaction.on_commit(lambda: events.broker.publish(game_id, event),
+                              using=self._write_db())
+
+    def _write_through(self):
+        """Cache the committed state of a game in play; drop finished ones"""
+        size = _hot_cache_size()
+        if not size:
+            return
+        if self.status != 'IN_PROGRESS':
+            hotcache.games.evict(self.pk)
+            return
+        hotcache.games.maxsize = size
+        state = self.engine_state()
+        values = {field.attname: getattr(self, field.attname)
+                  for field in self._meta.concrete_fields
+                  if field.attname not in self.STATE_FIELDS}
+        game_id = self.pk
+        # Only once the move is durable; a rolled-back move never lands
+        transaction.on_commit(
+            lambda: hotcache.games.put(game_id, state, values),
+            using=self._write_db())
+
+    def _log_move(self, player, position):
+        delta_ms = None
+        if getattr(settings, 'GAME_MOVE_LOG_TIMES', True):
+            delta_ms = 0
+            if self.created_at is not None:
+                last_at = self.created_at + timedelta(
+                    milliseconds=movelog.elapsed_ms(self.move_log))
+                delta_ms = (timezone.now() - last_at) / timedelta(
+                    milliseconds=1)
+        self.move_log = movelog.append(self.move_log, player, position,
+                                       delta_ms)
+
+    def move_history(self):
+        """
+        Return the game's moves in play order as unsaved Move instances,
+        decoded from the packed move log. Games without a log fall back to
+        their Move rows, prefetched ones if ordered by id. Read moves
+        through here: Move rows don't exist with GAME_MOVE_ROWS off.
+        """
+        if not self.move_log:
+            if 'moves' in getattr(self, '_prefetched_objects_cache', {}):
+                return list(self.moves.all())
+            return list(self.moves.order_by('id'))
+        history = []
+        played_at = self.created_at
+        for player, position, delta_ms in movelog.unpack(self.move_log):
+            if delta_ms is not None and played_at is not None:
+                played_at += timedelta(milliseconds=delta_ms)
+            history.append(Move(
+                game=self, player=player, position=position,
+                created_at=played_at if delta_ms is not None else None))
+        return history
+
+    def play_turn(self, position, player):
+        """
+        Make a human move and, in AI games, the AI's reply, then write both
+        with a single commit_moves(). Returns tuple
+        (success: bool, message: str, ai_moved: bool, ai_message: str|None)
+        """
+        success, message = self.make_move(position, player, commit=False)
+        if not success:
+            return False, message, False, None
 
-        for pattern in win_patterns:
-            if (board[pattern[0]] == board[pattern[1]] == board[pattern[2]] and
-                    board[pattern[0]] != ' '):
-                return True
-        return False
+        ai_moved, ai_message = False, None
+        if (self.is_ai_game and self.status == 'IN_PROGRESS' and
+                self.current_turn == 'O'):
+            ai_moved, ai_message = self.make_ai_move(commit=False)
+
+        self.commit_moves()
+        return True, message, ai_moved, ai_message
+
+    def play_moves(self, moves):
+        """
+        Make an ordered list of ``(position, player)`` moves and write them
+        all with a single commit_moves(). Returns tuple
+        (success: bool, message: str, failed_index: int|None); if any move
+        is refused, none is written and the game is left as it was.
+        """
+        before = {field: getattr(self, field) for field in self.MOVE_FIELDS}
+        for index, (position, player) in enumerate(moves):
+            success, message = self.make_move(position, player, commit=False)
+            if not success:
+                for field, value in before.items():
+                    setattr(self, field, value)
+                self._pending_moves = []
+                return False, message, index
+
+        self.commit_moves()
+        return True, f"{len(moves)} moves made", None
+
+    async def aplay_turn(self, position, player):
+        """
+        Async version of play_turn(). The AI reply is computed on a worker
+        thread so the event loop stays free for other clients; the write
+        goes through Django's sync thread, as the async ORM has no
+        transactions.
+        """
+        success, message = self.make_move(position, player, commit=False)
+        if not success:
+            return False, message, False, None
+
+        ai_moved, ai_message = False, None
+        if (self.is_ai_game and self.status == 'IN_PROGRESS' and
+                self.current_turn == 'O'):
+            ai_moved, ai_message = await sync_to_async(
+                self.make_ai_move, thread_sensitive=False)(commit=False)
+
+        await sync_to_async(self.commit_moves)()
+        return True, message, ai_moved, ai_message
+
+    def engine_state(self):
+        """Return the engine-level state for the current board"""
+        return engine.GameState.from_board(self.board_state,
+                                           self.current_turn,
+                                           self.board_size, self.win_length)
+
+    def _check_winner(self):
+        """Check if there's a winner on the board"""
+        return self._check_winner_for_board(self.board_state)
 
     def get_winning_pattern(self):
         """Get the winning pattern positions if there's a winner"""
         if self.status not in ['X_WON', 'O_WON']:
             return None
 
-        board = self.board_state
-
-        # Winning combinations
-        win_patterns = [
-            [0, 1, 2], [3, 4, 5], [6, 7, 8],  # Rows
-            [0, 3, 6], [1, 4, 7], [2, 5, 8],  # Columns
-            [0, 4, 8], [2, 4, 6]              # Diagonals
-        ]
-
-        for pattern in win_patterns:
-            if (board[pattern[0]] == board[pattern[1]] == board[pattern[2]] and
-                    board[pattern[0]] != ' '):
-                return pattern
-        return None
+        line = self.engine_state().winning_line()
+        return list(line) if line is not None else None
 
     def _check_draw(self):
         """Check if the game is a draw (board full with no winner)"""
@@ -145,106 +665,106 @@ class Game(models.Model):
         if self.status == 'IN_PROGRESS':
             return  # Game not finished yet
 
-        # Get or create score records for both players
-        x_score, _ = Score.objects.get_or_create(
-            player_name=self.player_x_name
-        )
-        o_score, _ = Score.objects.get_or_create(
-            player_name=self.player_o_name
-        )
-
-        # Update scores based on game result
+        # Column to increment for each player based on game result
         if self.status == 'X_WON':
-            x_score.wins += 1
-            o_score.losses += 1
+            results = ((self.player_x_name, 'wins'),
+                       (self.player_o_name, 'losses'))
         elif self.status == 'O_WON':
-            o_score.wins += 1
-            x_score.losses += 1
-        elif self.status == 'DRAW':
-            x_score.draws += 1
-            o_score.draws += 1
+            results = ((self.player_x_name, 'losses'),
+                       (self.player_o_name, 'wins'))
+        else:
+            results = ((self.player_x_name, 'draws'),
+                       (self.player_o_name, 'draws'))
 
-        # Save the updated scores
-        x_score.save()
-        o_score.save()
+        # Scores are on 'default' when games are sharded, and otherwise
+        # next to the game, which may be in another database (e.g. the
+        # benchmark's)
+        Score.increment(
+            results, using=None if shards.sharded() else self._write_db())
 
-    def make_ai_move(self):
+    def make_ai_move(self, commit=True):
         """
         Make an AI move. Returns tuple (success: bool, message: str)
-        Simple AI strategy: try to win, block opponent win, then random
+        On the classic board the move is looked up in the solver's
+        precomputed table of minimax values, picking at random among equally
+        good moves. Larger boards use a time-bounded alpha-beta search, or
+        Monte Carlo Tree Search when GAME_AI_ENGINE is 'mcts'.
         """
-        import random
-        
         if not self.is_ai_game or self.status != 'IN_PROGRESS':
             return False, "Not an AI game or game finished"
-            
+
         if self.current_turn != 'O':
             return False, "Not AI's turn"
-            
-        # Get available positions
-        available_positions = [i for i, cell in enumerate(self.board_state) 
-                             if cell == ' ']
-        
-        if not available_positions:
+
+        state = self.engine_state()
+        window_ms = getattr(settings, 'GAME_AI_BATCH_WINDOW_MS', 0)
+        if state.spec is engine.CLASSIC and window_ms:
+            # Share one vectorized evaluation with concurrent AI turns
+            position = batching.coalescer(
+                window_ms,
+                getattr(settings, 'GAME_AI_BATCH_MAX_SIZE', 64),
+            ).choose_move(state)
+        elif state.spec is engine.CLASSIC:
+            position = solver.choose_move(state)
+        elif getattr(settings, 'GAME_AI_ENGINE', 'alphabeta') == 'mcts':
+            position = mcts.best_move(
+                state,
+                playouts=getattr(settings, 'GAME_MCTS_PLAYOUTS',
+                                 mcts.DEFAULT_PLAYOUTS),
+                budget_ms=getattr(settings, 'GAME_MCTS_BUDGET_MS',
+                                  mcts.DEFAULT_BUDGET_MS),
+                workers=getattr(settings, 'GAME_MCTS_WORKERS', None),
+                keep_warm=getattr(settings, 'GAME_MCTS_KEEP_POOL_WARM', True),
+            )
+        else:
+            budget_ms = getattr(settings, 'GAME_AI_MOVE_BUDGET_MS',
+                                search.DEFAULT_BUDGET_MS)
+            position = search.best_move(state, budget_ms)
+
+        if position is None:
             return False, "No available positions"
-            
-        # Strategy 1: Try to win
-        for pos in available_positions:
-            # Simulate move
-            temp_board = list(self.board_state)
-            temp_board[pos] = 'O'
-            temp_board_str = ''.join(temp_board)
-            
-            # Check if this move wins
-            if self._check_winner_for_board(temp_board_str):
-                return self.make_move(pos, 'O')
-                
-        # Strategy 2: Block opponent from winning
-        for pos in available_positions:
-            # Simulate opponent move
-            temp_board = list(self.board_state)
-            temp_board[pos] = 'X'
-            temp_board_str = ''.join(temp_board)
-            
-            # Check if opponent would win
-            if self._check_winner_for_board(temp_board_str):
-                return self.make_move(pos, 'O')
-                
-        # Strategy 3: Take center if available
-        if 4 in available_positions:
-            return self.make_move(4, 'O')
-            
-        # Strategy 4: Take corners
-        corners = [0, 2, 6, 8]
-        available_corners = [pos for pos in corners if pos in available_positions]
-        if available_corners:
-            return self.make_move(random.choice(available_corners), 'O')
-            
-        # Strategy 5: Random move
-        return self.make_move(random.choice(available_positions), 'O')
-    
+
+        return self.make_move(position, 'O', commit=commit)
+
     def _check_winner_for_board(self, board_state):
         """Helper method to check winner for a given board state"""
-        win_patterns = [
-            [0, 1, 2], [3, 4, 5], [6, 7, 8],  # Rows
-            [0, 3, 6], [1, 4, 7], [2, 5, 8],  # Columns
-            [0, 4, 8], [2, 4, 6]              # Diagonals
-        ]
+        state = engine.GameState.from_board(board_state, size=self.board_size,
+                                            win_length=self.win_length)
+        return state.winner() is not None
 
-        for pattern in win_patterns:
-            if (board_state[pattern[0]] == board_state[pattern[1]] == board_state[pattern[2]] and
-                    board_state[pattern[0]] != ' '):
-                return True
-        return False
+    class Meta:
+        indexes = [
+            # Only in-progress games are looked up by recency, so the
+            # partial index stays small as finished games pile up. status
+            # leads so the planner prefers it over game_status_created_idx.
+            models.Index(fields=['status', '-updated_at'],
+                         condition=Q(status='IN_PROGRESS'),
+                         name='game_in_progress_idx'),
+            models.Index(fields=['status', '-created_at'],
+                         name='game_status_created_idx'),
+            models.Index(fields=['player_x_name', '-created_at'],
+                         name='game_player_x_idx'),
+            models.Index(fields=['player_o_name', '-created_at'],
+                         name='game_player_o_idx'),
+        ]
 
 
 class Move(models.Model):
+    # Indexed through move_game_created_idx, which leads with game
     game = models.ForeignKey(Game, related_name='moves',
-                             on_delete=models.CASCADE)
+                             on_delete=models.CASCADE, db_index=False)
     player = models.CharField(max_length=1, choices=Game.PLAYER_CHOICES)
-    position = models.IntegerField()  # 0-8 for 3x3 grid
+    position = models.IntegerField()  # 0-8 for 3x3 grid, row-major
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ShardedManager()
+
     def __str__(self):
         return (f"Move by {self.player} at position {self.position} "
                 f"in Game {self.game.pk}")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['game', 'created_at'],
+                         name='move_game_created_idx'),
+        ]
@@ -0,0 +1,83 @@
+"""
+Compact move log stored on ``Game.move_log``.
+
+Instead of one Move row per move, a game's moves can be packed into a few
+bytes on the game itself. The log starts with a flags byte; each move then
+follows as an unsigned LEB128 varint of ``position << 1 | side`` (side 0
+for X, 1 for O) and, when the log is timed, a varint of milliseconds since
+the previous move (or since the game was created, for the first move). A
+finished 3x3 game fits in about 30 bytes.
+"""
+
+# Flags byte
+TIMED = 1
+
+_SIDES = ('X', 'O')
+
+
+def _write_varint(out, value):
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+
+
+def _write_move(out, player, position, delta_ms):
+    _write_varint(out, position << 1 | (player == 'O'))
+    if out[0] & TIMED:
+        _write_varint(out, max(0, int(delta_ms or 0)))
+
+
+def pack(moves, timed=True):
+    """Pack ``(player, position, delta_ms)`` tuples into a move log"""
+    out = bytearray([TIMED if timed else 0])
+    for player, position, delta_ms in moves:
+        _write_move(out, player, position, delta_ms)
+    return bytes(out)
+
+
+def append(log, player, position, delta_ms=None):
+    """
+    Return ``log`` with one more move. An empty log becomes timed when
+    ``delta_ms`` is given; an existing log keeps its own flags.
+    """
+    out = bytearray(log) if log else bytearray(
+        [TIMED if delta_ms is not None else 0])
+    _write_move(out, player, position, delta_ms)
+    return bytes(out)
+
+
+def unpack(log):
+    """
+    Return the ``(player, position, delta_ms)`` tuples in a move log, with
+    ``delta_ms`` None when the log is untimed.
+    """
+    if not log:
+        return []
+    data = bytes(log)  # Some backends hand back a memoryview
+    timed = data[0] & TIMED
+    moves = []
+    offset = 1
+    while offset < len(data):
+        code, offset = _read_varint(data, offset)
+        delta_ms = None
+        if timed:
+            delta_ms, offset = _read_varint(data, offset)
+        moves.append((_SIDES[code & 1], code >> 1, delta_ms))
+    return moves
+
+
+def elapsed_ms(log):
+    """Return milliseconds from game creation to the last logged move"""
+    return sum(delta_ms or 0 for _, _, delta_ms in unpack(log))
@@ -0,0 +1,141 @@
+"""
+Read replicas for the read-only views.
+
+The board, state and scoreboard views are wrapped in ``replica_reads``,
+under which ``ReplicaRouter`` sends their queries to one of the aliases in
+GAME_DB_REPLICAS. Everything else -- every write, and the reads on the
+move path that writes are checked against -- uses 'default', the primary.
+
+Replicas lag the primary, so a client that has just moved reads from the
+primary for GAME_REPLICA_STICKY_SECONDS: the move views set a cookie
+naming the game (``pin_primary``), and while it lasts that game's pages,
+and the pages that aren't about a particular game, skip the replicas.
+
+For local testing, replicas can be plain SQLite files refreshed from the
+primary with ``manage.py sync_replicas`` (see ``copy_sqlite``).
+"""
+import random
+import sqlite3
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+from . import shards
+
+PIN_COOKIE = 'game_primary'
+
+# Whether queries in the current request may go to a replica
+_replica_reads = ContextVar('game_replica_reads', default=False)
+
+
+def _replicas():
+    return getattr(settings, 'GAME_DB_REPLICAS', ())
+
+
+class ReplicaRouter:
+    """
+    Send reads inside ``replica_reads`` to a replica. Everything else is
+    left to Django: 'default', or the database of the instance a query
+    starts from, which keeps a sharded game's moves on its shard.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = _replicas()
+        # Replicas copy 'default', which holds no games when sharded
+        if replicas and _replica_reads.get() and not shards.is_sharded(model):
+            return random.choice(replicas)
+        return None
+
+    def db_for_write(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in _replicas():
+            return 'default'
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary inside this block, even within a read view"""
+    token = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def _may_use_replica(request, game_id):
+    pinned = request.COOKIES.get(PIN_COOKIE)
+    if pinned is None:
+        return True
+    return game_id is not None and pinned != str(game_id)
+
+
+def replica_reads(view):
+    """
+    Let a read-only view read from the replicas, unless the client is
+    pinned to the primary for the view's game (see pin_primary)
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            token = _replica_reads.set(
+                _may_use_replica(request, kwargs.get('game_id')))
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _replica_reads.reset(token)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            token = _replica_reads.set(
+                _may_use_replica(request, kwargs.get('game_id')))
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                _replica_reads.reset(token)
+    return wrapper
+
+
+def pin_primary(response, game_id):
+    """Make the client read ``game_id`` from the primary for a while"""
+    if _replicas():
+        response.set_cookie(
+            PIN_COOKIE, str(game_id), samesite='Lax',
+            max_age=getattr(settings, 'GAME_REPLICA_STICKY_SECONDS', 10))
+    return response
+
+
+def pins_primary(view):
+    """Pin the client to the primary for the game a POST view wrote to"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, game_id, *args, **kwargs):
+            response = await view(request, game_id, *args, **kwargs)
+            return pin_primary(response, game_id)
+    else:
+        @wraps(view)
+        def wrapper(request, game_id, *args, **kwargs):
+            response = view(request, game_id, *args, **kwargs)
+            return pin_primary(response, game_id)
+    return wrapper
+
+
+def copy_sqlite(source, target_name):
+    """
+    Copy the SQLite database behind Django connection ``source`` to the
+    file ``target_name`` with SQLite's online backup, which gives a
+    consistent snapshot while the primary keeps taking writes.
+    """
+    source.ensure_connection()
+    target = sqlite3.connect(target_name)
+    try:
+        source.connection.backup(target)
+    finally:
+        target.close()
@@ -0,0 +1,344 @@
+"""
+Alpha-beta search for N x N / k-in-a-row boards.
+
+Boards beyond 3x3 are too large to solve ahead of time, so the AI runs a
+negamax alpha-beta search with iterative deepening, transposition-table
+and history move ordering, and Zobrist hashing. The search enforces its
+own wall-clock budget: it checks the clock every few dozen nodes and,
+when time runs out, returns the best move from the deepest iteration that
+completed.
+"""
+import random
+import threading
+import time
+from functools import lru_cache
+
+from .transposition import TranspositionTable
+
+DEFAULT_BUDGET_MS = 500
+TABLE_SIZE = 1 << 17
+
+WIN_SCORE = 1_000_000
+# Scores within this distance of WIN_SCORE are forced wins/losses
+_WIN_THRESHOLD = WIN_SCORE - 1000
+_INFINITY = WIN_SCORE + 1
+
+# Nodes searched between clock checks (a power of two minus one)
+_CHECK_MASK = 63
+
+# Boards with more cells than this only consider moves next to stones
+_FULL_WIDTH_CELLS = 25
+
+_EXACT, _LOWER, _UPPER = 0, 1, 2
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time budget is spent"""
+
+
+class SearchResult:
+    """Outcome of a search: the chosen move and how it was found"""
+
+    __slots__ = ('move', 'value', 'depth', 'nodes', 'elapsed_ms')
+
+    def __init__(self, move, value, depth, nodes, elapsed_ms):
+        self.move = move
+        self.value = value
+        self.depth = depth
+        self.nodes = nodes
+        self.elapsed_ms = elapsed_ms
+
+    def __repr__(self):
+        return (f"SearchResult(move={self.move}, value={self.value}, "
+                f"depth={self.depth}, nodes={self.nodes}, "
+                f"elapsed_ms={self.elapsed_ms:.1f})")
+
+
+@lru_cache(maxsize=None)
+def zobrist_keys(spec):
+    """
+    Return ``(cell_keys, side_key)`` for a board spec, where
+    ``cell_keys[player][cell]`` is a random 64-bit key (player 0 is X).
+    Seeded per board so hashes are stable within and across processes.
+    """
+    rng = random.Random(f"zobrist-{spec.size}x{spec.win_length}")
+    cell_keys = tuple(tuple(rng.getrandbits(64) for _ in range(spec.cells))
+                      for _ in range(2))
+    return cell_keys, rng.getrandbits(64)
+
+
+def zobrist_hash(state):
+    """Return the Zobrist hash of an engine.GameState"""
+    cell_keys, side_key = zobrist_keys(state.spec)
+    key = 0
+    for player, mask in enumerate((state.x, state.o)):
+        cell = 0
+        while mask:
+            if mask & 1:
+                key ^= cell_keys[player][cell]
+            mask >>= 1
+            cell += 1
+    if state.turn == 'O':
+        key ^= side_key
+    return key
+
+
+def table_for(spec):
+    """Return the transposition table shared by searches on one board spec"""
+    table = _tables.get(spec)
+    if table is None:
+        with _tables_lock:
+            table = _tables.setdefault(
+                spec, TranspositionTable(maxsize=TABLE_SIZE, size=spec.size))
+    return table
+
+
+@lru_cache(maxsize=None)
+def _line_weights(win_length):
+    # Value of an unblocked line holding n stones of one player
+    return tuple(0 if n == 0 else 10 ** n for n in range(win_length + 1))
+
+
+@lru_cache(maxsize=None)
+def _centrality(spec):
+    center = (spec.size - 1) / 2
+    return tuple(-(abs(row - center) + abs(col - center))
+                 for row, col in (divmod(cell, spec.size)
+                                  for cell in range(spec.cells)))
+
+
+class AlphaBetaSearch:
+    """
+    One iterative-deepening search from a root position.
+
+    The search plays and takes back moves on a single engine.GameState, so
+    win and draw detection use the state's incremental per-line counts.
+    The static evaluation is kept up to date the same way: only the lines
+    through the played cell are rescored on each move and undo.
+    """
+
+    def __init__(self, state, budget_ms=DEFAULT_BUDGET_MS, max_depth=None,
+                 table=None):
+        self.spec = state.spec
+        self.state = state.copy()
+        self.budget_ms = budget_ms
+        self.max_depth = max_depth
+        self.table = table if table is not None else table_for(self.spec)
+        self.cell_keys, self.side_key = zobrist_keys(self.spec)
+        self.weights = _line_weights(self.spec.win_length)
+        self.centrality = _centrality(self.spec)
+        self.history = [0] * self.spec.cells
+        self.nodes = 0
+        self.deadline = None
+        # Sum of line values from X's point of view
+        self.score = self._lines_value(range(len(self.spec.win_masks)))
+
+    def run(self):
+        """Search until the budget or depth limit; return a SearchResult"""
+        start = time.perf_counter()
+        self.deadline = start + self.budget_ms / 1000
+        state = self.state
+        key = zobrist_hash(state)
+
+        empties = self.spec.cells - state.occupied.bit_count()
+        max_depth = empties if self.max_depth is None \
+            else min(self.max_depth, empties)
+
+        # Something legal to play even if the first iteration times out
+        ordered = self._ordered_moves(None)
+        best_move = ordered[0] if ordered else None
+        best_value = 0
+        completed_depth = 0
+
+        for depth in range(1, max_depth + 1):
+            try:
+                value, move = self._search_root(key, depth)
+            except SearchTimeout:
+                # Unwind the moves that were in flight
+                while state.history:
+                    self._undo()
+                break
+            best_move, best_value, completed_depth = move, value, depth
+            if abs(value) >= _WIN_THRESHOLD:
+                break  # Forced result; deeper search can't change it
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        return SearchResult(best_move, best_value, completed_depth,
+                            self.nodes, elapsed_ms)
+
+    def _lines_value(self, lines):
+        """Sum of the given lines' values from X's point of view"""
+        x_counts = self.state.x_counts
+        o_counts = self.state.o_counts
+        weights = self.weights
+        total = 0
+        for line in lines:
+            x_count = x_counts[line]
+            o_count = o_counts[line]
+            if not o_count:
+                total += weights[x_count]
+            elif not x_count:
+                total -= weights[o_count]
+        return total
+
+    def _play(self, move):
+        lines = self.spec.cell_lines[move]
+        before = self._lines_value(lines)
+        self.state.apply(move)
+        self.score += self._lines_value(lines) - before
+
+    def _undo(self):
+        lines = self.spec.cell_lines[self.state.history[-1][0]]
+        before = self._lines_value(lines)
+        self.state.undo()
+        self.score += self._lines_value(lines) - before
+
+    def _search_root(self, key, depth):
+        alpha, beta = -_INFINITY, _INFINITY
+        best_move = None
+        side = 0 if self.state.turn == 'X' else 1
+        entry = self.table.get_key(key)
+        tt_move = entry[1][0] if entry is not None and entry[1] else None
+        for move in self._ordered_moves(tt_move):
+            child_key = key ^ self.cell_keys[side][move] ^ self.side_key
+            self._play(move)
+            value = -self._negamax(child_key, depth - 1, -beta, -alpha, 1)
+            self._undo()
+            if value > alpha:
+                alpha = value
+                best_move = move
+        self.table.put_key(key, (depth, alpha, _EXACT), (best_move,))
+        return alpha, best_move
+
+    def _negamax(self, key, depth, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes & _CHECK_MASK \
+                and time.perf_counter() > self.deadline:
+            raise SearchTimeout
+
+        state = self.state
+        if state.winner() is not None:
+            # Only the previous mover can have completed a line
+            return -(WIN_SCORE - ply)
+        if state.is_full():
+            return 0
+        side = 0 if state.turn == 'X' else 1
+        if depth == 0:
+            return self.score if side == 0 else -self.score
+
+        alpha_orig = alpha
+        tt_move = None
+        entry = self.table.get_key(key)
+        if entry is not None:
+            (entry_depth, value, flag), moves = entry
+            tt_move = moves[0] if moves else None
+            if entry_depth >= depth:
+                value = self._from_table(value, ply)
+                if flag == _EXACT:
+                    return value
+                if flag == _LOWER:
+                    alpha = max(alpha, value)
+                else:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value
+
+        best_value = -_INFINITY
+        best_move = None
+        for move in self._ordered_moves(tt_move):
+            child_key = key ^ self.cell_keys[side][move] ^ self.side_key
+            self._play(move)
+            value = -self._negamax(child_key, depth - 1, -beta, -alpha,
+                                   ply + 1)
+            self._undo()
+            if value > best_value:
+                best_value = value
+                best_move = move
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                self.history[move] += depth * depth
+                break
+
+        if best_value <= alpha_orig:
+            flag = _UPPER
+        elif best_value >= beta:
+            flag = _LOWER
+        else:
+            flag = _EXACT
+        self.table.put_key(
+            key, (depth, self._to_table(best_value, ply), flag), (best_move,))
+        return best_value
+
+    @staticmethod
+    def _to_table(value, ply):
+        # Store forced results relative to this node, not the root
+        if value >= _WIN_THRESHOLD:
+            return value + ply
+        if value <= -_WIN_THRESHOLD:
+            return value - ply
+        return value
+
+    @staticmethod
+    def _from_table(value, ply):
+        if value >= _WIN_THRESHOLD:
+            return value - ply
+        if value <= -_WIN_THRESHOLD:
+            return value + ply
+        return value
+
+    def _candidates(self):
+        occupied = self.state.occupied
+        free = ~occupied & self.spec.full_mask
+        if self.spec.cells > _FULL_WIDTH_CELLS and occupied:
+            near = 0
+            neighbors = self.spec.neighbors
+            mask = occupied
+            cell = 0
+            while mask:
+                if mask & 1:
+                    near |= neighbors[cell]
+                mask >>= 1
+                cell += 1
+            free &= near
+        return [cell for cell in range(self.spec.cells) if free >> cell & 1]
+
+    def _ordered_moves(self, tt_move):
+        """Candidate moves, most promising first"""
+        moves = self._candidates()
+        if not moves:
+            return moves
+        state = self.state
+        if not state.occupied and self.spec.cells > _FULL_WIDTH_CELLS:
+            return [max(moves, key=self.centrality.__getitem__)]
+        player = state.turn
+        opponent = 'O' if player == 'X' else 'X'
+        history = self.history
+        centrality = self.centrality
+
+        def priority(move):
+            if move == tt_move:
+                return (3, 0, 0)
+            if state.completes_line(move, player):
+                return (2, 0, 0)
+            if state.completes_line(move, opponent):
+                return (1, 0, 0)
+            return (0, history[move], centrality[move])
+
+        moves.sort(key=priority, reverse=True)
+        return moves
+
+
+def search(state, budget_ms=DEFAULT_BUDGET_MS, max_depth=None):
+    """Search a position and return a SearchResult"""
+    return AlphaBetaSearch(state, budget_ms, max_depth).run()
+
+
+def best_move(state, budget_ms=DEFAULT_BUDGET_MS):
+    """Return the best move found within ``budget_ms``, or None if over"""
+    if state.is_over():
+        return None
+    return search(state, budget_ms).move
@@ -0,0 +1,49 @@
+"""
+Sharding of games across databases by id.
+
+Each game, with its Move rows, lives on one of the database aliases in
+GAME_SHARDS: the one at index ``id % len(GAME_SHARDS)``. Ids are handed
+out per shard so that this always holds (see ``models.GameId``), which
+lets any request for ``/game/<id>/`` go straight to the right database.
+Scores, and everything outside the game app, stay on 'default'.
+
+Code that looks a game up by id goes through ``Game.objects.shard(id)``;
+related lookups from a loaded game follow the game's database. Work over
+all games fans out with ``each``.
+
+With a single shard (the default) nothing here changes how queries are
+routed. Existing games keep their ids, so the number of shards can only
+be changed by moving games (see the export and import commands).
+"""
+from django.conf import settings
+
+# Models whose rows live on their game's shard
+SHARDED_MODELS = {'game.Game', 'game.Move'}
+
+
+def aliases():
+    return getattr(settings, 'GAME_SHARDS', None) or ['default']
+
+
+def sharded():
+    return len(aliases()) > 1
+
+
+def is_sharded(model):
+    return sharded() and model._meta.label in SHARDED_MODELS
+
+
+def for_game(game_id):
+    """Alias of the database holding game ``game_id``"""
+    shards = aliases()
+    return shards[game_id % len(shards)]
+
+
+def index(alias):
+    """Position of a shard in GAME_SHARDS, i.e. its ids' remainder"""
+    return aliases().index(alias)
+
+
+def each(queryset):
+    """``queryset`` on every shard"""
+    return [queryset.using(alias) for alias in aliases()]
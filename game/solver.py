@@ -0,0 +1,99 @@
+"""
+Perfect-play solver for 3x3 tic-tac-toe.
+
+Every position reachable from an empty board is solved with negamax once
+per process, and the result is kept in a symmetry-canonical transposition
+table mapping each position to its value and best moves. After that,
+choosing an AI move is a single table lookup. Positions that cannot arise
+from normal play (e.g. boards edited by hand), or that were evicted, are
+solved on first sight and added to the table.
+"""
+import random
+import threading
+
+from . import engine
+from .transposition import TranspositionTable
+
+# About 1,500 canonical positions are reachable, so the default bound
+# holds the whole solved game.
+table = TranspositionTable()
+
+_build_lock = threading.Lock()
+_built = False
+
+
+def _negamax(x_mask, o_mask, turn):
+    """
+    Solve a position, record it in ``table`` and return (value, moves).
+
+    Values are from the side to move's point of view: a win scores the
+    number of empty cells left plus one (so faster wins score higher), a
+    loss the negation of that, and a draw zero.
+    """
+    entry = table.get(x_mask, o_mask, turn)
+    if entry is not None:
+        return entry
+
+    occupied = x_mask | o_mask
+    if engine.has_won(x_mask) or engine.has_won(o_mask):
+        # The previous mover completed a line
+        entry = (-(engine.CELLS - bin(occupied).count('1') + 1), ())
+    elif occupied == engine.FULL_MASK:
+        entry = (0, ())
+    else:
+        best_value = None
+        best_moves = []
+        next_turn = engine.other_player(turn)
+        for cell in range(engine.CELLS):
+            bit = 1 << cell
+            if occupied & bit:
+                continue
+            if turn == 'X':
+                value = -_negamax(x_mask | bit, o_mask, next_turn)[0]
+            else:
+                value = -_negamax(x_mask, o_mask | bit, next_turn)[0]
+            if best_value is None or value > best_value:
+                best_value = value
+                best_moves = [cell]
+            elif value == best_value:
+                best_moves.append(cell)
+        entry = (best_value, tuple(best_moves))
+
+    table.put(x_mask, o_mask, turn, *entry)
+    return entry
+
+
+def build_table():
+    """Solve every position reachable from an empty board, once"""
+    global _built
+    if _built:
+        return table
+    with _build_lock:
+        if not _built:
+            # Human games always start with X, but AI games may be set up
+            # with O to move on an empty board.
+            _negamax(0, 0, 'X')
+            _negamax(0, 0, 'O')
+            # Counters should describe lookups, not the warm-up solve
+            table.reset_stats()
+            _built = True
+    return table
+
+
+def lookup(state):
+    """Return (value, best_moves) for an engine.GameState"""
+    build_table()
+    return _negamax(state.x, state.o, state.turn)
+
+
+def best_moves(state):
+    """Return every move that achieves the position's minimax value"""
+    return lookup(state)[1]
+
+
+def choose_move(state):
+    """Pick one optimal move for the side to move, or None if game over"""
+    moves = best_moves(state)
+    if not moves:
+        return None
+    return random.choice(moves)
@@ -0,0 +1,23 @@
+"""
+Per-connection SQLite tuning.
+
+SQLite keeps most of its settings per connection, so ``apply_pragmas`` is
+connected to ``connection_created`` (see apps.py) and runs the PRAGMAs in
+GAME_SQLITE_PRAGMAS on every new SQLite connection. The production
+database profile in settings.py sets them, together with CONN_MAX_AGE so
+a worker keeps its tuned connection between requests.
+"""
+from django.conf import settings
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'GAME_SQLITE_PRAGMAS', None)
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            if not name.isidentifier():
+                raise ValueError(f"Invalid SQLite pragma: {name!r}")
+            cursor.execute(f"PRAGMA {name} = {value}")
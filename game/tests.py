@@ -1,10 +1,49 @@
-from django.test import TestCase, Client
+import os
+import sqlite3
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, router
+from django.db.models import F, QuerySet
+from django.http import Http404, HttpResponse
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         AsyncRequestFactory, Client, RequestFactory,
+                         override_settings)
 from django.urls import reverse
+from django.utils import timezone
 import json
-from .models import Game, Move, Score
+import random
+import threading
+import time
+import unittest
+from unittest import mock
+from . import (admin, archive, async_views, batching, engine, events,
+               history, hotcache, leaderboard, mcts, movelog, routers, search,
+               shards, solver, views)
+from .transposition import TranspositionTable, canonicalize
+from .models import Game, GameId, Move, Score, StaleGame
 
+# Databases ShardTest spreads games over, whatever GAME_DB_SHARDS is
+TEST_SHARDS = ['default', 'shard1']
 
-class GameModelTest(TestCase):
+
+@override_settings(GAME_SHARDS=['default'])
+class GameTestCase(TestCase):
+    """
+    Games all on 'default', even when GAME_DB_SHARDS is set, so lookups and
+    query counts see every game; ShardTest covers sharding.
+    """
+
+
+@override_settings(GAME_SHARDS=['default'])
+class GameTransactionTestCase(TransactionTestCase):
+    """GameTestCase for tests that need real transactions"""
+
+
+class GameModelTest(GameTestCase):
     def test_game_creation(self):
         """Test that a Game can be created with default values"""
         game = Game.objects.create()
@@ -35,7 +74,7 @@ class GameModelTest(TestCase):
         self.assertEqual(str(game), expected_str)
 
 
-class MoveModelTest(TestCase):
+class MoveModelTest(GameTestCase):
     def setUp(self):
         self.game = Game.objects.create()
 
@@ -73,7 +112,7 @@ class MoveModelTest(TestCase):
         self.assertIn(move2, game_moves)
 
 
-class StartPageViewTest(TestCase):
+class StartPageViewTest(GameTestCase):
     def setUp(self):
         self.client = Client()
 
@@ -145,7 +184,7 @@ class StartPageViewTest(TestCase):
         self.assertRedirects(response, reverse('game:start_page'))
 
 
-class GameBoardViewTest(TestCase):
+class GameBoardViewTest(GameTestCase):
     def setUp(self):
         self.client = Client()
         self.game = Game.objects.create(
@@ -175,7 +214,7 @@ class GameBoardViewTest(TestCase):
         self.assertEqual(response.status_code, 404)
 
 
-class GameLogicTest(TestCase):
+class GameLogicTest(GameTestCase):
     def setUp(self):
         self.game = Game.objects.create(
             player_x_name="Alice",
@@ -309,7 +348,7 @@ class GameLogicTest(TestCase):
         self.assertEqual(message, "Game is already finished")
 
 
-class MakeMoveViewTest(TestCase):
+class MakeMoveViewTest(GameTestCase):
     def setUp(self):
         self.client = Client()
         self.game = Game.objects.create(
@@ -382,6 +421,423 @@ class MakeMoveViewTest(TestCase):
         self.assertEqual(data['winning_pattern'], [0, 1, 2])
 
 
+class MoveQueryBudgetTest(GameTestCase):
+    """Query budget per POST to make_move (see views.make_move)"""
+
+    def post_move(self, game, position, player):
+        url = reverse('game:make_move', kwargs={'game_id': game.id})
+        return self.client.post(
+            url,
+            data=json.dumps({'position': position, 'player': player}),
+            content_type='application/json'
+        )
+
+    def test_two_player_move(self):
+        """Test SELECT game, INSERT move, UPDATE game"""
+        game = Game.objects.create(player_x_name="Alice",
+                                   player_o_name="Bob")
+        with self.assertNumQueries(3):
+            response = self.post_move(game, 0, 'X')
+        self.assertTrue(response.json()['success'])
+
+    def test_ai_turn_is_one_write(self):
+        """Test that the human and AI moves share one INSERT and UPDATE"""
+        game = Game.objects.create(player_x_name="Alice",
+                                   player_o_name="AI", is_ai_game=True)
+        with self.assertNumQueries(3):
+            response = self.post_move(game, 4, 'X')
+        self.assertTrue(response.json()['ai_moved'])
+        self.assertEqual(
+            list(game.moves.order_by('id').values_list('player', flat=True)),
+            ['X', 'O'])
+
+    def test_finishing_move_updates_scores(self):
+        """Test one UPDATE per existing player's score on game end"""
+        Score.objects.create(player_name="Alice")
+        Score.objects.create(player_name="Bob")
+        game = Game.objects.create(player_x_name="Alice",
+                                   player_o_name="Bob",
+                                   board_state="XX OO    ")
+        with self.assertNumQueries(5):
+            response = self.post_move(game, 2, 'X')
+        self.assertEqual(response.json()['status'], 'X_WON')
+        self.assertEqual(Score.objects.get(player_name="Alice").wins, 1)
+        self.assertEqual(Score.objects.get(player_name="Bob").losses, 1)
+
+    def test_finishing_move_creates_scores(self):
+        """Test one INSERT and a second UPDATE each for new players"""
+        game = Game.objects.create(player_x_name="Alice",
+                                   player_o_name="Bob",
+                                   board_state="XX OO    ")
+        with self.assertNumQueries(8):
+            self.post_move(game, 2, 'X')
+        self.assertEqual(Score.objects.count(), 2)
+
+    def test_uncommitted_move_is_not_written(self):
+        """Test that commit=False only applies the move in memory"""
+        game = Game.objects.create()
+        with self.assertNumQueries(0):
+            game.make_move(0, 'X', commit=False)
+        self.assertEqual(game.board_state[0], 'X')
+        self.assertEqual(Game.objects.get(pk=game.pk).board_state, ' ' * 9)
+        game.commit_moves()
+        self.assertEqual(
+            len(Game.objects.get(pk=game.pk).move_history()), 1)
+
+    @override_settings(GAME_MOVE_ROWS=False)
+    def test_packed_log_only_move(self):
+        """Test that without Move rows a move is SELECT and UPDATE only"""
+        game = Game.objects.create(player_x_name="Alice",
+                                   player_o_name="AI", is_ai_game=True)
+        with self.assertNumQueries(2):
+            self.post_move(game, 4, 'X')
+        self.assertEqual(game.moves.count(), 0)
+        game.refresh_from_db()
+        self.assertEqual(len(game.move_history()), 2)
+
+
+class QueryPlanTest(GameTestCase):
+    """Hot queries must be answered from an index, not a table scan"""
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(f'INDEX {index_name}', plan)
+        self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan)
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('plans are checked against SQLite')
+
+    def test_in_progress_games_by_recency(self):
+        """Test the partial index on in-progress games"""
+        self.assertUsesIndex(
+            Game.objects.filter(status='IN_PROGRESS').order_by('-updated_at'),
+            'game_in_progress_idx')
+
+    def test_games_by_status(self):
+        """Test admin filtering by status, newest first"""
+        self.assertUsesIndex(
+            Game.objects.filter(status='X_WON').order_by('-created_at'),
+            'game_status_created_idx')
+
+    def test_games_by_player(self):
+        """Test per-player game lookups on either side"""
+        self.assertUsesIndex(
+            Game.objects.filter(player_x_name='Alice').order_by('-created_at'),
+            'game_player_x_idx')
+        self.assertUsesIndex(
+            Game.objects.filter(player_o_name='Alice').order_by('-created_at'),
+            'game_player_o_idx')
+
+    def test_moves_by_game(self):
+        """Test a game's moves in time order"""
+        game = Game.objects.create()
+        self.assertUsesIndex(game.moves.order_by('created_at'),
+                             'move_game_created_idx')
+
+    def test_scoreboard_order(self):
+        """Test the top of the scoreboard"""
+        self.assertUsesIndex(Score.objects.all()[:10], 'score_rank_idx')
+
+
+class HotGameCacheTest(GameTestCase):
+    def setUp(self):
+        hotcache.games.clear()
+        self.game = Game.objects.create(player_x_name="Alice",
+                                        player_o_name="Bob")
+
+    def post_move(self, position, player):
+        url = reverse('game:make_move', kwargs={'game_id': self.game.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                url,
+                data=json.dumps({'position': position, 'player': player}),
+                content_type='application/json'
+            ).json()
+
+    def test_cached_move_skips_select(self):
+        """Test that the next move on a cached game is INSERT and UPDATE"""
+        self.post_move(0, 'X')
+        self.assertIn(self.game.id, hotcache.games)
+        with self.assertNumQueries(2):
+            data = self.post_move(4, 'O')
+        self.assertTrue(data['success'])
+        self.game.refresh_from_db()
+        self.assertEqual(self.game.board_state, "X   O    ")
+        self.assertEqual(self.game.current_turn, 'X')
+
+    def test_new_games_are_cached(self):
+        """Test that a new game's first move needs no SELECT either"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.game = Game.objects.create()
+            created = Game.create_many([Game.new() for _ in range(2)])
+        for game in [self.game, *created]:
+            self.assertIn(game.id, hotcache.games)
+        with self.assertNumQueries(2):
+            self.assertTrue(self.post_move(0, 'X')['success'])
+
+    def test_cached_state_is_engine_state(self):
+        """Test that the cache holds engine state, not ORM instances"""
+        self.post_move(0, 'X')
+        state, values = hotcache.games.get(self.game.id)
+        self.assertIsInstance(state, engine.GameState)
+        self.assertEqual(state.to_board(), "X        ")
+        self.assertEqual(values['player_x_name'], "Alice")
+        state.apply(1)
+        self.assertEqual(hotcache.games.get(self.game.id)[0].to_board(),
+                         "X        ")
+
+    def test_finished_game_is_evicted(self):
+        """Test that a finishing move drops the game from the cache"""
+        for position, player in ((0, 'X'), (3, 'O'), (1, 'X'), (4, 'O')):
+            self.post_move(position, player)
+        self.assertIn(self.game.id, hotcache.games)
+        self.assertEqual(self.post_move(2, 'X')['status'], 'X_WON')
+        self.assertNotIn(self.game.id, hotcache.games)
+
+    def test_move_by_other_worker_is_picked_up(self):
+        """Test a refused move on a stale entry is retried on a fresh read"""
+        self.post_move(0, 'X')
+        # Another worker plays O; this worker's cache still says O to move
+        Game.objects.get(pk=self.game.pk).make_move(4, 'O')
+
+        data = self.post_move(8, 'X')
+        self.assertTrue(data['success'])
+        self.assertEqual(''.join(data['board_state']), "X   O   X")
+
+    def test_conflicting_write_is_detected(self):
+        """Test that a cached move can't overwrite a newer row"""
+        self.post_move(0, 'X')
+        Game.objects.filter(pk=self.game.pk).update(
+            player_o_name="Robert", version=F('version') + 1)
+
+        game = Game.for_move(self.game.pk)
+        self.assertTrue(game.from_hot_cache)
+        with self.assertRaises(StaleGame):
+            game.make_move(4, 'O')
+        self.assertNotIn(self.game.id, hotcache.games)
+        self.game.refresh_from_db()
+        self.assertEqual(len(self.game.move_history()), 1)
+
+        # Through the view the move is replayed on the fresh row
+        data = self.post_move(4, 'O')
+        self.assertTrue(data['success'])
+        self.game.refresh_from_db()
+        self.assertEqual(len(self.game.move_history()), 2)
+        self.assertEqual(hotcache.games.get(self.game.id)[1]['player_o_name'],
+                         "Robert")
+
+    @override_settings(GAME_HOT_CACHE_SIZE=0)
+    def test_disabled(self):
+        """Test that a zero cache size always reads the database"""
+        self.post_move(0, 'X')
+        self.assertEqual(len(hotcache.games), 0)
+        with self.assertNumQueries(3):
+            self.post_move(4, 'O')
+
+    def test_lru_bound(self):
+        """Test that the least recently used game is evicted first"""
+        cache = hotcache.HotGameCache(maxsize=2)
+        state = engine.GameState()
+        for game_id in (1, 2):
+            cache.put(game_id, state, {})
+        cache.get(1)
+        cache.put(3, state, {})
+        self.assertEqual(sorted(cache._entries), [1, 3])
+        self.assertEqual(cache.stats()['hits'], 1)
+
+
+class OptimisticConcurrencyTest(GameTestCase):
+    def setUp(self):
+        hotcache.games.clear()
+        self.game = Game.objects.create(player_x_name="Alice",
+                                        player_o_name="Bob")
+
+    def post_move(self, position, player, **extra):
+        url = reverse('game:make_move', kwargs={'game_id': self.game.id})
+        return self.client.post(
+            url,
+            data=json.dumps({'position': position, 'player': player,
+                             **extra}),
+            content_type='application/json'
+        )
+
+    def test_each_write_bumps_version(self):
+        """Test that moves and plain saves both advance the version"""
+        self.game.make_move(0, 'X')
+        self.assertEqual(self.game.version, 1)
+        self.game.player_o_name = "Robert"
+        self.game.save(update_fields=['player_o_name'])
+        self.game.refresh_from_db()
+        self.assertEqual(self.game.version, 2)
+
+    def test_losing_writer_writes_nothing(self):
+        """Test that two copies of one version can't both save a move"""
+        first = Game.objects.get(pk=self.game.pk)
+        second = Game.objects.get(pk=self.game.pk)
+        self.assertEqual(first.make_move(0, 'X'), (True, "Move successful"))
+        with self.assertRaises(StaleGame):
+            second.make_move(4, 'X')
+        self.game.refresh_from_db()
+        self.assertEqual(self.game.board_state, "X        ")
+        self.assertEqual(self.game.version, 1)
+        self.assertEqual(len(self.game.move_history()), 1)
+
+    def test_stale_client_version_conflicts(self):
+        """Test a 409 with the current state for an out-of-date board"""
+        self.assertEqual(self.post_move(0, 'X', version=0).json()['version'],
+                         1)
+        response = self.post_move(4, 'X', version=0)
+        self.assertEqual(response.status_code, 409)
+        data = response.json()
+        self.assertTrue(data['conflict'])
+        self.assertFalse(data['success'])
+        self.assertEqual(data['version'], 1)
+        self.assertEqual(data['current_turn'], 'O')
+        self.assertEqual(''.join(data['board_state']), "X        ")
+
+        # Retrying from the returned state succeeds
+        response = self.post_move(4, 'O', version=data['version'])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['success'])
+
+    def test_version_is_optional(self):
+        """Test that moves without a version are still accepted"""
+        response = self.post_move(0, 'X')
+        self.assertTrue(response.json()['success'])
+
+
+class MoveConcurrencyTest(GameTransactionTestCase):
+    def test_simultaneous_posts(self):
+        """Test that one of several identical concurrent moves wins"""
+        hotcache.games.clear()
+        game = Game.objects.create(player_x_name="Alice",
+                                   player_o_name="Bob")
+        url = reverse('game:make_move', kwargs={'game_id': game.id})
+        body = json.dumps({'position': 0, 'player': 'X', 'version': 0})
+        barrier = threading.Barrier(8)
+        responses = []
+
+        def post():
+            try:
+                barrier.wait()
+                responses.append(Client().post(
+                    url, data=body, content_type='application/json'))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=post) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(responses), 8)
+        successes = [response for response in responses
+                     if response.json()['success']]
+        self.assertEqual(len(successes), 1)
+        self.assertTrue(all(response.status_code == 409
+                            for response in responses
+                            if response not in successes))
+        game.refresh_from_db()
+        self.assertEqual((game.board_state, game.version), ("X        ", 1))
+        self.assertEqual(len(game.move_history()), 1)
+
+
+class MoveLogTest(SimpleTestCase):
+    def test_round_trip(self):
+        """Test that packed moves unpack to the same tuples"""
+        moves = [('X', 4, 0), ('O', 0, 1500), ('X', 8, 200000)]
+        self.assertEqual(movelog.unpack(movelog.pack(moves)), moves)
+
+    def test_untimed_log(self):
+        """Test that an untimed log stores one byte per small position"""
+        log = movelog.pack([('X', 4, None), ('O', 0, None)], timed=False)
+        self.assertEqual(len(log), 3)
+        self.assertEqual(movelog.unpack(log), [('X', 4, None), ('O', 0, None)])
+
+    def test_large_board_positions(self):
+        """Test positions past one varint byte on a 15x15 board"""
+        log = movelog.append(b'', 'O', 224, 5)
+        log = movelog.append(log, 'X', 112, 7)
+        self.assertEqual(movelog.unpack(log), [('O', 224, 5), ('X', 112, 7)])
+        self.assertEqual(movelog.elapsed_ms(log), 12)
+
+    def test_append_keeps_log_flags(self):
+        """Test that appending to an untimed log drops the delta"""
+        log = movelog.append(b'', 'X', 0)
+        log = movelog.append(log, 'O', 1, 50)
+        self.assertEqual(movelog.unpack(log), [('X', 0, None), ('O', 1, None)])
+
+    def test_memoryview_log(self):
+        """Test unpacking the memoryview some database backends return"""
+        log = movelog.pack([('X', 3, 10)])
+        self.assertEqual(movelog.unpack(memoryview(log)), [('X', 3, 10)])
+
+
+class GameMoveLogTest(GameTestCase):
+    def test_moves_are_logged(self):
+        """Test that the packed log matches the Move rows"""
+        game = Game.objects.create()
+        for position, player in ((4, 'X'), (0, 'O'), (8, 'X')):
+            game.make_move(position, player)
+        game = Game.objects.get(pk=game.pk)
+        history = game.move_history()
+        self.assertEqual([(move.player, move.position) for move in history],
+                         list(game.moves.order_by('id').values_list(
+                             'player', 'position')))
+        self.assertEqual(history, sorted(history,
+                                         key=lambda move: move.created_at))
+        self.assertGreaterEqual(history[0].created_at, game.created_at)
+
+    @override_settings(GAME_MOVE_ROWS=False)
+    def test_admin_lists_logged_moves(self):
+        """Test that the game admin shows moves without Move rows"""
+        from django.contrib import admin as django_admin
+        game = Game.objects.create()
+        game.make_move(4, 'X')
+        game.make_move(0, 'O')
+        game_admin = django_admin.site._registry[Game]
+        self.assertFalse(game.moves.exists())
+        self.assertEqual(game_admin.moves_played(game), 'X4, O0')
+
+    @override_settings(GAME_MOVE_LOG_TIMES=False)
+    def test_untimed_history(self):
+        """Test that history works without move times"""
+        game = Game.objects.create()
+        game.make_move(0, 'X')
+        history = game.move_history()
+        self.assertEqual((history[0].player, history[0].position), ('X', 0))
+        self.assertIsNone(history[0].created_at)
+
+    def test_history_falls_back_to_rows(self):
+        """Test that games without a log read their Move rows"""
+        game = Game.objects.create()
+        Move.objects.create(game=game, player='X', position=2)
+        self.assertEqual([move.position for move in game.move_history()], [2])
+
+    def test_backfill_migration(self):
+        """Test that the migration packs existing Move rows"""
+        from importlib import import_module
+        from django.apps import apps
+        migration = import_module('game.migrations.0005_move_log')
+        game = Game.objects.create(board_size=15, win_length=5)
+        for position, player in ((112, 'X'), (113, 'O'), (0, 'X')):
+            Move.objects.create(game=game, player=player, position=position)
+        empty = Game.objects.create()
+
+        # RunPython passes a schema editor on the database being migrated
+        migration.backfill_move_log(
+            apps, mock.Mock(connection=connections['default']))
+        game.refresh_from_db()
+        empty.refresh_from_db()
+        self.assertEqual(
+            [(player, position) for player, position, _
+             in movelog.unpack(game.move_log)],
+            [('X', 112), ('O', 113), ('X', 0)])
+        self.assertEqual(bytes(empty.move_log), b'')
+
+
 class ScoreModelTest(TestCase):
     def test_score_creation(self):
         """Test that a Score can be created with default values"""
@@ -421,7 +877,7 @@ class ScoreModelTest(TestCase):
         self.assertEqual(str(score), expected)
 
 
-class ScoreTrackingTest(TestCase):
+class ScoreTrackingTest(GameTestCase):
     def setUp(self):
         self.game = Game.objects.create(
             player_x_name="Alice",
@@ -537,9 +993,57 @@ class ScoreTrackingTest(TestCase):
         self.assertEqual(bob_score.draws, 1)
 
 
+class ScoreConcurrencyTest(GameTransactionTestCase):
+    """Concurrent game finishes must not lose or duplicate score updates"""
+
+    def _finish_concurrently(self, games):
+        errors = []
+        barrier = threading.Barrier(len(games))
+
+        def finish(game):
+            try:
+                barrier.wait()
+                game.update_scores()
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=finish, args=(game,))
+                   for game in games]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_concurrent_wins_for_new_player(self):
+        """Test racing first-time inserts end in one row with every win"""
+        games = [Game.objects.create(player_x_name="AI",
+                                     player_o_name=f"Player {index}",
+                                     status='X_WON')
+                 for index in range(20)]
+        self._finish_concurrently(games)
+        self.assertEqual(Score.objects.filter(player_name="AI").count(), 1)
+        self.assertEqual(Score.objects.get(player_name="AI").wins, 20)
+
+    def test_concurrent_results_for_existing_player(self):
+        """Test wins, losses and draws all land for the same player"""
+        Score.objects.create(player_name="AI", wins=5)
+        statuses = ['X_WON', 'O_WON', 'DRAW'] * 6
+        games = [Game.objects.create(player_x_name="AI",
+                                     player_o_name=f"Player {index}",
+                                     status=status)
+                 for index, status in enumerate(statuses)]
+        self._finish_concurrently(games)
+        score = Score.objects.get(player_name="AI")
+        self.assertEqual((score.wins, score.losses, score.draws), (11, 6, 6))
+
+
 class ScoreboardViewTest(TestCase):
     def setUp(self):
         self.client = Client()
+        caches['default'].clear()
         # Create some test scores
         Score.objects.create(player_name="Alice", wins=5, losses=2, draws=1)
         Score.objects.create(player_name="Bob", wins=3, losses=3, draws=2)
@@ -575,8 +1079,1370 @@ class ScoreboardViewTest(TestCase):
         self.assertEqual(scores[1].player_name, "Alice")
         self.assertEqual(scores[2].player_name, "Bob")
 
+    def test_scoreboard_ranks_ties_by_win_percentage(self):
+        """Test that equal wins are ranked by win percentage"""
+        Score.objects.create(player_name="Dana", wins=5, losses=0, draws=0)
+        response = self.client.get(reverse('game:scoreboard'))
+        names = [score.player_name for score in response.context['scores']]
+        self.assertEqual(names, ["Charlie", "Dana", "Alice", "Bob"])
+        self.assertEqual([score.rank for score in response.context['scores']],
+                         [1, 2, 3, 4])
+
+    @override_settings(GAME_SCOREBOARD_PAGE_SIZE=2)
+    def test_scoreboard_pages(self):
+        """Test following the next-page cursor"""
+        response = self.client.get(reverse('game:scoreboard'))
+        cursor = response.context['next_cursor']
+        self.assertIsNotNone(cursor)
+        self.assertContains(response, "Next")
+
+        response = self.client.get(reverse('game:scoreboard'),
+                                   {'after': cursor})
+        scores = response.context['scores']
+        self.assertEqual([(score.rank, score.player_name) for score in scores],
+                         [(3, "Bob")])
+        self.assertIsNone(response.context['next_cursor'])
+
+    def test_scoreboard_bad_cursor(self):
+        """Test that a malformed cursor falls back to the first page"""
+        response = self.client.get(reverse('game:scoreboard'),
+                                   {'after': 'garbage'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['scores'][0].player_name, "Charlie")
+
+    def test_scoreboard_around_player(self):
+        """Test the window of players around one player"""
+        response = self.client.get(reverse('game:scoreboard'),
+                                   {'player': 'Alice'})
+        self.assertContains(response, 'class="current-player"')
+        self.assertEqual(
+            [(score.rank, score.player_name)
+             for score in response.context['scores']],
+            [(1, "Charlie"), (2, "Alice"), (3, "Bob")])
+
+    def test_scoreboard_unknown_player(self):
+        """Test looking up a player with no score"""
+        response = self.client.get(reverse('game:scoreboard'),
+                                   {'player': 'Nobody'})
+        self.assertContains(response, "No scores yet for Nobody.")
+
+
+class LeaderboardTest(TestCase):
+    def setUp(self):
+        # wins 0..29 spread over 30 players; half have a loss too
+        for index in range(30):
+            Score.objects.create(player_name=f"P{index:02d}",
+                                 wins=index // 2, losses=index % 2)
+
+    def expected(self):
+        return sorted(Score.objects.all(),
+                      key=lambda score: (-score.wins, -score.win_percentage,
+                                         score.player_name))
+
+    def test_pages_cover_ranking(self):
+        """Test that keyset pages join up into the full ranking"""
+        seen = []
+        cursor = None
+        while True:
+            with self.assertNumQueries(1):
+                page, cursor = Score.leaderboard(cursor, limit=7)
+            seen.extend(page)
+            if cursor is None:
+                break
+        self.assertEqual([score.player_name for score in seen],
+                         [score.player_name for score in self.expected()])
+        self.assertEqual([score.rank for score in seen], list(range(1, 31)))
+
+    def test_around_matches_ranking(self):
+        """Test that the window has the right neighbours and ranks"""
+        expected = [score.player_name for score in self.expected()]
+        with self.assertNumQueries(4):
+            scores = Score.around("P10", window=3)
+        index = expected.index("P10")
+        self.assertEqual([score.player_name for score in scores],
+                         expected[index - 3:index + 4])
+        self.assertEqual([score.rank for score in scores],
+                         list(range(index - 2, index + 5)))
+
+    def test_around_top_player(self):
+        """Test the window clipped at the top of the ranking"""
+        top = self.expected()[0].player_name
+        scores = Score.around(top, window=2)
+        self.assertEqual([score.rank for score in scores], [1, 2, 3])
+
+    def test_win_rate_tracks_increments(self):
+        """Test that score updates keep the stored win rate in step"""
+        Score.increment((("Eve", 'wins'), ("Eve", 'losses'),
+                         ("Eve", 'wins'), ("Eve", 'draws')))
+        score = Score.objects.get(player_name="Eve")
+        self.assertEqual(score.win_rate, Score.RATE_SCALE // 2)
+        self.assertEqual(score.win_percentage, 50.0)
+
+    def test_win_rate_computed_on_save(self):
+        """Test that the database derives the win rate of a saved score"""
+        score = Score.objects.create(player_name="Zed", wins=3, losses=1)
+        score.refresh_from_db()
+        self.assertEqual(score.win_rate, Score.RATE_SCALE * 3 // 4)
+        score.draws = 4
+        score.save()
+        score.refresh_from_db()
+        self.assertEqual(score.win_rate, Score.RATE_SCALE * 3 // 8)
 
-class AIGameTest(TestCase):
+
+class LeaderboardCacheTest(GameTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        Score.objects.create(player_name="Alice", wins=5, losses=2)
+        Score.objects.create(player_name="Bob", wins=6, losses=1)
+
+    def top(self):
+        response = self.client.get(reverse('game:scoreboard'))
+        return [(score.player_name, score.wins)
+                for score in response.context['scores']]
+
+    def test_repeat_reads_skip_database(self):
+        """Test that only the first view of the scoreboard queries"""
+        self.assertEqual(self.top(), [("Bob", 6), ("Alice", 5)])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.top(), [("Bob", 6), ("Alice", 5)])
+
+    def test_finished_game_invalidates(self):
+        """Test that update_scores retires the cached page on commit"""
+        self.top()
+        game = Game.objects.create(player_x_name="Alice",
+                                   player_o_name="Bob",
+                                   board_state="XX OO    ")
+        with self.captureOnCommitCallbacks(execute=True):
+            game.make_move(2, 'X')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.top(), [("Alice", 6), ("Bob", 6)])
+
+    @override_settings(GAME_LEADERBOARD_CACHE_TTL=0)
+    def test_ttl_zero_disables(self):
+        """Test that a zero TTL reads the database every time"""
+        self.top()
+        with self.assertNumQueries(1):
+            self.top()
+
+    def test_rebuild_in_progress_serves_previous_page(self):
+        """Test that readers don't pile onto a rebuild already running"""
+        self.top()
+        Score.objects.filter(player_name="Alice").update(wins=9)
+        leaderboard.invalidate()
+        caches['default'].add(leaderboard.LOCK_KEY, 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.top(), [("Bob", 6), ("Alice", 5)])
+
+        caches['default'].delete(leaderboard.LOCK_KEY)
+        self.assertEqual(self.top(), [("Alice", 9), ("Bob", 6)])
+
+    @mock.patch.object(leaderboard, 'WAIT_SECONDS', 0.05)
+    def test_waits_then_reads_database(self):
+        """Test the fallback when a rebuild holds the lock with no page"""
+        caches['default'].add(leaderboard.LOCK_KEY, 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.top(), [("Bob", 6), ("Alice", 5)])
+        self.assertEqual(caches['default'].get(leaderboard.LOCK_KEY), 1)
+        self.assertIsNone(caches['default'].get(leaderboard.PAGE_KEY))
+
+    def test_only_one_rebuild(self):
+        """Test that concurrent misses call the builder once"""
+        calls = []
+        release = threading.Event()
+
+        def build(limit):
+            calls.append(limit)
+            release.wait(1)
+            return ['page'], None
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+                       leaderboard.first_page(build, 10)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [(['page'], None)] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_file_based_backend(self):
+        """Test caching and invalidation with the file-based backend"""
+        with tempfile.TemporaryDirectory() as location:
+            with self.settings(CACHES={'default': {
+                    'BACKEND': 'django.core.cache.backends.filebased.'
+                               'FileBasedCache',
+                    'LOCATION': location}}):
+                self.top()
+                with self.assertNumQueries(0):
+                    self.top()
+                leaderboard.invalidate()
+                leaderboard.invalidate()
+                with self.assertNumQueries(1):
+                    self.top()
+
+
+class AsyncViewTest(GameTestCase):
+    def setUp(self):
+        hotcache.games.clear()
+        caches['default'].clear()
+        self.factory = AsyncRequestFactory()
+
+    def move_request(self, game, position, player, **extra):
+        return self.factory.post(
+            f'/game/{game.id}/move/',
+            data=json.dumps({'position': position, 'player': player,
+                             **extra}),
+            content_type='application/json')
+
+    async def test_game_board(self):
+        """Test that the async board view renders the game"""
+        game = await Game.objects.acreate(player_x_name="Alice",
+                                          player_o_name="Bob")
+        response = await async_views.game_board(
+            self.factory.get(f'/game/{game.id}/'), game.id)
+        self.assertContains(response, "Alice")
+
+    async def test_game_board_not_found(self):
+        """Test a 404 for a missing game"""
+        with self.assertRaises(Http404):
+            await async_views.game_board(self.factory.get('/game/999/'), 999)
+
+    async def test_make_move(self):
+        """Test a two-player move through the async view"""
+        game = await Game.objects.acreate(player_x_name="Alice",
+                                          player_o_name="Bob")
+        response = await async_views.make_move(
+            self.move_request(game, 4, 'X'), game.id)
+        data = json.loads(response.content)
+        self.assertTrue(data['success'])
+        self.assertEqual(data['current_turn'], 'O')
+        await game.arefresh_from_db()
+        self.assertEqual(game.board_state, "    X    ")
+        self.assertEqual([(move.player, move.position)
+                          for move in game.move_history()], [('X', 4)])
+
+    async def test_ai_reply(self):
+        """Test that the AI replies in the same request"""
+        game = await Game.objects.acreate(player_x_name="Alice",
+                                          player_o_name="AI",
+                                          is_ai_game=True)
+        response = await async_views.make_move(
+            self.move_request(game, 0, 'X'), game.id)
+        data = json.loads(response.content)
+        self.assertTrue(data['ai_moved'])
+        self.assertEqual(data['current_turn'], 'X')
+        self.assertEqual(data['board_state'].count('O'), 1)
+
+    async def test_refused_move(self):
+        """Test that an invalid move is refused like the sync view"""
+        game = await Game.objects.acreate()
+        response = await async_views.make_move(
+            self.move_request(game, 0, 'O'), game.id)
+        self.assertEqual(json.loads(response.content)['message'],
+                         "It's X's turn")
+
+    async def test_stale_version_conflicts(self):
+        """Test a 409 for a move made on an old version"""
+        game = await Game.objects.acreate()
+        await async_views.make_move(
+            self.move_request(game, 0, 'X', version=0), game.id)
+        response = await async_views.make_move(
+            self.move_request(game, 4, 'X', version=0), game.id)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(json.loads(response.content)['version'], 1)
+        # The same body as the sync view's
+        expected = await sync_to_async(views._conflict)(game.id)
+        self.assertEqual(json.loads(response.content),
+                         json.loads(expected.content))
+
+    async def test_scoreboard(self):
+        """Test the ranking, paging and player window"""
+        for name, wins in (("Alice", 5), ("Bob", 3), ("Charlie", 7)):
+            await Score.objects.acreate(player_name=name, wins=wins)
+        with self.settings(GAME_SCOREBOARD_PAGE_SIZE=2):
+            response = await async_views.scoreboard(
+                self.factory.get('/scoreboard/'))
+            self.assertContains(response, "Charlie")
+            self.assertNotContains(response, "Bob")
+
+            cursor = (await Score.aleaderboard(limit=2))[1]
+            response = await async_views.scoreboard(
+                self.factory.get('/scoreboard/', {'after': cursor}))
+            self.assertContains(response, "Bob")
+
+        response = await async_views.scoreboard(
+            self.factory.get('/scoreboard/', {'player': 'Bob'}))
+        self.assertContains(response, 'class="current-player"')
+
+    async def test_cached_first_page(self):
+        """Test that the async scoreboard shares the leaderboard cache"""
+        await Score.objects.acreate(player_name="Alice", wins=1)
+        first = await leaderboard.afirst_page(Score.aleaderboard, 10)
+        await Score.objects.acreate(player_name="Bob", wins=2)
+        self.assertEqual(await leaderboard.afirst_page(Score.aleaderboard, 10),
+                         first)
+
+
+@override_settings(GAME_DB_REPLICAS=['replica'])
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = router
+
+    def route(self, request, **kwargs):
+        """Database a replica_reads view would read Score from"""
+        view = routers.replica_reads(
+            lambda request, **kwargs: self.router.db_for_read(Score))
+        return view(request, **kwargs)
+
+    def test_reads_outside_read_views_use_primary(self):
+        """Test that only wrapped views read from replicas"""
+        self.assertEqual(self.router.db_for_read(Score), 'default')
+        self.assertEqual(self.router.db_for_write(Game), 'default')
+        self.assertEqual(self.route(self.factory.get('/'), game_id=1),
+                         'replica')
+
+    def test_replica_instance_writes_to_primary(self):
+        """Test that saving a row read from a replica goes to default"""
+        game = Game(id=1)
+        game._state.db = 'replica'
+        self.assertEqual(self.router.db_for_write(Game, instance=game),
+                         'default')
+
+    def test_pinned_game_reads_primary(self):
+        """Test read-your-writes for the game the client moved in"""
+        self.factory.cookies[routers.PIN_COOKIE] = '1'
+        self.assertEqual(self.route(self.factory.get('/'), game_id=1),
+                         'default')
+        self.assertEqual(self.route(self.factory.get('/'), game_id=2),
+                         'replica')
+        # Pages about no particular game, like the scoreboard
+        self.assertEqual(self.route(self.factory.get('/')), 'default')
+
+    def test_no_replicas(self):
+        """Test that reads stay on the primary without replicas"""
+        with self.settings(GAME_DB_REPLICAS=[]):
+            self.assertEqual(self.route(self.factory.get('/'), game_id=1),
+                             'default')
+
+    def test_primary_reads(self):
+        """Test forcing the primary inside a read view"""
+        def view(request):
+            with routers.primary_reads():
+                return self.router.db_for_read(Score)
+        self.assertEqual(routers.replica_reads(view)(self.factory.get('/')),
+                         'default')
+
+    def test_leaderboard_built_from_primary(self):
+        """Test that the cached first page is never built from a replica"""
+        caches['default'].clear()
+        build = mock.Mock(
+            side_effect=lambda limit: self.router.db_for_read(Score))
+        view = routers.replica_reads(
+            lambda request: leaderboard.first_page(build, 10))
+        self.assertEqual(view(self.factory.get('/')), 'default')
+
+    def test_pin_cookie(self):
+        """Test that move views pin the client to the primary"""
+        view = routers.pins_primary(lambda request, game_id: HttpResponse())
+        response = view(self.factory.post('/'), 7)
+        self.assertEqual(response.cookies[routers.PIN_COOKIE].value, '7')
+        with self.settings(GAME_DB_REPLICAS=[]):
+            response = view(self.factory.post('/'), 7)
+            self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+
+    async def test_async_views(self):
+        """Test the decorators on coroutine views"""
+        async def board(request, game_id):
+            return self.router.db_for_read(Score)
+        view = routers.replica_reads(board)
+        request = AsyncRequestFactory().get('/')
+        self.assertEqual(await view(request, game_id=1), 'replica')
+
+        async def move(request, game_id):
+            return HttpResponse()
+        response = await routers.pins_primary(move)(request, 3)
+        self.assertEqual(response.cookies[routers.PIN_COOKIE].value, '3')
+
+
+class ReplicaCopyTest(GameTransactionTestCase):
+    def test_copy_sqlite(self):
+        """Test refreshing a SQLite replica file from the primary"""
+        game = Game.objects.create(player_x_name="Alice")
+        with tempfile.TemporaryDirectory() as directory:
+            name = os.path.join(directory, 'replica.sqlite3')
+            routers.copy_sqlite(connection, name)
+            replica = sqlite3.connect(name)
+            try:
+                rows = replica.execute(
+                    "SELECT player_x_name FROM game_game WHERE id = ?",
+                    [game.id]).fetchall()
+            finally:
+                replica.close()
+        self.assertEqual(rows, [("Alice",)])
+
+    def test_sync_replicas_unknown_alias(self):
+        """Test that only configured replicas are overwritten"""
+        with self.assertRaises(CommandError):
+            call_command('sync_replicas', 'default')
+
+
+class ShardMathTest(SimpleTestCase):
+    @override_settings(GAME_SHARDS=['default', 'shard1', 'shard2'])
+    def test_for_game(self):
+        """Test that a game's id picks its shard"""
+        self.assertTrue(shards.sharded())
+        self.assertEqual([shards.for_game(i) for i in (3, 4, 8)],
+                         ['default', 'shard1', 'shard2'])
+        self.assertEqual(shards.index('shard2'), 2)
+        self.assertTrue(shards.is_sharded(Move))
+        self.assertFalse(shards.is_sharded(Score))
+
+    @override_settings(GAME_SHARDS=['default'])
+    def test_single_shard(self):
+        """Test that one shard leaves queries to the routers"""
+        self.assertFalse(shards.sharded())
+        self.assertEqual(shards.for_game(5), 'default')
+        self.assertIsNone(Game.objects.shard(5)._db)
+
+
+@override_settings(GAME_SHARDS=TEST_SHARDS)
+class ShardTest(TestCase):
+    """
+    Games spread over two local SQLite shards ('shard1' comes from
+    tictactoe_project.test_settings)
+    """
+    databases = set(TEST_SHARDS)
+
+    def setUp(self):
+        hotcache.games.clear()
+
+    def post_move(self, game_id, position, player):
+        return self.client.post(
+            reverse('game:make_move', kwargs={'game_id': game_id}),
+            data=json.dumps({'position': position, 'player': player}),
+            content_type='application/json')
+
+    def test_ids_point_to_their_shard(self):
+        """Test that new games are stored where their id says"""
+        for _ in range(10):
+            game = Game.objects.create()
+            alias = shards.for_game(game.id)
+            self.assertEqual(game._state.db, alias)
+            for other in shards.aliases():
+                self.assertEqual(
+                    Game.objects.using(other).filter(id=game.id).exists(),
+                    other == alias)
+
+    def test_id_tickets(self):
+        """Test that each shard hands out ids that point back to it"""
+        for alias in shards.aliases():
+            for game_id in GameId.allocate(alias, 3):
+                self.assertEqual(shards.for_game(game_id), alias)
+
+    def test_create_many_spreads_games(self):
+        """Test bulk creation over every shard with unique ids"""
+        games = Game.create_many([Game.new() for _ in range(9)])
+        ids = [game.id for game in games]
+        self.assertEqual(len(set(ids)), 9)
+        self.assertEqual({shards.for_game(i) for i in ids},
+                         set(shards.aliases()))
+        for game_id in ids:
+            self.assertTrue(Game.objects.shard(game_id).filter(
+                id=game_id).exists())
+
+    def test_play_on_shard(self):
+        """Test a game played through the views on its own shard"""
+        game = Game.create_many([Game.new('Alice', 'Bob')
+                                 for _ in shards.aliases()])[1]
+        alias = shards.for_game(game.id)
+        self.assertNotEqual(alias, 'default')
+        self.assertEqual(self.client.get(
+            reverse('game:game_board', kwargs={'game_id': game.id})
+        ).status_code, 200)
+        for position, player in ((0, 'X'), (3, 'O'), (1, 'X'), (4, 'O'),
+                                 (2, 'X')):
+            self.assertTrue(
+                self.post_move(game.id, position, player).json()['success'])
+        game = Game.objects.shard(game.id).get(id=game.id)
+        self.assertEqual(game.status, 'X_WON')
+        self.assertEqual(game.moves.count(), 5)
+        self.assertEqual(Move.objects.using(alias).count(), 5)
+        # Scores aren't sharded
+        self.assertEqual(Score.objects.get(player_name="Alice").wins, 1)
+
+    def test_admin_change_page(self):
+        """Test that admin change pages find games on any shard"""
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'))
+        for game in Game.create_many([Game.new() for _ in shards.aliases()]):
+            response = self.client.get(
+                reverse('admin:game_game_change', args=[game.id]))
+            self.assertEqual(response.status_code, 200)
+
+    def test_admin_change_list(self):
+        """Test that the game change list shows a chosen shard or all"""
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'))
+        games = Game.create_many([Game.new() for _ in range(4)])
+        url = reverse('admin:game_game_changelist')
+        for params, alias in (({'shard': 'shard1'}, 'shard1'),
+                              ({'shard': 'default'}, 'default')):
+            changelist = self.client.get(url, params).context['cl']
+            self.assertEqual(
+                sorted(game.id for game in changelist.result_list),
+                [game.id for game in games
+                 if shards.for_game(game.id) == alias])
+            choices = list(changelist.filter_specs[0].choices(changelist))
+            self.assertEqual([choice['display'] for choice in choices],
+                             ['All', *TEST_SHARDS])
+            self.assertEqual([choice['selected'] for choice in choices],
+                             [False] + [alias == shard
+                                        for shard in TEST_SHARDS])
+
+    def test_admin_change_list_all_shards(self):
+        """Test that the game change list merges every shard by default"""
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'))
+        games = Game.create_many([Game.new() for _ in range(5)])
+        for minutes, game in enumerate(games):
+            Game.objects.shard(game.id).filter(pk=game.id).update(
+                created_at=timezone.now() - timedelta(minutes=minutes))
+        url = reverse('admin:game_game_changelist')
+        for params in ({}, {'shard': 'nowhere'}):
+            changelist = self.client.get(url, params).context['cl']
+            self.assertEqual([game.id for game in changelist.result_list],
+                             [game.id for game in games])
+            self.assertEqual((changelist.result_count,
+                              changelist.full_result_count), (5, 5))
+            self.assertTrue(
+                list(changelist.filter_specs[0].choices(changelist))[0][
+                    'selected'])
+            # Ids selected for an action could be on any shard
+            self.assertNotIn('action_checkbox', changelist.list_display)
+        with mock.patch.object(admin.GameAdmin, 'list_per_page', 2):
+            pages = [self.client.get(url, {'p': page}).context['cl']
+                     for page in (1, 2, 3)]
+        self.assertEqual([[game.id for game in page.result_list]
+                          for page in pages],
+                         [[game.id for game in games[i:i + 2]]
+                          for i in (0, 2, 4)])
+        self.assertEqual(pages[0].paginator.num_pages, 3)
+
+    def test_admin_moves(self):
+        """Test that the move admin reads each game's moves on its shard"""
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'))
+        games = Game.create_many([Game.new() for _ in shards.aliases()])
+        for game in games:
+            game.play_turn(4, 'X')
+        url = reverse('admin:game_move_changelist')
+        for game in games:
+            alias = shards.for_game(game.id)
+            response = self.client.get(url, {'game__id__exact': game.id})
+            [move] = response.context['cl'].result_list
+            self.assertEqual((move.game_id, move._state.db), (game.id, alias))
+            # Move ids repeat across shards; the row links to its own
+            self.assertContains(response, f'&amp;shard={alias}">')
+            response = self.client.get(
+                reverse('admin:game_move_change', args=[move.id]),
+                {'shard': alias})
+            self.assertEqual(response.context['original'].game_id, game.id)
+        # Without a game, every shard's moves
+        self.assertEqual(
+            sorted(move.game_id
+                   for move in self.client.get(url).context['cl'].result_list),
+            [game.id for game in games])
+
+    def test_export_import(self):
+        """Test that imported games go back to their shards"""
+        games = Game.create_many([Game.new() for _ in range(6)])
+        for game in games:
+            game.make_move(4, 'X')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'games.bin')
+        call_command('export_games', path, '--chunk-size=2', stdout=StringIO())
+        # As if importing into fresh databases
+        for model in (Game, GameId):
+            for queryset in shards.each(model.objects.all()):
+                queryset.delete()
+        call_command('import_games', path, '--chunk-size=2', stdout=StringIO())
+        for game in games:
+            imported = Game.objects.using(shards.for_game(game.id)).get(
+                id=game.id)
+            self.assertEqual(len(imported.move_history()), 1)
+        # New ids don't collide with the imported ones
+        for alias in shards.aliases():
+            self.assertGreater(
+                GameId.allocate(alias, 1)[0],
+                max(game.id for game in games
+                    if shards.for_game(game.id) == alias))
+
+
+class ArchiveTest(GameTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = self.settings(GAME_ARCHIVE_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def finished_game(self, days_ago=60, **fields):
+        game = Game.objects.create(player_x_name="Alice",
+                                   player_o_name="Bob", **fields)
+        for position, player in ((0, 'X'), (3, 'O'), (1, 'X'), (4, 'O'),
+                                 (2, 'X')):
+            game.make_move(position, player)
+        Game.objects.filter(id=game.id).update(
+            updated_at=timezone.now() - timedelta(days=days_ago))
+        return game
+
+    def archive_games(self, *args):
+        out = StringIO()
+        call_command('archive_games', *args, stdout=out)
+        return out.getvalue()
+
+    def test_record_round_trip(self):
+        """Test that a record rebuilds the game and its moves"""
+        game = self.finished_game()
+        moves = game.move_history()
+        restored, restored_moves = archive.from_record(
+            json.loads(json.dumps(archive.to_record(game, moves))))
+        self.assertEqual(restored.id, game.id)
+        self.assertEqual(restored.board_state, game.board_state)
+        self.assertEqual(bytes(restored.move_log), bytes(game.move_log))
+        self.assertEqual(restored.created_at, game.created_at)
+        self.assertEqual(
+            [(m.player, m.position, m.created_at) for m in restored_moves],
+            [(m.player, m.position, m.created_at) for m in moves])
+
+    def test_archive_old_finished_games(self):
+        """Test that only old finished games leave the database"""
+        old = self.finished_game()
+        recent = self.finished_game(days_ago=1)
+        in_progress = Game.objects.create()
+        Game.objects.filter(id=in_progress.id).update(
+            updated_at=timezone.now() - timedelta(days=60))
+
+        self.assertIn("Archived 1 games", self.archive_games())
+        self.assertEqual(
+            set(Game.objects.values_list('id', flat=True)),
+            {recent.id, in_progress.id})
+        self.assertFalse(Move.objects.filter(game_id=old.id).exists())
+
+        game, moves = archive.load(old.id)
+        self.assertEqual(game.status, 'X_WON')
+        self.assertEqual([m.position for m in moves], [0, 3, 1, 4, 2])
+        self.assertEqual([m.position for m in game.move_history()],
+                         [0, 3, 1, 4, 2])
+        self.assertIsNone(archive.load(recent.id))
+
+    def test_batches_and_segments(self):
+        """Test keyset batches, a segment per run and torn index entries"""
+        games = [self.finished_game() for _ in range(3)]
+        self.archive_games('--batch-size', '2')
+        more = self.finished_game()
+        self.archive_games()
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['games-000001.idx', 'games-000001.seg',
+                          'games-000001.sidx', 'games-000002.idx',
+                          'games-000002.seg', 'games-000002.sidx'])
+        # As if the second run crashed before sealing its segment
+        os.remove(os.path.join(self.directory, 'games-000002.sidx'))
+        with open(os.path.join(self.directory, 'games-000002.idx'),
+                  'ab') as index:
+            index.write(b'\x01\x02')
+        for game in games + [more]:
+            self.assertEqual(archive.load(game.id)[0].id, game.id)
+        self.assertIsNone(archive.load(more.id + 1))
+
+    def test_segment_rollover(self):
+        """Test that full segments are closed and new ones started"""
+        games = [self.finished_game() for _ in range(3)]
+        with archive.SegmentWriter(segment_bytes=1) as writer:
+            for game in games:
+                writer.append(game, [])
+        self.assertEqual(len(os.listdir(self.directory)), 9)
+        self.assertEqual(archive.load(games[2].id)[0].id, games[2].id)
+
+    def test_sealed_index_search(self):
+        """Test binary search of sorted indexes, with bounds in memory"""
+        games = [self.finished_game() for _ in range(7)]
+        with archive.SegmentWriter() as writer:
+            for game in reversed(games):
+                writer.append(game, [])
+        with open(os.path.join(self.directory, 'games-000001.sidx'),
+                  'rb') as index:
+            self.assertEqual(
+                [entry[0] for entry
+                 in archive.INDEX_ENTRY.iter_unpack(index.read())],
+                [game.id for game in games])
+        reader = archive.ArchiveReader(self.directory)
+        for game in games:
+            self.assertEqual(reader.load(game.id)['id'], game.id)
+        for game_id in (0, games[0].id - 1, games[-1].id + 1):
+            self.assertIsNone(reader.load(game_id))
+        self.assertEqual(
+            [bounds[:3] for bounds in reader._sealed.values()],
+            [(7, games[0].id, games[-1].id)])
+
+    def test_directory_listed_when_changed(self):
+        """Test that lookups only list the directory after it changes"""
+        first = self.finished_game()
+        self.archive_games()
+        reader = archive.ArchiveReader(self.directory)
+        with mock.patch.object(archive, 'LISTING_GRACE_NS', 0), \
+                mock.patch.object(archive.os, 'listdir',
+                                  wraps=os.listdir) as listdir:
+            for _ in range(3):
+                self.assertIsNotNone(reader.load(first.id))
+            self.assertEqual(listdir.call_count, 1)
+            second = self.finished_game()
+            self.archive_games()
+            # Make sure the mtime moved, however coarse the filesystem's
+            stat = os.stat(self.directory)
+            os.utime(self.directory,
+                     ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+            listdir.reset_mock()
+            self.assertIsNotNone(reader.load(second.id))
+            self.assertGreaterEqual(listdir.call_count, 1)
+
+    def test_dry_run(self):
+        """Test counting without archiving"""
+        self.finished_game()
+        self.assertIn("1 games would be archived",
+                      self.archive_games('--dry-run'))
+        self.assertEqual(Game.objects.count(), 1)
+
+    def test_views_serve_archived_games(self):
+        """Test the board and state of an archived game"""
+        game = self.finished_game()
+        self.archive_games()
+        response = self.client.get(
+            reverse('game:game_board', kwargs={'game_id': game.id}))
+        self.assertContains(response, "Alice")
+        response = self.client.get(
+            reverse('game:game_state', kwargs={'game_id': game.id}))
+        self.assertEqual(response.json()['winning_pattern'], [0, 1, 2])
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.client.get(
+            reverse('game:game_board', kwargs={'game_id': game.id + 100}))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_async_view_serves_archived_game(self):
+        """Test the async board of an archived game"""
+        game = await sync_to_async(self.finished_game)()
+        await sync_to_async(self.archive_games)()
+        response = await async_views.game_board(
+            AsyncRequestFactory().get(f'/game/{game.id}/'), game.id)
+        self.assertContains(response, "Bob")
+
+
+class GameHistoryTest(GameTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def make_games(self):
+        finished = Game.objects.create(player_x_name="Zoë",
+                                       player_o_name="Bob")
+        for position, player in ((0, 'X'), (3, 'O'), (1, 'X'), (4, 'O'),
+                                 (2, 'X')):
+            finished.make_move(position, player)
+        ai_game = Game.objects.create(is_ai_game=True, board_size=4)
+        ai_game.make_move(5, 'X')
+        # Moves in Move rows only, from before the move log
+        rows_only = Game.objects.create()
+        Move.objects.create(game=rows_only, player='X', position=4)
+        Move.objects.create(game=rows_only, player='O', position=0)
+        Game.objects.create()
+        return list(Game.objects.order_by('id'))
+
+    def snapshot(self):
+        return [
+            (game.id, game.player_x_name, game.player_o_name,
+             game.board_size, game.win_length, game.board_state,
+             game.status, game.current_turn, game.is_ai_game, game.version,
+             game.created_at, game.updated_at,
+             [(m.player, m.position) for m in game.move_history()])
+            for game in Game.objects.order_by('id')]
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command(*args, stdout=out)
+        return out.getvalue()
+
+    def assert_round_trip(self, name):
+        self.make_games()
+        before = self.snapshot()
+        logs = list(Game.objects.order_by('id')
+                    .values_list('move_log', flat=True))
+        self.assertIn("Exported 4 games",
+                      self.run_command('export_games', self.path(name)))
+        Game.objects.all().delete()
+        self.assertIn("Imported 4 games",
+                      self.run_command('import_games', self.path(name)))
+        self.assertEqual(self.snapshot(), before)
+        self.assertFalse(os.path.exists(self.path(name) + '.checkpoint'))
+        return logs
+
+    def test_jsonl_round_trip(self):
+        """Test that a JSONL export imports back to the same games"""
+        logs = self.assert_round_trip('games.jsonl')
+        imported = [bytes(log) for log in Game.objects.order_by('id')
+                    .values_list('move_log', flat=True)]
+        self.assertEqual(imported[:2], [bytes(log) for log in logs[:2]])
+        # The rows-only game gets a move log packed from its moves
+        self.assertEqual(logs[2], b'')
+        self.assertEqual(
+            [(player, position) for player, position, _
+             in movelog.unpack(imported[2])], [('X', 4), ('O', 0)])
+
+    def test_binary_round_trip(self):
+        """Test that a binary export imports back to the same games"""
+        self.assert_round_trip('games.bin')
+        with open(self.path('games.bin'), 'rb') as file:
+            self.assertEqual(file.read(8), history.BINARY_MAGIC)
+
+    def test_export_reads_in_chunks(self):
+        """Test that export queries games and moves a chunk at a time"""
+        self.make_games()
+        queryset = Game.objects.order_by('id')
+        with self.assertNumQueries(3):
+            games = list(history.games_with_moves(queryset, chunk_size=2))
+        self.assertEqual([len(moves) for _, moves in games], [5, 1, 2, 0])
+
+    def test_resume_export(self):
+        """Test that an interrupted export resumes from its checkpoint"""
+        self.make_games()
+        self.run_command('export_games', self.path('full.bin'))
+        encode = history.encode
+        calls = []
+
+        def failing_encode(*args):
+            calls.append(args)
+            if len(calls) == 4:
+                raise RuntimeError("disk full")
+            return encode(*args)
+
+        output = self.path('games.bin')
+        with mock.patch.object(history, 'encode', failing_encode):
+            with self.assertRaises(RuntimeError):
+                self.run_command('export_games', output, '--chunk-size=2')
+        self.assertTrue(os.path.exists(output + '.checkpoint'))
+        self.assertIn("Exported 2 games", self.run_command(
+            'export_games', output, '--chunk-size=2', '--resume'))
+        with open(output, 'rb') as file, \
+                open(self.path('full.bin'), 'rb') as full:
+            self.assertEqual(file.read(), full.read())
+        with self.assertRaises(CommandError):
+            self.run_command('export_games', output, '--resume')
+
+    def test_resume_import(self):
+        """Test that an interrupted import resumes and skips existing games"""
+        self.make_games()
+        before = self.snapshot()
+        path = self.path('games.jsonl')
+        self.run_command('export_games', path)
+        Game.objects.all().delete()
+
+        import_chunk = history.import_chunk
+        calls = []
+
+        def failing_import(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError("connection lost")
+            return import_chunk(*args)
+
+        with mock.patch.object(history, 'import_chunk', failing_import):
+            with self.assertRaises(RuntimeError):
+                self.run_command('import_games', path, '--chunk-size=2')
+        self.assertEqual(Game.objects.count(), 2)
+        self.assertIn("Imported 2 games, skipped 0", self.run_command(
+            'import_games', path, '--chunk-size=2', '--resume'))
+        self.assertEqual(self.snapshot(), before)
+        self.assertIn("Imported 0 games, skipped 4",
+                      self.run_command('import_games', path))
+
+    def test_move_rows_follow_setting(self):
+        """Test that Move rows are imported unless GAME_MOVE_ROWS is off"""
+        rows_only = self.make_games()[2]
+        times = list(rows_only.moves.order_by('id').values_list(
+            'created_at', flat=True))
+        path = self.path('games.bin')
+        self.run_command('export_games', path)
+        Game.objects.all().delete()
+        with self.settings(GAME_MOVE_ROWS=False):
+            self.run_command('import_games', path)
+        self.assertFalse(Move.objects.exists())
+
+        Game.objects.all().delete()
+        self.run_command('import_games', path)
+        self.assertEqual(Move.objects.count(), 8)
+        for game in Game.objects.all():
+            self.assertEqual(
+                list(game.moves.order_by('id').values_list(
+                    'player', 'position')),
+                [(m.player, m.position) for m in game.move_history()])
+        self.assertEqual(list(rows_only.moves.order_by('id').values_list(
+            'created_at', flat=True)), times)
+
+    def test_import_leaves_auto_now_alone(self):
+        """Test that import keeps timestamps without switching auto_now off"""
+        self.make_games()
+        path = self.path('games.bin')
+        self.run_command('export_games', path)
+        Game.objects.all().delete()
+        field = Game._meta.get_field('updated_at')
+        seen = []
+        bulk_create = QuerySet.bulk_create
+
+        def spy(queryset, *args, **kwargs):
+            seen.append(field.auto_now)
+            return bulk_create(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'bulk_create', spy):
+            self.run_command('import_games', path)
+        self.assertEqual(set(seen), {True})
+
+    def test_new_ids_follow_imported_games(self):
+        """Test that games created after an import get fresh ids"""
+        self.make_games()
+        path = self.path('games.bin')
+        self.run_command('export_games', path)
+        last_id = Game.objects.order_by('-id')[0].id
+        Game.objects.all().delete()
+        self.run_command('import_games', path)
+        self.assertGreater(Game.objects.create().id, last_id)
+
+    def test_bad_input(self):
+        """Test that a missing or malformed file is a CommandError"""
+        with self.assertRaises(CommandError):
+            self.run_command('import_games', self.path('missing.bin'))
+        with open(self.path('bad.bin'), 'wb') as file:
+            file.write(b'NOTGAMES')
+        with self.assertRaises(CommandError):
+            self.run_command('import_games', self.path('bad.bin'))
+
+
+class SQLiteProfileTest(GameTransactionTestCase):
+    databases = {'default', 'benchmark'}
+
+    def test_pragmas_applied_per_connection(self):
+        """Test that new connections get GAME_SQLITE_PRAGMAS"""
+        pragmas = {'synchronous': 'NORMAL', 'cache_size': -4096,
+                   'busy_timeout': 2500}
+        with self.settings(GAME_SQLITE_PRAGMAS=pragmas):
+            new_connection = connections.create_connection('default')
+            self.addCleanup(new_connection.close)
+            with new_connection.cursor() as cursor:
+                values = {}
+                for name in pragmas:
+                    cursor.execute(f"PRAGMA {name}")
+                    values[name] = cursor.fetchone()[0]
+        # synchronous is reported as a number; NORMAL is 1
+        self.assertEqual(values, {'synchronous': 1, 'cache_size': -4096,
+                                  'busy_timeout': 2500})
+
+    def test_invalid_pragma(self):
+        """Test that pragma names are checked before being run"""
+        with self.settings(GAME_SQLITE_PRAGMAS={'x; DROP TABLE y': 1}):
+            new_connection = connections.create_connection('default')
+            self.addCleanup(new_connection.close)
+            with self.assertRaises(ValueError):
+                new_connection.ensure_connection()
+
+    def test_benchmark_command(self):
+        """Test that the benchmark plays in its own database"""
+        for options in ([], ['--batch']):
+            out = StringIO()
+            call_command('benchmark_moves', '--games', '4', '--threads', '2',
+                         *options, stdout=out)
+            self.assertIn('moves/s', out.getvalue())
+            self.assertIn('0 errors', out.getvalue())
+        self.assertIn('in batches', out.getvalue())
+        self.assertEqual(Game.objects.using('benchmark').count(), 4)
+        self.assertTrue(Score.objects.using('benchmark').exists())
+        self.assertFalse(Game.objects.exists())
+        self.assertFalse(Score.objects.exists())
+
+    def test_benchmark_refuses_game_database(self):
+        """Test that the benchmark won't empty a database holding games"""
+        with self.assertRaises(CommandError):
+            call_command('benchmark_moves', '--database', 'default',
+                         stdout=StringIO())
+
+
+@override_settings(GAME_BULK_CREATE_ENABLED=True)
+class CreateGamesTest(GameTestCase):
+    def post_games(self, body):
+        return self.client.post(reverse('game:create_games'),
+                                data=json.dumps(body),
+                                content_type='application/json')
+
+    def test_create_many(self):
+        """Test chunked creation of ready-to-play games"""
+        games = Game.create_many(
+            [Game.new(board_size=5) for _ in range(5)], batch_size=2)
+        self.assertEqual(len({game.id for game in games}), 5)
+        game = Game.objects.get(id=games[-1].id)
+        self.assertEqual(game.board_state, ' ' * 25)
+        self.assertEqual(game.win_length, 4)
+        self.assertTrue(game.play_turn(24, 'X')[0])
+
+    def test_new_rejects_board_size(self):
+        """Test that unsupported board sizes are refused"""
+        with self.assertRaises(ValueError):
+            Game.new(board_size=7)
+
+    def test_view_count(self):
+        """Test count copies of one game in one INSERT per batch"""
+        with self.settings(GAME_BULK_CREATE_BATCH_SIZE=2):
+            with self.assertNumQueries(2):
+                response = self.post_games({'count': 4, 'ai': True,
+                                            'player_x_name': 'Bot'})
+        self.assertEqual(response.status_code, 201)
+        ids = response.json()['ids']
+        self.assertEqual(len(ids), 4)
+        game = Game.objects.get(id=ids[0])
+        self.assertEqual((game.player_x_name, game.player_o_name),
+                         ('Bot', 'AI'))
+        self.assertTrue(game.is_ai_game)
+
+    def test_view_game_list(self):
+        """Test a list of different games, created in order"""
+        response = self.post_games({'games': [
+            {'player_x_name': 'Alice', 'player_o_name': 'Bob'},
+            {'board_size': 15},
+        ]})
+        ids = response.json()['ids']
+        self.assertEqual(Game.objects.get(id=ids[0]).player_o_name, 'Bob')
+        self.assertEqual(Game.objects.get(id=ids[1]).board_size, 15)
+
+    def test_view_invalid(self):
+        """Test that a bad game, or too many, creates nothing"""
+        with self.settings(GAME_BULK_CREATE_MAX=3):
+            for body in ({'count': 4}, {'games': [{}, {'board_size': 6}]},
+                         {'games': [{'player_x_name': 'x' * 31}]}, [1],
+                         {'count': 0}, {'games': []}, {'games': 5}):
+                response = self.post_games(body)
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.json()['success'])
+        self.assertEqual(Game.objects.count(), 0)
+
+    def test_view_disabled(self):
+        """Test that the endpoint is off unless enabled in settings"""
+        with self.settings(GAME_BULK_CREATE_ENABLED=False):
+            response = self.post_games({'count': 1})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Game.objects.count(), 0)
+
+    def test_view_count_out_of_range(self):
+        """Test that a huge or negative count is refused up front"""
+        for count in (10 ** 18, -1):
+            response = self.post_games({'count': count})
+            self.assertEqual(response.json(),
+                             {'success': False,
+                              'message': 'Invalid request data'})
+        self.assertEqual(Game.objects.count(), 0)
+
+    def test_command(self):
+        """Test the create_games management command"""
+        out = StringIO()
+        call_command('create_games', 3, '--ai', '--board-size', '4',
+                     '--ids', stdout=out)
+        ids = [int(line) for line in out.getvalue().split()]
+        self.assertEqual(
+            list(Game.objects.filter(id__in=ids, board_size=4,
+                                     is_ai_game=True)
+                 .values_list('id', flat=True).order_by('id')),
+            sorted(ids))
+        with self.assertRaises(CommandError):
+            call_command('create_games', 0)
+
+
+class PlayMovesTest(GameTestCase):
+    def setUp(self):
+        hotcache.games.clear()
+        self.game = Game.objects.create(player_x_name="Alice",
+                                        player_o_name="Bob")
+        self.url = reverse('game:play_moves', kwargs={'game_id': self.game.id})
+
+    def post_moves(self, moves, **extra):
+        return self.client.post(
+            self.url,
+            data=json.dumps({
+                'moves': [{'position': position, 'player': player}
+                          for position, player in moves],
+                **extra}),
+            content_type='application/json')
+
+    def test_play_moves(self):
+        """Test that a list of moves is made and written at once"""
+        success, message, failed_index = self.game.play_moves(
+            [(0, 'X'), (4, 'O'), (8, 'X')])
+        self.assertTrue(success)
+        self.assertIsNone(failed_index)
+        self.game.refresh_from_db()
+        self.assertEqual(self.game.board_state, "X   O   X")
+        self.assertEqual(self.game.version, 1)
+        self.assertEqual(
+            [(m.position, m.player) for m in self.game.move_history()],
+            [(0, 'X'), (4, 'O'), (8, 'X')])
+
+    def test_refused_move_writes_nothing(self):
+        """Test that one refused move leaves the game unchanged"""
+        success, message, failed_index = self.game.play_moves(
+            [(0, 'X'), (4, 'O'), (4, 'X')])
+        self.assertFalse(success)
+        self.assertEqual(failed_index, 2)
+        self.assertEqual(message, "Position already occupied")
+        self.assertEqual(self.game.board_state, "         ")
+        self.assertEqual(self.game.current_turn, 'X')
+        self.assertEqual(self.game.move_log, b'')
+        self.game.refresh_from_db()
+        self.assertEqual(self.game.version, 0)
+        self.assertEqual(self.game.move_history(), [])
+
+    def test_view_query_budget(self):
+        """Test SELECT game, INSERT moves, UPDATE game for the whole list"""
+        with self.assertNumQueries(3):
+            response = self.post_moves([(0, 'X'), (3, 'O'), (1, 'X'),
+                                        (4, 'O')])
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['board_state'][:5], ['X', 'X', ' ', 'O', 'O'])
+        self.assertEqual(data['version'], 1)
+
+    def test_view_finishes_game(self):
+        """Test a list of moves that ends the game updates the scores"""
+        response = self.post_moves([(0, 'X'), (3, 'O'), (1, 'X'), (4, 'O'),
+                                    (2, 'X')])
+        self.assertEqual(response.json()['status'], 'X_WON')
+        self.assertEqual(Score.objects.get(player_name="Alice").wins, 1)
+
+    def test_view_failed_index(self):
+        """Test that the response names the first refused move"""
+        response = self.post_moves([(0, 'X'), (1, 'X')])
+        data = response.json()
+        self.assertFalse(data['success'])
+        self.assertEqual(data['failed_index'], 1)
+        self.assertEqual(data['message'], "It's O's turn")
+        self.assertEqual(data['version'], 0)
+
+    def test_view_stale_version(self):
+        """Test a 409 for moves following an old version"""
+        self.post_moves([(0, 'X')], version=0)
+        response = self.post_moves([(4, 'O')], version=0)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['board_state'][0], 'X')
+
+    def test_view_invalid_data(self):
+        """Test malformed lists of moves"""
+        for body in ({}, {'moves': [{'position': 'a', 'player': 'X'}]},
+                     {'moves': [4]}):
+            response = self.client.post(self.url, data=json.dumps(body),
+                                        content_type='application/json')
+            self.assertEqual(response.json()['message'],
+                             'Invalid request data')
+
+    def test_view_refuses_ai_game(self):
+        """Test that AI games take one move at a time"""
+        game = Game.objects.create(player_o_name="AI", is_ai_game=True)
+        response = self.client.post(
+            reverse('game:play_moves', kwargs={'game_id': game.id}),
+            data=json.dumps({'moves': [{'position': 0, 'player': 'X'}]}),
+            content_type='application/json')
+        self.assertFalse(response.json()['success'])
+        game.refresh_from_db()
+        self.assertEqual(game.move_history(), [])
+
+
+class GameStateViewTest(GameTestCase):
+    def setUp(self):
+        hotcache.games.clear()
+        self.game = Game.objects.create(player_x_name="Alice",
+                                        player_o_name="Bob")
+        self.url = reverse('game:game_state',
+                           kwargs={'game_id': self.game.id})
+
+    def test_state(self):
+        """Test the JSON state and its ETag"""
+        self.game.play_turn(4, 'X')
+        response = self.client.get(self.url)
+        data = response.json()
+        self.assertEqual(data['board_state'][4], 'X')
+        self.assertEqual(data['current_turn'], 'O')
+        self.assertEqual(data['version'], 1)
+        self.assertEqual(response['ETag'], f'"{self.game.id}-1"')
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_not_modified(self):
+        """Test a 304 while the ETag is current, and 200 once it changes"""
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+        self.game.play_turn(0, 'X')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_finished_game_cacheable(self):
+        """Test long-lived cache headers once the game is over"""
+        for position, player in ((0, 'X'), (3, 'O'), (1, 'X'), (4, 'O'),
+                                 (2, 'X')):
+            self.game.play_turn(position, player)
+        with self.settings(GAME_STATE_FINISHED_MAX_AGE=3600):
+            response = self.client.get(self.url)
+        self.assertEqual(response.json()['winning_pattern'], [0, 1, 2])
+        cache_control = response['Cache-Control']
+        self.assertIn('max-age=3600', cache_control)
+        self.assertIn('immutable', cache_control)
+
+    def test_post_not_allowed(self):
+        """Test that the state can only be read"""
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+
+    def test_missing_game(self):
+        """Test a 404 for a missing game"""
+        response = self.client.get(
+            reverse('game:game_state', kwargs={'game_id': 999}))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_async_state(self):
+        """Test that the async view answers conditional requests too"""
+        factory = AsyncRequestFactory()
+        response = await async_views.game_state(factory.get(self.url),
+                                                self.game.id)
+        self.assertEqual(json.loads(response.content)['version'], 0)
+        response = await async_views.game_state(
+            factory.get(self.url,
+                        headers={'If-None-Match': response['ETag']}),
+            self.game.id)
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(GAME_EVENTS_HEARTBEAT_SECONDS=0.05,
+                   GAME_EVENTS_MAX_SECONDS=0.2)
+class GameEventsTest(GameTestCase):
+    def setUp(self):
+        hotcache.games.clear()
+        events.broker.clear()
+        self.game = Game.objects.create(player_x_name="Alice",
+                                        player_o_name="Bob")
+        self.url = reverse('game:game_events',
+                           kwargs={'game_id': self.game.id})
+
+    def play(self, position, player):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.game.play_turn(position, player)
+
+    def open_stream(self, **extra):
+        response = self.client.get(self.url, **extra)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = iter(response.streaming_content)
+        # Run the stream out to its deadline so it unsubscribes
+        self.addCleanup(list, chunks)
+        self.assertEqual(next(chunks), b'retry: 3000\n\n')
+        return chunks
+
+    def parse(self, chunk):
+        lines = dict(line.split(': ', 1)
+                     for line in chunk.decode().strip().split('\n'))
+        return int(lines['id']), lines['event'], json.loads(lines['data'])
+
+    def test_broker_replay(self):
+        """Test that replay returns missed events, or None across a gap"""
+        broker = events.EventBroker(history=2)
+        subscription = broker.subscribe(1)
+        for version in (1, 2, 3):
+            broker.publish(1, events.Event(version, 'move', {}))
+        self.assertEqual(subscription.get(0).id, 1)
+        self.assertEqual([e.id for e in broker.replay(1, 1, 3)], [2, 3])
+        self.assertIsNone(broker.replay(1, 0, 3))
+        broker.unsubscribe(subscription)
+        self.assertEqual(broker._subscribers, {})
+
+    def test_move_is_pushed(self):
+        """Test that a committed move reaches an open stream"""
+        chunks = self.open_stream(data={'since': 0})
+        self.play(4, 'X')
+        event_id, name, data = self.parse(next(chunks))
+        self.assertEqual((event_id, name), (1, 'move'))
+        self.assertEqual(data['moves'], [[4, 'X']])
+        self.assertEqual(data['current_turn'], 'O')
+
+    def test_heartbeat(self):
+        """Test a keep-alive comment when nothing happens"""
+        chunks = self.open_stream(data={'since': 0})
+        self.assertEqual(next(chunks), b': ping\n\n')
+
+    def test_last_event_id_replay(self):
+        """Test that a reconnecting client gets the moves it missed"""
+        self.play(0, 'X')
+        self.play(4, 'O')
+        chunks = self.open_stream(HTTP_LAST_EVENT_ID='1')
+        event_id, name, data = self.parse(next(chunks))
+        self.assertEqual((event_id, name), (2, 'move'))
+        self.assertEqual(data['moves'], [[4, 'O']])
+
+    def test_snapshot_without_history(self):
+        """Test a full snapshot when the missed moves weren't kept"""
+        self.play(0, 'X')
+        events.broker.clear()
+        chunks = self.open_stream(data={'since': 0})
+        event_id, name, data = self.parse(next(chunks))
+        self.assertEqual((event_id, name), (1, 'snapshot'))
+        self.assertEqual(data['board_state'], "X        ")
+
+    def test_finished_game_ends_stream(self):
+        """Test that the stream of a finished game closes after a snapshot"""
+        for position, player in ((0, 'X'), (3, 'O'), (1, 'X'), (4, 'O'),
+                                 (2, 'X')):
+            self.play(position, player)
+        response = self.client.get(self.url)
+        chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 2)
+        event_id, name, data = self.parse(chunks[1])
+        self.assertEqual(name, 'snapshot')
+        self.assertEqual(data['winning_pattern'], [0, 1, 2])
+
+    def test_missing_game(self):
+        """Test a 404 for a missing game"""
+        response = self.client.get(
+            reverse('game:game_events', kwargs={'game_id': 999}))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_async_stream(self):
+        """Test the async view streams catch-up events and moves"""
+        factory = AsyncRequestFactory()
+        await sync_to_async(self.play)(0, 'X')
+        response = await async_views.game_events(
+            factory.get(self.url, {'since': 0}), self.game.id)
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+        self.assertEqual(self.parse(await anext(chunks))[:2], (1, 'move'))
+        self.assertEqual(await anext(chunks), b': ping\n\n')
+        await chunks.aclose()
+
+
+class AIGameTest(GameTestCase):
     def test_ai_game_creation(self):
         """Test creating an AI game"""
         response = self.client.post(reverse('game:new_ai_game'), {
@@ -708,3 +2574,464 @@ class AIGameTest(TestCase):
         game.refresh_from_db()
         move_count = game.board_state.count('O')
         self.assertEqual(move_count, 1)  # AI should have made one move
+
+    @override_settings(GAME_AI_BATCH_WINDOW_MS=1)
+    def test_coalesced_ai_move(self):
+        """Test that make_ai_move goes through the coalescer when enabled"""
+        game = Game.objects.create(player_o_name="AI", is_ai_game=True,
+                                   board_state="XX       ", current_turn='O')
+        with mock.patch.object(batching, 'choose_moves',
+                               wraps=batching.choose_moves) as choose_moves:
+            success, message = game.make_ai_move()
+        self.assertTrue(success, message)
+        self.assertEqual(choose_moves.call_count, 1)
+        self.assertEqual(game.board_state[2], 'O')
+
+
+class EngineTest(SimpleTestCase):
+    def test_board_mask_round_trip(self):
+        """Test that board strings convert to masks and back unchanged"""
+        board = "XO X O  X"
+        x_mask, o_mask = engine.board_to_masks(board)
+        self.assertEqual(x_mask, 0b100001001)
+        self.assertEqual(o_mask, 0b000100010)
+        self.assertEqual(engine.masks_to_board(x_mask, o_mask), board)
+
+    def test_apply_switches_turn(self):
+        """Test that applying a move sets the bit and passes the turn"""
+        state = engine.GameState()
+        state.apply(4)
+        self.assertEqual(state.x, 1 << 4)
+        self.assertEqual(state.turn, 'O')
+        self.assertFalse(state.is_empty(4))
+        self.assertEqual(state.to_board(), "    X    ")
+
+    def test_legality(self):
+        """Test legality of empty, occupied and out-of-range cells"""
+        state = engine.GameState.from_board("X        ", 'O')
+        self.assertTrue(state.is_legal(1))
+        self.assertFalse(state.is_legal(0))
+        self.assertFalse(state.is_legal(9))
+        self.assertFalse(state.is_legal(-1))
+
+    def test_no_legal_moves_after_win(self):
+        """Test that no move is legal once a line is complete"""
+        state = engine.GameState.from_board("XXXOO    ", 'O')
+        self.assertFalse(state.is_legal(5))
+
+    def test_winner_and_winning_line(self):
+        """Test winner and winning-line lookup for every pattern"""
+        for pattern in engine.WIN_PATTERNS:
+            board = ''.join('O' if i in pattern else ' ' for i in range(9))
+            state = engine.GameState.from_board(board)
+            self.assertEqual(state.winner(), 'O')
+            self.assertEqual(state.winning_line(), pattern)
+
+    def test_no_winner(self):
+        """Test that a drawn full board has no winner"""
+        state = engine.GameState.from_board("XOXXOOOXX")
+        self.assertIsNone(state.winner())
+        self.assertIsNone(state.winning_line())
+        self.assertTrue(state.is_full())
+        self.assertTrue(state.is_over())
+
+    def test_available_moves(self):
+        """Test that available moves lists the empty cells in order"""
+        state = engine.GameState.from_board("X O  X  O")
+        self.assertEqual(state.available_moves(), [1, 3, 4, 6, 7])
+
+
+class LineCountTest(SimpleTestCase):
+    def test_counts_built_from_board(self):
+        """Test that per-line counts match the stones on each line"""
+        state = engine.GameState.from_board("XX O  O  ")
+        self.assertEqual(state.x_counts, [2, 0, 0, 1, 1, 0, 1, 0])
+        self.assertEqual(state.o_counts, [0, 1, 1, 2, 0, 0, 0, 1])
+
+    def test_undo_restores_state(self):
+        """Test that undo reverses masks, counts, winner and turn"""
+        state = engine.GameState.from_board("XX OO    ", 'X')
+        before = (state.x, state.o, state.x_counts[:], state.o_counts[:])
+        state.apply(2)
+        self.assertEqual(state.winner(), 'X')
+        self.assertEqual(state.undo(), 2)
+        self.assertIsNone(state.winner())
+        self.assertEqual(state.turn, 'X')
+        self.assertEqual(
+            (state.x, state.o, state.x_counts, state.o_counts), before)
+
+    def test_completes_line(self):
+        """Test the count-based check for a winning move"""
+        state = engine.GameState.from_board("XX OO    ", 'X')
+        self.assertTrue(state.completes_line(2))
+        self.assertTrue(state.completes_line(5, 'O'))
+        self.assertFalse(state.completes_line(8))
+
+    def test_incremental_matches_full_scan(self):
+        """Test random play on 5x5 against a full rescan after every move"""
+        rng = random.Random(3)
+        spec = engine.board_spec(5, 4)
+        for _ in range(20):
+            state = engine.GameState(spec=spec)
+            while not state.is_over():
+                state.apply(rng.choice(state.available_moves()))
+                full_scan = engine.GameState(state.x, state.o, spec=spec)
+                self.assertEqual(state.x_counts, full_scan.x_counts)
+                self.assertEqual(state.o_counts, full_scan.o_counts)
+                self.assertEqual(state.winner(), full_scan.winner())
+            while state.history:
+                state.undo()
+            self.assertEqual((state.x, state.o), (0, 0))
+            self.assertEqual(state.x_counts, [0] * len(spec.win_masks))
+
+    def test_search_evaluation_stays_in_sync(self):
+        """Test that the search's running score matches a fresh one"""
+        board = "X   " "O   " "    " "    "
+        state = engine.GameState.from_board(board, 'X', 4, 4)
+        runner = search.AlphaBetaSearch(state)
+        for move in (5, 6, 10, 15):
+            runner._play(move)
+        fresh = search.AlphaBetaSearch(runner.state)
+        self.assertEqual(runner.score, fresh.score)
+        for _ in range(4):
+            runner._undo()
+        self.assertEqual(runner.score, search.AlphaBetaSearch(state).score)
+
+
+class SolverTest(SimpleTestCase):
+    def test_empty_board_is_a_draw(self):
+        """Test that perfect play from an empty board is a draw"""
+        value, moves = solver.lookup(engine.GameState())
+        self.assertEqual(value, 0)
+        self.assertEqual(moves, tuple(range(9)))
+
+    def test_takes_immediate_win(self):
+        """Test that a win now is preferred over a win later"""
+        state = engine.GameState.from_board("OO XX    ", 'O')
+        self.assertEqual(solver.best_moves(state), (2,))
+
+    def test_blocks_opponent(self):
+        """Test that the only non-losing move is the block"""
+        state = engine.GameState.from_board("XX  O    ", 'O')
+        self.assertEqual(solver.best_moves(state), (2,))
+
+    def test_finished_position_has_no_moves(self):
+        """Test that no move is chosen once the game is over"""
+        state = engine.GameState.from_board("XXXOO    ", 'O')
+        self.assertIsNone(solver.choose_move(state))
+
+    def test_ai_never_loses(self):
+        """Test the AI against every possible line of play by X"""
+        def play(state):
+            winner = state.winner()
+            if winner is not None or state.is_full():
+                self.assertNotEqual(winner, 'X', state)
+                return
+            if state.turn == 'X':
+                candidates = state.available_moves()
+            else:
+                candidates = solver.best_moves(state)
+            for position in candidates:
+                child = state.copy()
+                child.apply(position)
+                play(child)
+
+        play(engine.GameState())
+
+
+class TranspositionTableTest(SimpleTestCase):
+    def test_equivalent_positions_share_canonical_form(self):
+        """Test that all eight transforms of a corner opening agree"""
+        corners = [engine.board_to_masks(board) for board in (
+            "X        ", "  X      ", "      X  ", "        X")]
+        forms = {canonicalize(x_mask, o_mask)[:2]
+                 for x_mask, o_mask in corners}
+        self.assertEqual(len(forms), 1)
+
+    def test_moves_translated_to_caller_orientation(self):
+        """Test that a stored move is returned rotated for a symmetric board"""
+        table = TranspositionTable()
+        # X holds two of the top row, so O blocks at 2
+        x_mask, o_mask = engine.board_to_masks("XX       ")
+        table.put(x_mask, o_mask, 'O', 'block', (2,))
+        # The same position mirrored top-bottom must block at 8
+        x_mask, o_mask = engine.board_to_masks("      XX ")
+        self.assertEqual(table.get(x_mask, o_mask, 'O'), ('block', (8,)))
+        self.assertEqual(len(table), 1)
+
+    def test_hit_and_miss_counters(self):
+        """Test that lookups are counted as hits or misses"""
+        table = TranspositionTable()
+        self.assertIsNone(table.get(0, 0, 'X'))
+        table.put(0, 0, 'X', 0, tuple(range(9)))
+        self.assertIsNotNone(table.get(0, 0, 'X'))
+        self.assertEqual(table.stats()['hits'], 1)
+        self.assertEqual(table.stats()['misses'], 1)
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted past maxsize"""
+        table = TranspositionTable(maxsize=2)
+        first = engine.board_to_masks("X        ")
+        second = engine.board_to_masks(" X       ")
+        third = engine.board_to_masks("    X    ")
+        table.put(*first, 'O', 1)
+        table.put(*second, 'O', 2)
+        table.get(*first, 'O')  # Touch first so second is oldest
+        table.put(*third, 'O', 3)
+        self.assertEqual(len(table), 2)
+        self.assertIsNone(table.get(*second, 'O'))
+        self.assertIsNotNone(table.get(*first, 'O'))
+
+    def test_ai_move_uses_table(self):
+        """Test that the AI's lookups are served by the solver's table"""
+        solver.build_table()
+        hits = solver.table.hits
+        solver.best_moves(engine.GameState.from_board("    X    ", 'O'))
+        self.assertEqual(solver.table.hits, hits + 1)
+
+
+class BoardSpecTest(SimpleTestCase):
+    def test_classic_spec_matches_win_patterns(self):
+        """Test that the generated 3x3 lines match the classic table"""
+        self.assertEqual(engine.CLASSIC.win_patterns, engine.WIN_PATTERNS)
+
+    def test_line_counts(self):
+        """Test the number of winning lines generated per variant"""
+        self.assertEqual(len(engine.board_spec(4, 4).win_patterns), 10)
+        self.assertEqual(len(engine.board_spec(5, 4).win_patterns), 28)
+        self.assertEqual(len(engine.board_spec(15, 5).win_patterns), 572)
+
+    def test_win_length_must_fit(self):
+        """Test that a win length longer than the board is rejected"""
+        with self.assertRaises(ValueError):
+            engine.board_spec(3, 4)
+
+    def test_large_board_winner(self):
+        """Test winner detection on a 15x15 diagonal"""
+        board = [' '] * 225
+        for step in range(5):
+            board[(3 + step) * 15 + 10 - step] = 'X'
+        state = engine.GameState.from_board(''.join(board), 'O', 15, 5)
+        self.assertEqual(state.winner(), 'X')
+        self.assertEqual(state.winning_line(),
+                         tuple((3 + step) * 15 + 10 - step
+                               for step in range(5)))
+
+    def test_completes_line(self):
+        """Test the lines-through-a-cell check used by search"""
+        spec = engine.board_spec(5, 4)
+        mask = sum(1 << cell for cell in (5, 6, 7, 8))
+        self.assertTrue(spec.completes_line(mask, 8))
+        self.assertFalse(spec.completes_line(mask, 12))
+
+
+class AlphaBetaSearchTest(SimpleTestCase):
+    def test_takes_win(self):
+        """Test that the search completes its own line"""
+        state = engine.GameState.from_board(
+            "XXX " "OO  " "    " "    ", 'X', 4, 4)
+        self.assertEqual(search.best_move(state, 1000), 3)
+
+    def test_blocks_win(self):
+        """Test that the search blocks an open four on 5x5"""
+        board = "     " " XXX " "  O  " "  O  " "     "
+        state = engine.GameState.from_board(board, 'O', 5, 4)
+        self.assertIn(search.best_move(state, 1000), (5, 9))
+
+    def test_classic_board_is_a_draw(self):
+        """Test that an unlimited search agrees with the solver"""
+        result = search.search(engine.GameState(), budget_ms=10000)
+        self.assertEqual(result.value, 0)
+        self.assertEqual(result.depth, 9)
+
+    def test_respects_time_budget(self):
+        """Test that a 15x15 search returns a move within its budget"""
+        board = [' '] * 225
+        board[112], board[113] = 'X', 'O'
+        state = engine.GameState.from_board(''.join(board), 'X', 15, 5)
+        result = search.search(state, budget_ms=50)
+        self.assertIsNotNone(result.move)
+        self.assertTrue(state.is_legal(result.move))
+        # Allow for the clock being checked every few dozen nodes
+        self.assertLess(result.elapsed_ms, 250)
+
+    def test_zobrist_hash_depends_on_side_to_move(self):
+        """Test that the same stones hash differently per side to move"""
+        x_turn = engine.GameState.from_board("X   O    " + ' ' * 7,
+                                             'X', 4, 4)
+        o_turn = engine.GameState.from_board("X   O    " + ' ' * 7,
+                                             'O', 4, 4)
+        self.assertNotEqual(search.zobrist_hash(x_turn),
+                            search.zobrist_hash(o_turn))
+
+
+class LargeBoardGameTest(GameTestCase):
+    def test_new_game_with_board_size(self):
+        """Test creating a 5x5 game from the start page form"""
+        response = Client().post(reverse('game:new_game'), {
+            'player_x_name': 'Alice',
+            'player_o_name': 'Bob',
+            'board_size': '5',
+        })
+        self.assertEqual(response.status_code, 302)
+        game = Game.objects.get()
+        self.assertEqual(game.board_size, 5)
+        self.assertEqual(game.win_length, 4)
+        self.assertEqual(game.board_state, ' ' * 25)
+
+    def test_unsupported_board_size_falls_back(self):
+        """Test that an unknown board size creates a 3x3 game"""
+        Client().post(reverse('game:new_game'), {'board_size': '7'})
+        self.assertEqual(Game.objects.get().board_size, 3)
+
+    def test_save_derives_win_length(self):
+        """Test that a saved game gets the same rule as Game.new"""
+        game = Game.objects.create(board_size=15)
+        self.assertEqual(game.win_length, Game.new(board_size=15).win_length)
+        self.assertEqual(Game.objects.get(id=game.id).win_length, 5)
+        with self.assertRaises(ValueError):
+            Game.objects.create(board_size=7)
+
+    def test_move_bounds_follow_board_size(self):
+        """Test that positions are validated against the board size"""
+        game = Game.objects.create(board_size=4, win_length=4)
+        self.assertEqual(game.make_move(15, 'X'), (True, "Move successful"))
+        self.assertEqual(game.make_move(16, 'O'),
+                         (False, "Invalid position"))
+
+    @override_settings(GAME_AI_MOVE_BUDGET_MS=50)
+    def test_ai_move_on_large_board(self):
+        """Test that the AI answers on a 15x15 board"""
+        game = Game.objects.create(player_o_name="AI", is_ai_game=True,
+                                   board_size=15, win_length=5)
+        game.make_move(112, 'X')
+        success, message = game.make_ai_move()
+        self.assertTrue(success, message)
+        self.assertEqual(game.board_state.count('O'), 1)
+        self.assertEqual(game.current_turn, 'X')
+
+    @override_settings(GAME_AI_ENGINE='mcts', GAME_MCTS_WORKERS=0,
+                       GAME_MCTS_PLAYOUTS=200)
+    def test_mcts_selected_by_setting(self):
+        """Test that make_ai_move uses MCTS when configured"""
+        game = Game.objects.create(player_o_name="AI", is_ai_game=True,
+                                   board_size=4, win_length=4,
+                                   current_turn='O')
+        with mock.patch.object(mcts, 'best_move',
+                               wraps=mcts.best_move) as best_move:
+            success, message = game.make_ai_move()
+        self.assertTrue(success, message)
+        self.assertEqual(best_move.call_args.kwargs['playouts'], 200)
+        self.assertEqual(game.board_state.count('O'), 1)
+
+    def test_board_renders_grid_for_size(self):
+        """Test that the board template lays out one column per cell"""
+        game = Game.objects.create(board_size=4, win_length=4)
+        response = Client().get(reverse('game:game_board',
+                                        kwargs={'game_id': game.id}))
+        self.assertContains(response, 'repeat(4, 1fr)')
+        self.assertContains(response, 'data-position="15"')
+
+
+class MCTSTest(SimpleTestCase):
+    def test_takes_immediate_win(self):
+        """Test that a winning move is played without searching"""
+        board = "OOO  " "XX   " "XX   " "     " "     "
+        state = engine.GameState.from_board(board, 'O', 5, 4)
+        self.assertEqual(mcts.best_move(state, workers=0), 3)
+
+    def test_single_tree_visits_legal_moves(self):
+        """Test that an in-process tree only expands empty cells"""
+        state = engine.GameState.from_board("X" + ' ' * 15, 'O', 4, 4)
+        visits = mcts.search(state, playouts=200, budget_ms=5000, workers=0)
+        self.assertEqual(sum(visits.values()), 200)
+        self.assertNotIn(0, visits)
+
+    def test_root_parallel_pool(self):
+        """Test that playouts are split across worker processes and merged"""
+        state = engine.GameState.from_board(' ' * 16, 'X', 4, 4)
+        visits = mcts.search(state, playouts=101, budget_ms=5000,
+                             workers=2, keep_warm=False)
+        self.assertEqual(sum(visits.values()), 101)
+
+    def test_pool_per_worker_count(self):
+        """Test that a new worker count leaves work on the old pool alone"""
+        self.addCleanup(mcts.shutdown_pool)
+        state = engine.GameState.from_board(' ' * 16, 'X', 4, 4)
+        pool = mcts.get_pool(1)
+        future = pool.submit(mcts.run_tree, state.x, state.o, state.turn,
+                             4, 4, 50, time.time() + 5, 1)
+        self.assertIsNot(mcts.get_pool(2), pool)
+        self.assertEqual(sum(future.result().values()), 50)
+        self.assertIs(mcts.get_pool(1), pool)
+
+    def test_pool_workers_are_not_forked(self):
+        """Test that workers don't start as forks of a threaded server"""
+        self.addCleanup(mcts.shutdown_pool)
+        self.assertIn(mcts.get_pool(1)._mp_context.get_start_method(),
+                      ('forkserver', 'spawn'))
+
+    def test_wall_clock_cap(self):
+        """Test that the deadline stops playouts early"""
+        state = engine.GameState.from_board(' ' * 225, 'X', 15, 5)
+        visits = mcts.search(state, playouts=10 ** 6, budget_ms=20,
+                             workers=0)
+        self.assertLess(sum(visits.values()), 10 ** 6)
+
+
+class BatchingTest(SimpleTestCase):
+    boards = [
+        ("XX  O    ", 'O'),  # Must block at 2
+        ("OO XX    ", 'O'),  # Wins at 2
+        ("XXXOO    ", 'O'),  # Already finished
+        ("XOXXOOOXX", 'X'),  # Full board
+        ("OO       ", 'O'),  # Unreachable from normal play
+    ]
+
+    def states(self):
+        return [engine.GameState.from_board(board, turn)
+                for board, turn in self.boards]
+
+    def test_choose_moves(self):
+        """Test that a batch answers every board like the solver would"""
+        moves = batching.choose_moves(self.states(), seed=1)
+        self.assertEqual(moves, [2, 2, None, None, 2])
+
+    def test_ties_are_best_moves(self):
+        """Test that randomly broken ties only pick optimal moves"""
+        state = engine.GameState.from_board("    X    ", 'O')
+        moves = batching.choose_moves([state] * 50, seed=7)
+        self.assertTrue(set(moves) <= set(solver.best_moves(state)))
+
+    @unittest.skipIf(batching.np is None, "NumPy not installed")
+    def test_vectorized_winners(self):
+        """Test win detection as one matrix operation over many boards"""
+        boards = batching.encode_boards(self.states())
+        self.assertEqual(boards.shape, (5, 9))
+        self.assertEqual(batching.winners(boards).tolist(),
+                         [batching.EMPTY, batching.EMPTY, batching.PLAYER_X,
+                          batching.EMPTY, batching.EMPTY])
+
+    def test_without_numpy(self):
+        """Test the per-board fallback when NumPy is unavailable"""
+        with mock.patch.object(batching, 'np', None):
+            moves = batching.choose_moves(self.states())
+        self.assertEqual(moves, [2, 2, None, None, 2])
+
+    def test_coalescer_batches_concurrent_turns(self):
+        """Test that turns submitted together are evaluated as one batch"""
+        coalescer = batching.MoveCoalescer(window_ms=200, max_batch=3)
+        states = self.states()[:3]
+        results = [None] * 3
+        with mock.patch.object(batching, 'choose_moves',
+                               wraps=batching.choose_moves) as choose_moves:
+            threads = [threading.Thread(
+                target=lambda i=i: results.__setitem__(
+                    i, coalescer.choose_move(states[i])))
+                for i in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(choose_moves.call_count, 1)
+        self.assertEqual(results, [2, 2, None])
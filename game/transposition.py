@@ -0,0 +1,187 @@
+"""
+Symmetry-canonicalized transposition table for AI search.
+
+The square board has eight symmetries (four rotations, each optionally
+mirrored), and positions related by one of them have the same value with
+correspondingly transformed best moves. The table stores each position
+under its canonical form -- the smallest ``(x_mask, o_mask)`` over all
+eight transforms -- so one evaluation serves every equivalent board.
+Entries are kept in LRU order and evicted past ``maxsize``.
+"""
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+DEFAULT_MAXSIZE = 4096
+
+
+@lru_cache(maxsize=None)
+def symmetries(size):
+    """
+    Return the eight cell permutations of a ``size`` x ``size`` board.
+
+    ``symmetries(size)[s][cell]`` is where ``cell`` lands under transform
+    ``s``; transform 0 is the identity.
+    """
+    last = size - 1
+    transforms = (
+        lambda r, c: (r, c),                # Identity
+        lambda r, c: (c, last - r),         # Rotate 90
+        lambda r, c: (last - r, last - c),  # Rotate 180
+        lambda r, c: (last - c, r),         # Rotate 270
+        lambda r, c: (r, last - c),         # Mirror left-right
+        lambda r, c: (last - r, c),         # Mirror top-bottom
+        lambda r, c: (c, r),                # Main diagonal
+        lambda r, c: (last - c, last - r),  # Anti-diagonal
+    )
+    perms = []
+    for transform in transforms:
+        perm = []
+        for cell in range(size * size):
+            row, col = transform(*divmod(cell, size))
+            perm.append(row * size + col)
+        perms.append(tuple(perm))
+    return tuple(perms)
+
+
+@lru_cache(maxsize=None)
+def inverse_symmetries(size):
+    """Return the inverse of each permutation in ``symmetries(size)``"""
+    inverses = []
+    for perm in symmetries(size):
+        inverse = [0] * len(perm)
+        for cell, target in enumerate(perm):
+            inverse[target] = cell
+        inverses.append(tuple(inverse))
+    return tuple(inverses)
+
+
+def permute_mask(mask, perm):
+    """Move every set bit of ``mask`` to its image under ``perm``"""
+    result = 0
+    cell = 0
+    while mask:
+        if mask & 1:
+            result |= 1 << perm[cell]
+        mask >>= 1
+        cell += 1
+    return result
+
+
+@lru_cache(maxsize=None)
+def _mask_tables(size):
+    # Whole-mask lookup tables make canonicalization eight pairs of
+    # indexing operations; only built for boards small enough to afford it.
+    cells = size * size
+    return tuple(tuple(permute_mask(mask, perm) for mask in range(1 << cells))
+                 for perm in symmetries(size))
+
+
+def canonicalize(x_mask, o_mask, size=3):
+    """
+    Return ``(canonical_x, canonical_o, transform)`` where ``transform``
+    is the index into ``symmetries(size)`` that produced the canonical form.
+    """
+    best = None
+    transform = 0
+    if size <= 3:
+        for index, table in enumerate(_mask_tables(size)):
+            candidate = (table[x_mask], table[o_mask])
+            if best is None or candidate < best:
+                best = candidate
+                transform = index
+    else:
+        for index, perm in enumerate(symmetries(size)):
+            candidate = (permute_mask(x_mask, perm),
+                         permute_mask(o_mask, perm))
+            if best is None or candidate < best:
+                best = candidate
+                transform = index
+    return best[0], best[1], transform
+
+
+class TranspositionTable:
+    """
+    Bounded LRU cache of position evaluations keyed by canonical form.
+
+    Each entry holds an opaque ``value`` (whatever the search stores) and a
+    tuple of moves. Moves are stored in canonical coordinates and
+    translated back into the caller's orientation on lookup.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, size=3):
+        self.maxsize = maxsize
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _key(self, x_mask, o_mask, turn):
+        canonical_x, canonical_o, transform = canonicalize(
+            x_mask, o_mask, self.size)
+        return (canonical_x, canonical_o, turn), transform
+
+    def get(self, x_mask, o_mask, turn):
+        """Return ``(value, moves)`` for a position, or None on a miss"""
+        key, transform = self._key(x_mask, o_mask, turn)
+        entry = self.get_key(key)
+        if entry is None:
+            return None
+        value, moves = entry
+        inverse = inverse_symmetries(self.size)[transform]
+        return value, tuple(sorted(inverse[move] for move in moves))
+
+    def put(self, x_mask, o_mask, turn, value, moves=()):
+        """Store a position's value and best moves (in caller orientation)"""
+        key, transform = self._key(x_mask, o_mask, turn)
+        perm = symmetries(self.size)[transform]
+        # Sort so the same canonical entry is stored whichever equivalent
+        # position happened to be evaluated first.
+        self.put_key(key, value, tuple(sorted(perm[move] for move in moves)))
+
+    def get_key(self, key):
+        """
+        Look up an entry by a caller-supplied key, e.g. a Zobrist hash.
+
+        No symmetry translation is applied; searches on boards too large to
+        canonicalize per node use these directly.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return entry
+
+    def put_key(self, key, value, moves=()):
+        """Store an entry under a caller-supplied key"""
+        with self._lock:
+            self._entries[key] = (value, moves)
+            self._entries.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self.reset_stats()
+
+    def stats(self):
+        """Return hit/miss counters and current occupancy"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+        }
@@ -1,13 +1,24 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'game'
 
+# Under ASGI the busiest views run as coroutines (see async_views)
+hot_views = async_views if getattr(settings, 'GAME_ASYNC_VIEWS', False) \
+    else views
+
 urlpatterns = [
     path('', views.start_page, name='start_page'),
     path('new-game/', views.new_game, name='new_game'),
     path('new-ai-game/', views.new_ai_game, name='new_ai_game'),
-    path('game/<int:game_id>/', views.game_board, name='game_board'),
-    path('game/<int:game_id>/move/', views.make_move, name='make_move'),
-    path('scoreboard/', views.scoreboard, name='scoreboard'),
+    path('games/', views.create_games, name='create_games'),
+    path('game/<int:game_id>/', hot_views.game_board, name='game_board'),
+    path('game/<int:game_id>/move/', hot_views.make_move, name='make_move'),
+    path('game/<int:game_id>/moves/', views.play_moves, name='play_moves'),
+    path('game/<int:game_id>/state/', hot_views.game_state,
+         name='game_state'),
+    path('game/<int:game_id>/events/', hot_views.game_events,
+         name='game_events'),
+    path('scoreboard/', hot_views.scoreboard, name='scoreboard'),
 ]
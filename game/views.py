@@ -1,14 +1,29 @@
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_POST, require_safe
 import json
-from .models import Game, Score
+from . import archive, events, leaderboard, routers
+from .models import Game, Score, StaleGame
+
+
+def _board_size(request):
+    """Read the requested board size, falling back to the classic 3x3"""
+    try:
+        board_size = int(request.POST.get('board_size', 3))
+    except ValueError:
+        return 3
+    return board_size if board_size in Game.WIN_LENGTHS else 3
 
 
 def start_page(request):
     """Display the start page for creating a new game"""
-    return render(request, 'game/start_page.html')
+    context = {
+        'board_sizes': Game.BOARD_SIZE_CHOICES,
+    }
+    return render(request, 'game/start_page.html', context)
 
 
 def new_game(request):
@@ -23,13 +38,18 @@ def new_game(request):
         if not player_o_name:
             player_o_name = 'Player O'
 
+        board_size = _board_size(request)
+
         # Create new game
         game = Game.objects.create(
             player_x_name=player_x_name,
-            player_o_name=player_o_name
+            player_o_name=player_o_name,
+            board_size=board_size,
+            win_length=Game.WIN_LENGTHS[board_size]
         )
 
-        return redirect('game:game_board', game_id=game.id)
+        return routers.pin_primary(
+            redirect('game:game_board', game_id=game.id), game.id)
 
     # If not POST, redirect to start page
     return redirect('game:start_page')
@@ -44,22 +64,87 @@ def new_ai_game(request):
         if not player_x_name:
             player_x_name = 'Player X'
 
+        board_size = _board_size(request)
+
         # Create new AI game (player is X, AI is O)
         game = Game.objects.create(
             player_x_name=player_x_name,
             player_o_name="AI",
-            is_ai_game=True
+            is_ai_game=True,
+            board_size=board_size,
+            win_length=Game.WIN_LENGTHS[board_size]
         )
 
-        return redirect('game:game_board', game_id=game.id)
+        return routers.pin_primary(
+            redirect('game:game_board', game_id=game.id), game.id)
 
     # If not POST, redirect to start page
     return redirect('game:start_page')
 
 
+@csrf_exempt
+@require_POST
+def create_games(request):
+    """
+    Create many games in one request, for load tests and tournaments
+
+    The body either lists the games, as ``games``: [{"player_x_name",
+    "player_o_name", "board_size", "ai"}, ...] (every key optional), or
+    asks for ``count`` copies of one such game given at the top level. At
+    most GAME_BULK_CREATE_MAX games are created per request, with one
+    INSERT per GAME_BULK_CREATE_BATCH_SIZE; the response lists their ids
+    in order. Invalid requests create nothing and, as for the other JSON
+    endpoints, get ``success`` false. Anyone can call it, so it only
+    exists while GAME_BULK_CREATE_ENABLED is on.
+    """
+    if not getattr(settings, 'GAME_BULK_CREATE_ENABLED', False):
+        raise Http404("Bulk game creation is disabled")
+    try:
+        data = json.loads(request.body)
+        if 'games' in data:
+            specs = list(data['games'])
+            count = len(specs)
+        else:
+            specs = None
+            count = int(data['count'])
+        # Checked before copying the spec, so a huge count costs nothing
+        if not 1 <= count <= getattr(settings, 'GAME_BULK_CREATE_MAX', 500):
+            raise ValueError("Bad number of games")
+        games = [_new_game(spec) for spec in specs or [data] * count]
+    except (json.JSONDecodeError, ValueError, KeyError, TypeError,
+            AttributeError):
+        return JsonResponse({
+            'success': False,
+            'message': 'Invalid request data'
+        })
+
+    games = Game.create_many(games)
+    return JsonResponse({
+        'success': True,
+        'ids': [game.id for game in games],
+    }, status=201)
+
+
+def _new_game(spec):
+    """Unsaved game from one entry of a create_games request"""
+    return Game.new(
+        player_x_name=_player_name(spec.get('player_x_name'), 'Player X'),
+        player_o_name=_player_name(spec.get('player_o_name'), 'Player O'),
+        board_size=int(spec.get('board_size', 3)),
+        is_ai_game=bool(spec.get('ai', False)))
+
+
+def _player_name(value, default):
+    name = str(value or '').strip() or default
+    if len(name) > Game._meta.get_field('player_x_name').max_length:
+        raise ValueError("Player name too long")
+    return name
+
+
+@routers.replica_reads
 def game_board(request, game_id):
     """Display the game board for a specific game"""
-    game = get_object_or_404(Game, id=game_id)
+    game = _get_game(game_id)
 
     # Convert board_state string to list for template
     board_cells = list(game.board_state)
@@ -74,42 +159,54 @@ def game_board(request, game_id):
 
 @csrf_exempt
 @require_POST
+@routers.pins_primary
 def make_move(request, game_id):
-    """Handle making a move in the game via AJAX"""
+    """
+    Handle making a move in the game via AJAX
+
+    Query budget (enforced in tests): one SELECT for the game, then one
+    transaction holding one bulk INSERT for the human and AI Move rows and
+    one UPDATE of the game -- 3 queries, or 2 with GAME_MOVE_ROWS off. The
+    SELECT is skipped for games in this worker's hot cache. A move that
+    finishes the game adds one UPDATE per player's score; first-time
+    players add one INSERT between them and a second UPDATE each.
+
+    The request may carry the game ``version`` the client last saw. A move
+    made on an older version, or one that loses a race with another write
+    to the game, gets a 409 response holding the current state to retry
+    from.
+    """
     try:
-        game = get_object_or_404(Game, id=game_id)
+        game = _game_for_move(game_id)
         data = json.loads(request.body)
         position = int(data.get('position'))
         player = data.get('player')
+        version = data.get('version')
+        if version is not None:
+            version = int(version)
 
-        # Validate player matches current turn
-        if player != game.current_turn:
-            return JsonResponse({
-                'success': False,
-                'message': f"It's {game.current_turn}'s turn"
-            })
-
-        # Make the move
-        success, message = game.make_move(position, player)
+        try:
+            result = _play_turn(game, position, player, version)
+        except StaleGame:
+            result = None
+        if game.from_hot_cache and (result is None or not result[0]):
+            # The cached copy may be behind another worker's write; redo
+            # the move on a fresh read.
+            game = _game_for_move(game_id, cached=False)
+            try:
+                result = _play_turn(game, position, player, version)
+            except StaleGame:
+                result = None
+        if result is None:
+            return _conflict(game_id)
+        success, message, ai_move_success, ai_message = result
 
         if success:
-            # Trigger AI move if it's an AI game and game is still in progress
-            ai_move_success = None
-            ai_message = None
-            if (game.is_ai_game and game.status == 'IN_PROGRESS' and 
-                game.current_turn == 'O'):
-                ai_move_success, ai_message = game.make_ai_move()
-            
             # Return updated game state (after potential AI move)
             response_data = {
                 'success': True,
                 'message': message,
-                'board_state': list(game.board_state),
-                'current_turn': game.current_turn,
-                'status': game.status,
-                'status_display': game.get_status_display(),
-                'game_finished': game.status != 'IN_PROGRESS',
-                'winning_pattern': game.get_winning_pattern()
+                **_game_data(game),
             }
             
             # Add AI move info if AI moved
@@ -136,15 +233,222 @@ def make_move(request, game_id):
         })
 
 
+@require_safe
+@routers.replica_reads
+def game_state(request, game_id):
+    """
+    Return the game's state as JSON, for bots and polling clients
+
+    The ETag is the game's version, so a client repeating its last ETag in
+    If-None-Match gets an empty 304 until the game changes. Finished games
+    never change and may be cached for GAME_STATE_FINISHED_MAX_AGE.
+    """
+    return _state_response(request, _get_game(game_id))
+
+
+def _state_response(request, game):
+    etag = f'"{game.pk}-{game.version}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(_game_data(game))
+    response['ETag'] = etag
+    if game.status == 'IN_PROGRESS':
+        patch_cache_control(response, no_cache=True)
+    else:
+        patch_cache_control(
+            response, public=True, immutable=True,
+            max_age=getattr(settings, 'GAME_STATE_FINISHED_MAX_AGE', 86400))
+    return response
+
+
+def game_events(request, game_id):
+    """
+    Stream the game's moves as Server-Sent Events
+
+    Each committed move sends a ``move`` event with the cells played and
+    the new turn, status and winning line; event ids are game versions.
+    The stream starts from the Last-Event-ID header (set by EventSource
+    when it reconnects) or ?since=<version>, replaying what was missed,
+    and ends when the game finishes or after GAME_EVENTS_MAX_SECONDS.
+    """
+    if not Game.objects.shard(game_id).filter(id=game_id).exists():
+        raise Http404("No Game matches the given query.")
+    return _event_stream(events.stream(
+        game_id, _last_event_id(request),
+        lambda game_id: Game.objects.shard(game_id).get(id=game_id),
+        getattr(settings, 'GAME_EVENTS_HEARTBEAT_SECONDS', 15),
+        getattr(settings, 'GAME_EVENTS_MAX_SECONDS', 300)))
+
+
+def _last_event_id(request):
+    value = request.headers.get('Last-Event-ID') or request.GET.get('since')
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _event_stream(chunks):
+    response = StreamingHttpResponse(chunks,
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@csrf_exempt
+@require_POST
+@routers.pins_primary
+def play_moves(request, game_id):
+    """
+    Make a list of moves in one request, for bots and replay tools
+
+    The body holds ``moves``, a list of {"position", "player"} objects in
+    play order, and optionally the ``version`` of the game they follow.
+    The moves are written together in one transaction -- one bulk INSERT
+    of Move rows and one UPDATE of the game, as for a single move -- or,
+    if any is refused, not at all, and the response gives the index of the
+    first refused move with the unchanged state. Two-player games only.
+    """
+    try:
+        data = json.loads(request.body)
+        moves = [(int(move['position']), move['player'])
+                 for move in data['moves']]
+        version = data.get('version')
+        if version is not None:
+            version = int(version)
+    except (json.JSONDecodeError, ValueError, KeyError, TypeError):
+        return JsonResponse({
+            'success': False,
+            'message': 'Invalid request data'
+        })
+
+    game = _game_for_move(game_id)
+    if game.is_ai_game:
+        return JsonResponse({
+            'success': False,
+            'message': 'Batches of moves are only for two-player games'
+        })
+    try:
+        result = _play_moves(game, moves, version)
+    except StaleGame:
+        result = None
+    if game.from_hot_cache and (result is None or not result[0]):
+        game = _game_for_move(game_id, cached=False)
+        try:
+            result = _play_moves(game, moves, version)
+        except StaleGame:
+            result = None
+    if result is None:
+        return _conflict(game_id)
+    success, message, failed_index = result
+
+    response_data = {
+        'success': success,
+        'message': message,
+        **_game_data(game),
+    }
+    if not success:
+        response_data['failed_index'] = failed_index
+    return JsonResponse(response_data)
+
+
+def _play_moves(game, moves, version=None):
+    game.expect_version(version)
+    return game.play_moves(moves)
+
+
+def _get_game(game_id):
+    """The game from the database or, once archived, from the archive"""
+    try:
+        return Game.objects.shard(game_id).get(id=game_id)
+    except Game.DoesNotExist:
+        archived = archive.load(game_id)
+        if archived is None:
+            raise Http404("No Game matches the given query.")
+        return archived[0]
+
+
+def _game_for_move(game_id, cached=True):
+    try:
+        return Game.for_move(game_id, cached)
+    except Game.DoesNotExist:
+        raise Http404("No Game matches the given query.")
+
+
+def _play_turn(game, position, player, version=None):
+    """
+    Validate the turn, then make the move plus any AI reply in one write.
+    Raises StaleGame if the game isn't at the client's ``version``.
+    """
+    game.expect_version(version)
+    if player != game.current_turn:
+        return False, f"It's {game.current_turn}'s turn", False, None
+    return game.play_turn(position, player)
+
+
+def _game_data(game):
+    """The game state sent back to the board after a move"""
+    return {
+        'board_state': list(game.board_state),
+        'current_turn': game.current_turn,
+        'status': game.status,
+        'status_display': game.get_status_display(),
+        'game_finished': game.status != 'IN_PROGRESS',
+        'winning_pattern': game.get_winning_pattern(),
+        'version': game.version,
+    }
+
+
+def _conflict(game_id):
+    """409 response carrying the game's current state"""
+    return _conflict_response(
+        get_object_or_404(Game.objects.shard(game_id), id=game_id))
+
+
+def _conflict_response(game):
+    """409 response carrying ``game``, freshly read by the caller"""
+    return JsonResponse({
+        'success': False,
+        'conflict': True,
+        'message': 'The game was changed by another move; please try again',
+        **_game_data(game),
+    }, status=409)
+
+
+@routers.replica_reads
 def scoreboard(request):
-    """Display the scoreboard with player statistics"""
-    scores = Score.objects.all()
-    
-    # Sort by wins descending, then by win percentage
-    sorted_scores = sorted(scores, key=lambda x: (x.wins, x.win_percentage), reverse=True)
-    
+    """
+    Display the scoreboard with player statistics
+
+    Ranked by wins, then win percentage, in the database. The first page
+    is served from the leaderboard cache; ?after=<cursor> pages through
+    the ranking and ?player=<name> shows the players ranked around that
+    player instead.
+    """
+    player = request.GET.get('player', '').strip()
+    after = request.GET.get('after')
+    page_size = getattr(settings, 'GAME_SCOREBOARD_PAGE_SIZE', 50)
+    next_cursor = None
+    if player:
+        scores = Score.around(player)
+    elif not after:
+        scores, next_cursor = leaderboard.first_page(Score.leaderboard,
+                                                     page_size)
+    else:
+        try:
+            scores, next_cursor = Score.leaderboard(after, page_size)
+        except ValueError:
+            # Malformed cursor; start from the top
+            scores, next_cursor = leaderboard.first_page(Score.leaderboard,
+                                                         page_size)
+
     context = {
-        'scores': sorted_scores,
+        'scores': scores,
+        'player': player,
+        'next_cursor': next_cursor,
+        'paged': bool(player or after),
     }
-    
+
     return render(request, 'game/scoreboard.html', context)
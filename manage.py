@@ -6,7 +6,11 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tictactoe_project.settings')
+    settings_module = 'tictactoe_project.settings'
+    if sys.argv[1:2] == ['test']:
+        # Adds the second shard the shard tests use
+        settings_module = 'tictactoe_project.test_settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
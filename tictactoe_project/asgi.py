@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tictactoe_project.settings')
+# Route the busiest views to their async versions (see game.async_views)
+os.environ.setdefault('GAME_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -77,6 +78,75 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'TEST': {
+            # A file rather than shared-cache memory, so tests can run
+            # concurrent writers (memory databases lock whole tables).
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    }
+}
+
+# Local game shards: GAME_DB_SHARDS=N adds N-1 SQLite files next to
+# db.sqlite3 for games to be spread over (see GAME_SHARDS).
+shard_count = int(os.environ.get('GAME_DB_SHARDS', 1))
+for shard in range(1, shard_count):
+    DATABASES[f'shard{shard}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'db_shard{shard}.sqlite3',
+        'TEST': {'NAME': BASE_DIR / f'test_db_shard{shard}.sqlite3'},
+    }
+
+# A local read replica: a second SQLite file, refreshed from the primary
+# with 'manage.py sync_replicas' (see game.routers).
+if os.environ.get('GAME_DB_REPLICA'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['GAME_DB_REPLICA'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Scratch database 'manage.py benchmark_moves' empties and plays in; its
+# file is only created when the benchmark runs.
+DATABASES['benchmark'] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': BASE_DIR / 'db_benchmark.sqlite3',
+    'TEST': {'NAME': BASE_DIR / 'test_db_benchmark.sqlite3'},
+}
+
+DATABASE_ROUTERS = ['game.routers.ReplicaRouter']
+
+# Database profile, chosen with the GAME_DB_PROFILE environment variable.
+# 'production' keeps each worker's connection open between requests and
+# tunes SQLite for a busy single node (applied per connection, see
+# game.sqlite): WAL lets readers run while a write is in progress,
+# synchronous=NORMAL stops fsyncing every commit (safe under WAL),
+# busy_timeout waits up to 5s for the write lock instead of failing, and
+# mmap_size/cache_size keep hot pages in memory. Compare profiles with
+# 'manage.py benchmark_moves'.
+GAME_DB_PROFILE = os.environ.get('GAME_DB_PROFILE', 'development')
+GAME_SQLITE_PRAGMAS = {}
+
+if GAME_DB_PROFILE == 'production':
+    for database in DATABASES.values():
+        database.update(CONN_MAX_AGE=600, CONN_HEALTH_CHECKS=True)
+    GAME_SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # KiB, i.e. 64 MiB
+    }
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Per-process memory by default. With several worker processes, use a shared
+# backend so they see each other's invalidations, e.g.
+# 'django.core.cache.backends.filebased.FileBasedCache' with a LOCATION.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
@@ -121,3 +191,125 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Game AI
+# Boards larger than 3x3 are searched per move with either 'alphabeta'
+# (bounded by GAME_AI_MOVE_BUDGET_MS, enforced by the search itself) or
+# 'mcts', Monte Carlo Tree Search spread over a process pool.
+
+GAME_AI_ENGINE = 'alphabeta'
+
+GAME_AI_MOVE_BUDGET_MS = 500
+
+GAME_MCTS_PLAYOUTS = 2000
+GAME_MCTS_BUDGET_MS = 1000
+# Worker processes for MCTS; None means one per CPU, 0 runs in-process
+GAME_MCTS_WORKERS = None
+# Keep the worker pool alive between requests instead of forking per move
+GAME_MCTS_KEEP_POOL_WARM = True
+
+# Coalesce 3x3 AI turns from concurrent requests arriving within this many
+# milliseconds into one batched evaluation (0 disables coalescing).
+GAME_AI_BATCH_WINDOW_MS = 0
+GAME_AI_BATCH_MAX_SIZE = 64
+
+
+# Move storage
+# Every move is a Move row, as game.moves and Move.objects expect; each game
+# also keeps its moves packed in Game.move_log, which Game.move_history()
+# reads without a query. Turn GAME_MOVE_ROWS off to keep only the log.
+
+GAME_MOVE_ROWS = True
+# Record milliseconds between moves in the packed log
+GAME_MOVE_LOG_TIMES = True
+
+
+# Scoreboard
+# Ranked in the database and keyset-paginated; this many players per page.
+
+GAME_SCOREBOARD_PAGE_SIZE = 50
+
+# The first page is cached in this cache alias for up to this many seconds
+# (0 disables), and invalidated whenever scores change.
+GAME_LEADERBOARD_CACHE = 'default'
+GAME_LEADERBOARD_CACHE_TTL = 60
+
+
+# Async views
+# Serve the board, move and scoreboard views as coroutines. asgi.py turns
+# this on; under WSGI the sync views are used.
+
+GAME_ASYNC_VIEWS = os.environ.get('GAME_ASYNC_VIEWS') == '1'
+
+
+# Bulk game creation
+# The create_games endpoint takes no login, so it is off (404) unless
+# GAME_BULK_CREATE_ENABLED is set, e.g. on a load-test deployment; the
+# create_games management command works either way. Limits: games per
+# request to the endpoint, and games per INSERT statement.
+
+GAME_BULK_CREATE_ENABLED = False
+GAME_BULK_CREATE_MAX = 500
+GAME_BULK_CREATE_BATCH_SIZE = 500
+
+
+# Game shards
+# Database aliases games and their moves are spread over: a game lives on
+# GAME_SHARDS[id % len(GAME_SHARDS)] (see game.shards). Scores stay on
+# 'default'. Changing the list moves where existing ids point, so only do
+# it on an empty database or after moving the games.
+
+GAME_SHARDS = ['default'] + [f'shard{shard}'
+                             for shard in range(1, shard_count)]
+
+
+# Read replicas
+# Database aliases the board, state and scoreboard views may read from;
+# everything else uses 'default'. A client that has just moved reads its
+# game from 'default' for GAME_REPLICA_STICKY_SECONDS, to cover the lag.
+
+GAME_DB_REPLICAS = ['replica'] if 'replica' in DATABASES else []
+GAME_REPLICA_STICKY_SECONDS = 10
+
+
+# Game state API
+# Finished games never change, so their /state/ responses may be cached
+# this long by browsers and proxies
+
+GAME_STATE_FINISHED_MAX_AGE = 86400
+
+
+# Live board updates
+# Server-Sent Event streams send a keep-alive (and check for moves made by
+# other workers) this often, and close after GAME_EVENTS_MAX_SECONDS so the
+# browser reconnects; under WSGI each open stream holds a thread.
+
+GAME_EVENTS_HEARTBEAT_SECONDS = 15
+GAME_EVENTS_MAX_SECONDS = 300
+
+
+# Archive
+# 'manage.py archive_games' moves games finished more than
+# GAME_ARCHIVE_AFTER_DAYS ago out of the database into compressed segment
+# files in GAME_ARCHIVE_DIR, where the board and state views still find
+# them (see game.archive).
+
+GAME_ARCHIVE_DIR = BASE_DIR / 'archive'
+GAME_ARCHIVE_AFTER_DAYS = 30
+GAME_ARCHIVE_SEGMENT_BYTES = 64 * 1024 * 1024
+
+
+# Game history export and import
+# Games read per query, inserted per transaction, and written per
+# checkpoint by 'manage.py export_games' and 'import_games' (see
+# game.history).
+
+GAME_HISTORY_CHUNK_SIZE = 1000
+
+
+# Hot game cache
+# In-progress games kept per worker process so a move needs no SELECT
+# (0 disables). Stale entries are detected on write and re-read.
+
+GAME_HOT_CACHE_SIZE = 1024
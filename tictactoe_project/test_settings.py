@@ -0,0 +1,15 @@
+"""
+Settings for 'manage.py test': the project settings plus a second game
+shard, which the shard tests spread games over whether or not
+GAME_DB_SHARDS is set.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, DATABASES
+
+if 'shard1' not in DATABASES:
+    DATABASES['shard1'] = {
+        # Same engine and profile options as 'default'
+        **DATABASES['default'],
+        'NAME': BASE_DIR / 'db_shard1.sqlite3',
+        'TEST': {'NAME': BASE_DIR / 'test_db_shard1.sqlite3'},
+    }